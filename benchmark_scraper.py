@@ -0,0 +1,247 @@
+"""
+Benchmark the scraper against fake WhatsApp accounts (see fake_webdriver.py), without a
+browser, a phone or a network connection.
+
+    python benchmark_scraper.py
+    python benchmark_scraper.py --chats 100 1000 --json benchmark.json
+    python benchmark_scraper.py --baseline benchmark.json
+
+For every account size it runs process_introduction_groups over the whole account (scroll and
+search discovery), then is_group_chat and get_group_participants on single chats, and reports:
+  round-trips - WebDriver commands sent to the browser
+  wall        - real time the scraper's own code took
+  simulated   - how long the run would take in a browser (round-trip latency, waits and render delays)
+  sleep       - the part of the simulated time spent waiting and polling
+Every result is also checked: each intro group must be saved with exactly its members.
+
+Round-trips and simulated time do not depend on the machine, so they can gate CI:
+with --baseline, the exit code is 1 when either grows by more than --tolerance over the
+baseline's, or when a result is wrong.
+"""
+import argparse
+import json
+import sys
+import tempfile
+from collections import defaultdict
+from os.path import join
+from time import perf_counter
+
+import scrape_whatsapp_chats as scraper
+from fake_webdriver import FakeDriver, expected_participants, is_expected_intro, synthetic_account
+from output_sinks import OUTPUT_FORMATS, output_extension, read_groups
+
+CHAT_COUNTS = [100, 1000, 10000]
+IS_GROUP_SAMPLE = 50  # Chats checked with is_group_chat per account
+PARTICIPANTS_SAMPLE = 20  # Groups opened with get_group_participants per account
+REGRESSION_TOLERANCE = 0.1  # Allowed growth over the baseline (10%)
+GATED_METRICS = ["round_trips", "simulated_time"]
+MAX_ERRORS_SHOWN = 5
+
+
+def reset_scraper():
+    """Forget what earlier runs taught the scraper, so every benchmark starts the same (needs the clock installed)"""
+    scraper.header_strategy = None
+    scraper.wait_latencies.clear()
+    scraper.wait_timeouts.clear()
+    scraper.metrics.reset()
+
+
+class Measurement:
+    """Round-trips, real time and simulated time of the calls made inside a with block"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.round_trips = self.wall_time = self.simulated_time = self.sleep_time = 0
+
+    def __enter__(self):
+        self.start = (self.driver.total_round_trips(), perf_counter(), self.driver.clock.now,
+                      self.driver.clock.slept)
+        return self
+
+    def __exit__(self, *exc_info):
+        round_trips, wall, now, slept = self.start
+        self.round_trips += self.driver.total_round_trips() - round_trips
+        self.wall_time += perf_counter() - wall
+        self.simulated_time += self.driver.clock.now - now
+        self.sleep_time += self.driver.clock.slept - slept
+
+
+def result(benchmark, chat_count, calls, measurement, errors, driver):
+    return {
+        "benchmark": benchmark,
+        "chats": chat_count,
+        "calls": calls,
+        "round_trips": measurement.round_trips,
+        "wall_time": round(measurement.wall_time, 4),
+        "simulated_time": round(measurement.simulated_time, 3),
+        "sleep_time": round(measurement.sleep_time, 3),
+        "timeouts": sum(scraper.wait_timeouts.values()),
+        "phases": scraper.metrics.report()["phases"],
+        "errors": errors + [f"fake driver does not know {call}" for call in sorted(set(driver.unknown_calls))],
+    }
+
+
+def saved_groups(output_path):
+    """chat name -> (participant pairs, complete) from the scraper's output"""
+    groups = defaultdict(lambda: (set(), True))
+    try:
+        for record in read_groups(output_path):
+            participants, complete = groups[record["chat_name"]]
+            participants.update((participant["name"], participant["phone"]) for participant in record["participants"])
+            groups[record["chat_name"]] = (participants, complete and record["complete"])
+    except FileNotFoundError:
+        pass
+    return groups
+
+
+def check_saved_groups(chats, output_path):
+    """Compare the scraper's CSV to the intro groups of the account. Returns a list of errors."""
+    errors = []
+    groups = saved_groups(output_path)
+    expected = {chat["name"]: chat for chat in chats if is_expected_intro(chat)}
+    for name, chat in expected.items():
+        if name not in groups:
+            errors.append(f"missing group: {name}")
+            continue
+        participants, complete = groups[name]
+        if participants != expected_participants(chat):
+            errors.append(f"wrong participants in {name}: {len(participants)} saved, {len(chat['members'])} members")
+        elif not complete:
+            errors.append(f"saved as incomplete: {name}")
+    errors += [f"unexpected group: {name}" for name in groups if name not in expected]
+    return errors
+
+
+def benchmark_process(chats, discovery, directory, output_format="csv"):
+    driver = FakeDriver(chats)
+    output_path = join(directory, f"benchmark_{len(chats)}_{discovery}{output_extension(output_format)}")
+    with driver.clock.installed():
+        reset_scraper()
+        with Measurement(driver) as measurement:
+            groups = scraper.process_introduction_groups(driver, output_path, discovery)
+    return result(f"process_introduction_groups[{discovery}]", len(chats), groups, measurement,
+                  check_saved_groups(chats, output_path), driver)
+
+
+def benchmark_is_group_chat(chats, sample=IS_GROUP_SAMPLE):
+    driver = FakeDriver(chats)
+    measurement = Measurement(driver)
+    errors = []
+    indexes = range(min(sample, len(chats)))
+    with driver.clock.installed():
+        reset_scraper()
+        for index in indexes:
+            driver.open_chat(index)
+            with measurement:
+                is_group = scraper.is_group_chat(driver)
+            if is_group != chats[index]["is_group"]:
+                errors.append(f"is_group_chat is {is_group} for {chats[index]['name']}")
+    return result("is_group_chat", len(chats), len(indexes), measurement, errors, driver)
+
+
+def benchmark_get_group_participants(chats, sample=PARTICIPANTS_SAMPLE):
+    """Groups too large for the header fast path, largest first, since those are the slow ones"""
+    driver = FakeDriver(chats)
+    measurement = Measurement(driver)
+    errors = []
+    groups = sorted((index for index, chat in enumerate(chats)
+                     if chat["is_group"] and len(chat["members"]) > scraper.HEADER_FAST_PATH_MAX_PARTICIPANTS),
+                    key=lambda index: -len(chats[index]["members"]))[:sample]
+    with driver.clock.installed():
+        reset_scraper()
+        for index in groups:
+            driver.open_chat(index)
+            with measurement:
+                participants, complete = scraper.get_group_participants(driver)
+            saved = {(participant["name"], participant["phone"]) for participant in participants}
+            if saved != expected_participants(chats[index]) or not complete:
+                errors.append(f"get_group_participants read {len(saved)} of {len(chats[index]['members'])} "
+                              f"members of {chats[index]['name']}{'' if complete else ' (incomplete)'}")
+    return result("get_group_participants", len(chats), len(groups), measurement, errors, driver)
+
+
+def run_benchmarks(chat_counts, seed, output_format="csv"):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for chat_count in chat_counts:
+            chats = synthetic_account(chat_count, seed=seed)
+            for discovery in ("scroll", "search"):
+                results.append(benchmark_process(chats, discovery, directory, output_format))
+                print_result(results[-1])
+            results.append(benchmark_is_group_chat(chats))
+            print_result(results[-1])
+            results.append(benchmark_get_group_participants(chats))
+            print_result(results[-1])
+    return results
+
+
+def print_header():
+    print(f"{'chats':>6}  {'benchmark':38} {'calls':>6} {'round-trips':>12} {'per call':>9} "
+          f"{'wall s':>8} {'simulated s':>12} {'sleep s':>9} {'timeouts':>9}")
+
+
+def print_result(entry):
+    per_call = entry["round_trips"] / entry["calls"] if entry["calls"] else 0
+    print(f"{entry['chats']:>6}  {entry['benchmark']:38} {entry['calls']:>6} {entry['round_trips']:>12} "
+          f"{per_call:>9.1f} {entry['wall_time']:>8.2f} {entry['simulated_time']:>12.1f} "
+          f"{entry['sleep_time']:>9.1f} {entry['timeouts']:>9}")
+    for error in entry["errors"][:MAX_ERRORS_SHOWN]:
+        print(f"        ✗ {error}")
+    if len(entry["errors"]) > MAX_ERRORS_SHOWN:
+        print(f"        ✗ ... and {len(entry['errors']) - MAX_ERRORS_SHOWN} more errors")
+
+
+def find_regressions(results, baseline, tolerance):
+    """Results that got wrong, or slower than the baseline beyond tolerance. Returns a list of messages."""
+    previous = {(entry["benchmark"], entry["chats"]): entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        name = f"{entry['benchmark']} ({entry['chats']} chats)"
+        if entry["errors"]:
+            regressions.append(f"{name}: {len(entry['errors'])} wrong results")
+        base = previous.get((entry["benchmark"], entry["chats"]))
+        if base is None:
+            continue
+        for metric in GATED_METRICS:
+            if base[metric] and entry[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {entry[metric]} "
+                                   f"(+{entry[metric] / base[metric] - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against fake WhatsApp accounts")
+    parser.add_argument("--chats", type=int, nargs="+", default=CHAT_COUNTS, help="account sizes to run")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic accounts")
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="csv",
+                        help="output format the scraper writes during the runs")
+    parser.add_argument("--json", help="write the results to this file (usable as --baseline)")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="allowed growth of round-trips and simulated time over the baseline")
+    args = parser.parse_args()
+
+    print_header()
+    results = run_benchmarks(args.chats, args.seed, args.format)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    baseline = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if regressions:
+        print("\n✗ Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    if args.baseline:
+        print(f"\n✓ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
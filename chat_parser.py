@@ -1,95 +1,130 @@
+import argparse
+import os
+
 from notion_client import Client
 
+from intro_names import classify_intro_name, contact_name_keys
+from notion_sync import NotionSync
+from notion_uploader import NotionUploader
+from output_sinks import NO_PARTICIPANT, read_groups
+
 TEMP_DB_ID = "29a37812620f80f2a963daf81ebe558f"
+NOTION_SECRET = os.environ.get("NOTION_SECRET")
+NOTION_BASE_URL = os.environ.get("NOTION_BASE_URL", "https://api.notion.com")  # Point at notion_stub_server.py to test
+NOTION_VERSION = "2022-06-28"  # API version that still queries databases directly
+
+
+def iter_intro_records(csv_path):
+    """
+    Stream the scraper's output one group at a time (CSV, or the JSON Lines and SQLite
+    formats of output_sinks.py), as records:
+    {"chat_name", "participant_count", "participants": [{"name", "phone"}], "complete"}.
+    Unknown phone numbers are "". Only one group is held in memory at a time.
+    """
+    for record in read_groups(csv_path):
+        for participant in record["participants"]:
+            if participant["phone"] == NO_PARTICIPANT:
+                participant["phone"] = ""
+        yield record
+
+
+def side_text(side):
+    if isinstance(side, list) or isinstance(side, tuple):
+        return f"({side[0]}&{side[1]})"
+    return side
+
+
+def page_properties(first_side, second_side):
+    first_side_to_add = side_text(first_side)
+    second_side_to_add = side_text(second_side)
+    return {"Connection":
+                {"title":
+                    [
+                        {"text":
+                             {"content": f"{first_side_to_add} & {second_side_to_add}"},
+                         }
+                    ]
+                },
+            "First Side": {"rich_text": [
+                {
+                    "text": {
+                        "content": first_side_to_add
+                    }
+                }
+            ]},
+            "Second Side": {"rich_text": [
+                {
+                    "text": {
+                        "content": second_side_to_add
+                    }
+                }
+            ]}
+            }
+
+
+def record_intro(record):
+    """The (first side, second side) of an intro record from iter_intro_records, or None if it is not an intro"""
+    chat_name = record["chat_name"]
+    # The group's own participants are the known contacts its sides should name
+    known_contacts = contact_name_keys(participant["name"] for participant in record["participants"])
+    is_intro, first_side, second_side = classify_intro_name(chat_name, known_contacts)
+    if not is_intro:
+        return None
+    for side in (first_side, second_side):
+        if isinstance(side, tuple) and len(side) != 2:
+            print(f"Found {len(side)} parties for {chat_name}")
+    return first_side, second_side
+
+
+def notion_client():
+    return Client(auth=NOTION_SECRET, base_url=NOTION_BASE_URL, notion_version=NOTION_VERSION)
+
 
 class Intros:
     def __init__(self, csv_path):
-        with open(csv_path, "rb") as csvfile:
-            self.chats = csvfile.readlines()
+        self.csv_path = csv_path
         self.intros = []
         self.intro_dict = {}
-        self.notion = Client(auth=NOTION_SECRET)
-
-    def _parse_inner_side(self, side):
-        if "," in side:
-            delimiter = ","
-        elif "+" in side:
-            delimiter = "+"
-        elif "&" in side:
-            delimiter = "&"
-        elif "וינר ו" in side:
-            delimiter = "וינר ו"
-        elif " ו" in side and "וינר" not in side:
-            delimiter = " ו"
-        else:
-            return side.strip()
-        new_parties = side.split(delimiter)
-        if len(new_parties) != 2:
-            print(f"Found {len(new_parties)} parties for {side}")
-        return [new_party.strip() for new_party in new_parties]
+        self.notion = notion_client()
 
     def parse_csv(self):
-        for row in self.chats:
-            row_decoded = row.decode("utf-8")
-            if "//" in row_decoded:
-                delimiter = "//"
-            elif "/" in row_decoded:
-                delimiter = "/"
-            elif "<>" in row_decoded:
-                delimiter = "<>"
-            elif "x" in row_decoded:
-                delimiter = "x"
-            else:
+        # One intro per group, from its chat name; the group's record is kept in intro_dict
+        for record in iter_intro_records(self.csv_path):
+            intro = record_intro(record)
+            if intro is None:
                 continue
-            sides = row_decoded.split(delimiter)
-            self.intros.append((self._parse_inner_side(sides[0]), self._parse_inner_side(sides[1])))
-            if len(sides) != 2:
-                print(f"Found {len(sides)} sides for {row_decoded}")
+            self.intros.append(intro)
+            self.intro_dict[record["chat_name"]] = record
 
     def insert_to_notion_test(self):
-        for i in range(len(self.intros)):
-            first_side_to_add = self.intros[i][0]
-            second_side_to_add = self.intros[i][1]
-            if isinstance(first_side_to_add, list) or isinstance(second_side_to_add, tuple):
-                first_side_to_add = f"({first_side_to_add[0]}&{first_side_to_add[1]})"
-            if isinstance(second_side_to_add, list) or isinstance(second_side_to_add, tuple):
-                second_side_to_add = f"({second_side_to_add[0]}&{second_side_to_add[1]})"
-
-            self.notion.pages.create(parent={"database_id": TEMP_DB_ID},
-                                     properties={"Connection":
-                                         { "title":
-                                             [
-                                                 {"text":
-                                                      {"content":f"{first_side_to_add} & {second_side_to_add}"},
-                                                  }
-                                             ]
-                                         },
-                                         "First Side": {"rich_text": [
-                    {
-                        "text": {
-                            "content": first_side_to_add
-                        }
-                    }
-                ]},
-                                         "Second Side": {"rich_text": [
-                                             {
-                                                 "text": {
-                                                     "content": second_side_to_add
-                                                 }
-                                             }
-                                         ]}
-
-                                     }
-                                     )
-
+        # Pages are created concurrently, within Notion's rate limit, retrying 429s and 5xx errors
+        uploader = NotionUploader(self.notion)
+        results = uploader.create_pages(TEMP_DB_ID, [page_properties(first_side, second_side)
+                                                     for first_side, second_side in self.intros])
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        print(f"Created {len(results) - failed} pages, {failed} failed")
 
+    def sync_to_notion(self, database_id=TEMP_DB_ID):
+        # Only intros that are not in the database yet are created, and changed ones updated,
+        # so running this again does not create duplicates
+        notion_sync = NotionSync(self.notion, database_id)
+        created, updated, unchanged, failed = notion_sync.sync(
+            [page_properties(first_side, second_side) for first_side, second_side in self.intros])
+        print(f"Created {created} pages, updated {updated}, {unchanged} already up to date, {failed} failed")
 
 
 def main():
-    intros = Intros(r"C:\Users\gilad\OneDrive\Desktop\Netz\Whatsapp exporter\Lia Results\whatsapp_chats.csv")
+    parser = argparse.ArgumentParser(description="Upload the intros in a scraper CSV to Notion")
+    parser.add_argument("csv_path", help="CSV (or .jsonl / .sqlite3 file) written by scrape_whatsapp_chats.py")
+    parser.add_argument("--database", default=TEMP_DB_ID, help="Notion database id to sync the intros to")
+    args = parser.parse_args()
+
+    intros = Intros(args.csv_path)
     intros.parse_csv()
     print(len(intros.intros))
     print(intros.intros)
-    intros.insert_to_notion_test()
+    intros.sync_to_notion(args.database)
+
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,759 @@
+"""
+Stand-in for the Selenium Chrome driver, for running the scraper without a browser or a phone.
+
+    from fake_webdriver import FakeDriver, synthetic_account
+    driver = FakeDriver(synthetic_account(1000))
+    with driver.clock.installed():
+        scraper.process_introduction_groups(driver, "out.csv")
+
+FakeDriver answers the WebDriver calls scrape_whatsapp_chats.py makes (find_element(s),
+execute_script with the scraper's scripts, click, send_keys, text, page_source and the ESC
+key) from an in-memory WhatsApp Web: a virtualized sidebar that renders a few rows around
+the scroll position, the open chat's header, the group info drawer and the "View all"
+participant dialog. Like the real page, things appear a little after they are clicked.
+
+Like Selenium's own driver, every call goes through execute(), which counts it as one
+round-trip and charges it a simulated latency. Time is simulated too (VirtualClock): sleeps
+and wait polls advance the clock instead of waiting, so a 10,000 chat account replays in
+seconds while round-trips, waits and timeouts stay what they would be in a browser.
+
+Accounts are lists of chat dicts, generated (synthetic_account) or read from a saved page
+(account_from_snapshot, see snapshot_parser.py).
+"""
+import heapq
+import random
+import re
+from collections import Counter
+from contextlib import contextmanager
+from html import escape
+from types import SimpleNamespace
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, WebDriverException
+from selenium.webdriver import Keys
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.support import wait as selenium_wait
+
+import scrape_metrics
+import scrape_whatsapp_chats as scraper
+import snapshot_parser
+from intro_names import is_intro_name
+
+ROUND_TRIP_LATENCY = 0.004  # Simulated time of one WebDriver command (a local chromedriver takes a few ms)
+RENDER_DELAY = 0.15  # How long WhatsApp takes to show a clicked chat, a drawer or search results
+SCROLL_RENDER_DELAY = 0.05  # How long newly scrolled-in rows take to render
+ROW_HEIGHT = 72  # Sidebar row height in pixels
+SIDEBAR_TOP = 110  # Where the sidebar's first row starts on screen
+PANE_HEIGHT = 720  # Visible height of the sidebar
+OVERSCAN_ROWS = 5  # Rows rendered above and below the visible ones (sidebar and participant dialog)
+DRAWER_MEMBER_LIMIT = 10  # Larger groups list only this many members in the drawer, behind "View all"
+DIALOG_PAGE_ROWS = 12  # Participant rows visible in the "View all" dialog at once
+HEADER_NAME_LIMIT = 100  # The header subtitle lists this many names, then "N more"
+SELF_NAME = "You"
+CONTACT_SUBTITLE = "click here for contact info"
+EMOJI_CHAT_SUFFIX = " 💸"  # Added to the name of the first intro group of every synthetic account
+# Emoji WhatsApp renders as <img alt="..."> in chat headers (the sidebar keeps them in a title attribute)
+EMOJI_PATTERN = re.compile("[\u2600-\u27bf\U0001f000-\U0001faff]")
+
+FIRST_NAMES = ["Dana", "Yossi", "Avi", "Rina", "Moshe", "Noa", "Tamar", "Eitan", "Maya", "Omer",
+               "Alice", "Bob", "Carol", "David", "Lior", "Shira", "דנה", "יוסי", "רונית", "מור", "עדי", "מתן"]
+LAST_NAMES = ["Cohen", "Levi", "Mizrahi", "Peretz", "Smith", "Graylock", "Friedman", "Katz", "כהן", "לוי"]
+INTRO_FORMATS = ["{a} // {b}", "{a} / {b}", "{a} <> {b}", "{a} x {b}", "{a}, {c} / {b}"]
+GROUP_NAMES = ["Family", "Work team", "Xmas party", "24/7 support", "Book club", "Building committee",
+               "Soccer Tuesdays", "Class of 2009"]
+TIME_LABELS = ["09:12", "14:32", "Yesterday", "Monday", "Friday", "12/05/2025", "03/01/2024"]
+
+
+class VirtualClock:
+    """
+    Simulated time. sleep() advances it instantly, and so do round-trips (advance()),
+    so waiting costs no real time but is still measured.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0  # Time spent in sleep(), i.e. waiting and polling
+        self.latency = 0.0  # Time spent in round-trips
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+        self.latency += seconds
+
+    @contextmanager
+    def installed(self):
+        """Make the scraper's timers, its phase metrics and Selenium's WebDriverWait use this clock"""
+        patches = [
+            (scraper, "perf_counter", self.time),
+            (scraper, "sleep", self.sleep),
+            (scrape_metrics, "perf_counter", self.time),
+            (selenium_wait, "time", SimpleNamespace(monotonic=self.time, time=self.time, sleep=self.sleep)),
+        ]
+        originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+        for module, name, value in patches:
+            setattr(module, name, value)
+        try:
+            yield self
+        finally:
+            for module, name, value in originals:
+                setattr(module, name, value)
+
+
+class FakeElement:
+    """An element handle, like Selenium's WebElement: every method is a round-trip through the driver"""
+
+    def __init__(self, driver, kind, key=None):
+        self.parent = driver
+        self.kind = kind
+        self.key = key
+        self.id = f"{kind}:{key}"
+
+    def _execute(self, command, params=None):
+        return self.parent.execute(command, dict(params or {}, id=self.id))["value"]
+
+    def click(self):
+        self._execute(Command.CLICK_ELEMENT)
+
+    def send_keys(self, *value):
+        self._execute(Command.SEND_KEYS_TO_ELEMENT, {"text": "".join(value)})
+
+    @property
+    def text(self):
+        return self._execute(Command.GET_ELEMENT_TEXT)
+
+    def find_elements(self, by=By.ID, value=None):
+        return self._execute(Command.FIND_CHILD_ELEMENTS, {"using": by, "value": value})
+
+    def find_element(self, by=By.ID, value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"Unable to locate element: {value}")
+        return elements[0]
+
+    def __repr__(self):
+        return f"<FakeElement {self.id}>"
+
+
+def make_chat(name, is_group, members, last_activity="", preview="", unread=0):
+    """
+    A chat of a fake account. members are dicts like the scraper's participants
+    (name, phone, is_admin); unsaved contacts have their phone number as name and a push_name.
+    """
+    return {"name": name, "is_group": is_group, "members": members, "last_activity": last_activity,
+            "preview": preview, "unread": unread}
+
+
+def expected_participants(chat):
+    """The (name, phone) pairs the scraper should save for a group"""
+    return {(member["name"], member["phone"]) for member in chat["members"]}
+
+
+def is_expected_intro(chat):
+    """Whether the scraper should save this chat as an introduction group"""
+    return chat["is_group"] and is_intro_name(chat["name"])
+
+
+def synthetic_members(rng, size):
+    """size members: "You" (listed last, like WhatsApp does in headers), saved contacts and unsaved numbers"""
+    members = []
+    names = set()
+    while len(members) < size - 1:
+        if rng.random() < 0.15:
+            phone = f"+972 5{rng.randint(0, 9)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}"
+            member = {"name": phone, "phone": phone, "push_name": "~" + rng.choice(FIRST_NAMES)}
+        else:
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            if rng.random() < 0.5:
+                name += f" {rng.choice(LAST_NAMES)}"
+            member = {"name": name, "phone": "N/A"}
+        if member["name"] in names:
+            continue
+        names.add(member["name"])
+        member["is_admin"] = not members
+        members.append(member)
+    members.append({"name": SELF_NAME, "phone": "N/A", "is_admin": False})
+    return members
+
+
+def synthetic_group_size(rng):
+    """Mostly small intros (read from the header), some that need group info, a few huge ones"""
+    draw = rng.random()
+    if draw < 0.7:
+        return 3
+    if draw < 0.9:
+        return rng.randint(4, scraper.HEADER_FAST_PATH_MAX_PARTICIPANTS)
+    if draw < 0.98:
+        return rng.randint(scraper.HEADER_FAST_PATH_MAX_PARTICIPANTS + 1, 60)
+    return rng.randint(100, 500)
+
+
+def synthetic_account(chat_count, intro_share=0.12, seed=0):
+    """
+    A fake account of chat_count chats (most recent first): contacts, ordinary groups and
+    intro groups of every format, plus a few contacts whose names look like intros.
+    The same seed always gives the same account.
+    """
+    rng = random.Random(seed)
+    chats = []
+    used_names = set()
+    emoji_intro = False
+    while len(chats) < chat_count:
+        draw = rng.random()
+        person = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        if draw < intro_share:
+            other = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            name = rng.choice(INTRO_FORMATS).format(a=person, b=other, c=rng.choice(FIRST_NAMES))
+            if not emoji_intro:
+                # Emoji in chat names are images in the header, and must still match the sidebar name
+                name += EMOJI_CHAT_SUFFIX
+                emoji_intro = True
+            is_group, members = True, synthetic_members(rng, synthetic_group_size(rng))
+        elif draw < intro_share + 0.01:
+            name, is_group, members = f"{person} / {rng.choice(FIRST_NAMES)}", False, []
+        elif draw < intro_share + 0.3:
+            name = f"{rng.choice(GROUP_NAMES)} {len(chats)}"
+            is_group, members = True, synthetic_members(rng, rng.randint(3, 8))
+        else:
+            name, is_group, members = person, False, []
+        if name in used_names:
+            continue
+        used_names.add(name)
+        sender = members[0]["name"].split()[0] if members else ""
+        preview = f"{sender}: See you there" if is_group else "See you there"
+        chats.append(make_chat(name, is_group, members, rng.choice(TIME_LABELS), preview,
+                               rng.choice([0, 0, 0, 1, 3])))
+    return chats
+
+
+def account_from_snapshot(path):
+    """
+    A fake account replaying a saved WhatsApp Web page: its sidebar chats, and the open chat
+    with its recorded header subtitle and participants. Other groups only have "You" as member,
+    since the page does not show theirs.
+    """
+    result = snapshot_parser.extract_snapshot(snapshot_parser.read_snapshot(path))
+    chats = {}
+    for row in result["sidebar"]:
+        if row["name"] and row["name"] not in chats:
+            members = [{"name": SELF_NAME, "phone": "N/A", "is_admin": False}] if row["is_group"] else []
+            chats[row["name"]] = make_chat(row["name"], row["is_group"], members, row["last_activity"],
+                                           row["preview"], row["unread"])
+
+    header = result["header"]
+    if header and header["title"]:
+        chat = chats.setdefault(header["title"], make_chat(header["title"], False, []))
+        chat["is_group"] = result["is_group"]
+        chat["subtitle"] = header["subtitle"]
+        if result["participants"]:
+            chat["members"] = [{"name": participant["name"], "phone": participant["phone"],
+                                "is_admin": participant["is_admin"]} for participant in result["participants"]]
+    return list(chats.values())
+
+
+def text_content(text):
+    """What textContent reads from an element showing text, in which emoji are images"""
+    return EMOJI_PATTERN.sub("", text)
+
+
+def emoji_html(text):
+    """Escaped text with its emoji as WhatsApp's emoji images"""
+    return EMOJI_PATTERN.sub(lambda match: f'<img alt="{match.group()}" class="emoji">', escape(text))
+
+
+def header_subtitle(chat):
+    """What the conversation header shows under the chat name"""
+    if "subtitle" in chat:
+        return chat["subtitle"]
+    if not chat["is_group"]:
+        return CONTACT_SUBTITLE
+    names = [member["name"] for member in chat["members"] if member["name"] != SELF_NAME]
+    names.append(SELF_NAME)
+    if len(names) > HEADER_NAME_LIMIT:
+        names = names[:HEADER_NAME_LIMIT] + [f"{len(names) - HEADER_NAME_LIMIT} more"]
+    return ", ".join(names)
+
+
+def participant_row(member):
+    """A participant row as PARTICIPANTS_SCRIPT reads it"""
+    names = [member["name"]] + ([member["push_name"]] if member.get("push_name") else [])
+    labels = ["Group admin"] if member["is_admin"] else []
+    return {"names": names, "is_admin": member["is_admin"], "text": "".join(names + labels)}
+
+
+class FakeDriver:
+    """
+    The subset of Selenium's Chrome driver the scraper uses, over a fake account (a list of chats).
+    round_trips counts every command, script_calls every execute_script by script, and
+    unknown_calls records commands, selectors and scripts the fake does not know
+    (the scraper has changed and the fake needs to follow).
+    """
+
+    def __init__(self, chats, clock=None, latency=ROUND_TRIP_LATENCY, render_delay=RENDER_DELAY,
+                 scroll_render_delay=SCROLL_RENDER_DELAY):
+        self.chats = chats
+        self.clock = clock or VirtualClock()
+        self.latency = latency
+        self.render_delay = render_delay
+        self.scroll_render_delay = scroll_render_delay
+        self.round_trips = Counter()
+        self.script_calls = Counter()
+        self.unknown_calls = []
+        self.events = []  # Scheduled page changes: (time, sequence, callback)
+        self.event_sequence = 0
+        self.elements = {}
+
+        # Sidebar: which chats it lists (all, or search results), scrolled where, rendered where
+        self.search_text = ""
+        self.search_selected = False
+        self.listing = list(range(len(chats)))
+        self.scroll_top = 0
+        self.rendered_range = (0, 0)
+        self.row_ids = {}  # Position in listing -> row id set by SIDEBAR_SNAPSHOT_SCRIPT, while rendered
+        self.row_positions = {}  # Row id -> position in listing
+        self.next_row_id = 1
+        self.mutations = 0
+
+        # Conversation: the chat shown in the header, the group info drawer and the full list dialog
+        self.header_chat = None
+        self.drawer = None  # {"chat": index, "rows": rendered participant rows}
+        self.dialog = None  # {"scroll": first visible row, "rendered": first rendered row}
+
+        self.commands = {
+            Command.W3C_EXECUTE_SCRIPT: self.command_execute_script,
+            Command.FIND_ELEMENT: self.command_find_element,
+            Command.FIND_ELEMENTS: self.command_find_elements,
+            Command.FIND_CHILD_ELEMENTS: self.command_find_elements,
+            Command.CLICK_ELEMENT: self.command_click,
+            Command.SEND_KEYS_TO_ELEMENT: self.command_send_keys,
+            Command.GET_ELEMENT_TEXT: self.command_text,
+            Command.GET_PAGE_SOURCE: lambda params: self.render_page(),
+            Command.W3C_ACTIONS: self.command_actions,
+            Command.W3C_CLEAR_ACTIONS: lambda params: None,
+            Command.GET: lambda params: None,
+            Command.QUIT: lambda params: None,
+        }
+        self.scripts = {
+            scraper.SIDEBAR_SNAPSHOT_SCRIPT: ("SIDEBAR_SNAPSHOT_SCRIPT", self.sidebar_snapshot),
+            scraper.SIDEBAR_MUTATIONS_SCRIPT: ("SIDEBAR_MUTATIONS_SCRIPT", lambda: self.mutations),
+            scraper.SCROLL_SIDEBAR_SCRIPT: ("SCROLL_SIDEBAR_SCRIPT", self.scroll_sidebar),
+            scraper.CHAT_HEADER_SCRIPT: ("CHAT_HEADER_SCRIPT", self.chat_header),
+            scraper.HEADER_TITLE_SCRIPT: ("HEADER_TITLE_SCRIPT", self.header_title),
+            scraper.MEMBER_COUNT_SCRIPT: ("MEMBER_COUNT_SCRIPT", self.member_count),
+            scraper.EXPAND_PARTICIPANTS_SCRIPT: ("EXPAND_PARTICIPANTS_SCRIPT", self.expand_participants),
+            scraper.PARTICIPANTS_SCRIPT: ("PARTICIPANTS_SCRIPT", self.participant_rows),
+            scraper.SCROLL_PARTICIPANTS_SCRIPT: ("SCROLL_PARTICIPANTS_SCRIPT", self.scroll_participants),
+            scraper.PARTICIPANT_ROWS_SIGNATURE_SCRIPT: ("PARTICIPANT_ROWS_SIGNATURE_SCRIPT", self.rows_signature),
+        }
+        self.render_sidebar()
+
+    # --- Selenium API -------------------------------------------------------------------
+
+    def execute(self, driver_command, params=None):
+        """Run one WebDriver command - a single simulated round-trip. Returns {"value": result}."""
+        self.clock.advance(self.latency)
+        self.round_trips[driver_command] += 1
+        self.run_due_events()
+        handler = self.commands.get(driver_command)
+        if handler is None:
+            self.unknown_calls.append(driver_command)
+            raise WebDriverException(f"FakeDriver does not support the {driver_command} command")
+        return {"value": handler(params or {})}
+
+    def execute_script(self, script, *args):
+        return self.execute(Command.W3C_EXECUTE_SCRIPT, {"script": script, "args": list(args)})["value"]
+
+    def find_elements(self, by=By.ID, value=None):
+        return self.execute(Command.FIND_ELEMENTS, {"using": by, "value": value})["value"]
+
+    def find_element(self, by=By.ID, value=None):
+        return self.execute(Command.FIND_ELEMENT, {"using": by, "value": value})["value"]
+
+    @property
+    def page_source(self):
+        return self.execute(Command.GET_PAGE_SOURCE)["value"]
+
+    def get(self, url):
+        self.execute(Command.GET, {"url": url})
+
+    def quit(self):
+        self.execute(Command.QUIT)
+
+    # --- Test setup (not round-trips) ---------------------------------------------------
+
+    def open_chat(self, index):
+        """Show a chat right away, as if it had been clicked and rendered"""
+        self.header_chat = index
+        self.drawer = None
+        self.dialog = None
+
+    def total_round_trips(self):
+        return sum(self.round_trips.values())
+
+    # --- Page state -----------------------------------------------------------------------
+
+    def schedule(self, delay, callback):
+        heapq.heappush(self.events, (self.clock.now + delay, self.event_sequence, callback))
+        self.event_sequence += 1
+
+    def run_due_events(self):
+        while self.events and self.events[0][0] <= self.clock.now:
+            heapq.heappop(self.events)[2]()
+
+    def element(self, kind, key=None):
+        element = self.elements.get(f"{kind}:{key}")
+        if element is None:
+            element = FakeElement(self, kind, key)
+            self.elements[element.id] = element
+        return element
+
+    def visible_range(self, scroll_top):
+        first = max(0, scroll_top // ROW_HEIGHT - OVERSCAN_ROWS)
+        last = min(len(self.listing), (scroll_top + PANE_HEIGHT + ROW_HEIGHT - 1) // ROW_HEIGHT + OVERSCAN_ROWS)
+        return first, last
+
+    def render_sidebar(self):
+        """Render the rows around the scroll position: rows scrolled away are unmounted and lose their id"""
+        rendered_range = self.visible_range(self.scroll_top)
+        if rendered_range == self.rendered_range:
+            return
+        self.rendered_range = rendered_range
+        first, last = rendered_range
+        for position in [position for position in self.row_ids if not first <= position < last]:
+            del self.row_positions[self.row_ids.pop(position)]
+        self.mutations += 1
+
+    def show_listing(self, listing):
+        """Replace the sidebar's chats (search results, or the full list), scrolled to the top"""
+        self.listing = listing
+        self.row_ids = {}
+        self.row_positions = {}
+        self.scroll_top = 0
+        self.rendered_range = None
+        self.render_sidebar()
+
+    def search(self, text):
+        self.search_text = text
+        query = text.casefold()
+        listing = [index for index, chat in enumerate(self.chats) if query in chat["name"].casefold()]
+        self.schedule(self.render_delay, lambda: self.show_listing(listing))
+
+    def sidebar_chat(self, row_id):
+        """The chat index of a rendered sidebar row, or None if the row is no longer rendered"""
+        position = self.row_positions.get(row_id)
+        return None if position is None else self.listing[position]
+
+    def click_chat(self, row_id):
+        index = self.sidebar_chat(row_id)
+        if index is None:
+            raise StaleElementReferenceException(f"Sidebar row {row_id} is no longer attached to the DOM")
+        self.drawer = None
+        self.dialog = None
+        if index != self.header_chat:
+            self.schedule(self.render_delay, lambda: setattr(self, "header_chat", index))
+
+    def open_drawer(self):
+        index = self.header_chat
+        if index is None or not self.chats[index]["is_group"]:
+            return
+        shown = min(len(self.chats[index]["members"]), DRAWER_MEMBER_LIMIT)
+
+        def render_rows(rows):
+            if self.drawer is not None and self.drawer["chat"] == index:
+                self.drawer["rows"] = rows
+
+        # The drawer appears first, then its participant list renders in two steps
+        self.schedule(self.render_delay, lambda: setattr(self, "drawer", {"chat": index, "rows": 0}))
+        self.schedule(self.render_delay * 1.5, lambda: render_rows(min(shown, 4)))
+        self.schedule(self.render_delay * 2, lambda: render_rows(shown))
+
+    def close_drawer(self):
+        self.schedule(self.render_delay / 2, lambda: setattr(self, "drawer", None))
+
+    def close_dialog(self):
+        self.schedule(self.render_delay / 2, lambda: setattr(self, "dialog", None))
+
+    def press_key(self, key):
+        """ESC closes the participant dialog, then the drawer"""
+        if key == Keys.ESCAPE:
+            if self.dialog is not None:
+                self.close_dialog()
+            elif self.drawer is not None:
+                self.close_drawer()
+
+    def drawer_members(self):
+        if self.drawer is None:
+            return []
+        return self.chats[self.drawer["chat"]]["members"][:self.drawer["rows"]]
+
+    def dialog_members(self):
+        if self.dialog is None or self.drawer is None:
+            return []
+        members = self.chats[self.drawer["chat"]]["members"]
+        first = max(0, self.dialog["rendered"] - OVERSCAN_ROWS)
+        return members[first:self.dialog["rendered"] + DIALOG_PAGE_ROWS + OVERSCAN_ROWS]
+
+    def root_members(self, root):
+        """Participants rendered under root (the drawer, the dialog, or the whole page for None)"""
+        if root is None:
+            return self.drawer_members() + self.dialog_members()
+        if root.kind == "dialog":
+            return self.dialog_members()
+        return self.drawer_members()
+
+    def participant_elements(self, members):
+        chat = self.drawer["chat"] if self.drawer else None
+        return [self.element("participant", (chat, member["name"])) for member in members]
+
+    # --- Commands ---------------------------------------------------------------------------
+
+    def command_execute_script(self, params):
+        script, args = params["script"], params["args"]
+        known = self.scripts.get(script)
+        if known is not None:
+            label, handler = known
+            self.script_calls[label] += 1
+            return handler(*args)
+
+        # Short scripts the scraper writes inline
+        if "scrollIntoView" in script:
+            self.script_calls["scrollIntoView"] += 1
+            return self.scroll_into_view(args[0])
+        if script.strip() == "arguments[0].click();":
+            self.script_calls["click"] += 1
+            return self.command_click({"id": args[0].id})
+        if args and args[0] == scraper.HEADER_TITLE_SELECTOR and "textContent" in script:
+            # Reading the header title's textContent loses its emoji, as in the browser
+            self.script_calls["header title textContent"] += 1
+            title = self.header_title()
+            return None if title is None else text_content(title)
+
+        self.unknown_calls.append(f"script: {script.strip()[:60]}")
+        raise WebDriverException("FakeDriver does not know this script")
+
+    def command_find_element(self, params):
+        elements = self.command_find_elements(params)
+        if not elements:
+            raise NoSuchElementException(f"Unable to locate element: {params['value']}")
+        return elements[0]
+
+    def command_find_elements(self, params):
+        selector = params["value"]
+        parent = self.elements.get(params["id"]) if "id" in params else None
+        if params["using"] != By.CSS_SELECTOR:
+            self.unknown_calls.append(f"find by {params['using']}: {selector}")
+            return []
+
+        if parent is not None and parent.kind == "dialog":
+            if selector == scraper.PARTICIPANT_ROW_SELECTOR:
+                return self.participant_elements(self.dialog_members())
+            if '[aria-label="Close"]' in selector:
+                return [self.element("dialog_close")] if self.dialog is not None else []
+        elif parent is None:
+            if selector == scraper.GROUP_INFO_DRAWER_SELECTOR:
+                return [self.element("drawer", self.drawer["chat"])] if self.drawer is not None else []
+            if selector == scraper.PARTICIPANT_ROW_SELECTOR:
+                return self.participant_elements(self.root_members(None))
+            if selector == scraper.PARTICIPANT_DIALOG_SELECTOR:
+                return [self.element("dialog")] if self.dialog is not None else []
+            if selector == scraper.SEARCH_BOX_SELECTOR:
+                return [self.element("search_box")]
+            if '[data-testid="back"]' in selector:
+                return [self.element("drawer_close")] if self.drawer is not None else []
+            row_prefix = f'.{scraper.CHAT_DIV}[{scraper.SIDEBAR_ROW_ATTRIBUTE}="'
+            if selector.startswith(row_prefix):
+                row_id = selector[len(row_prefix):].rstrip('"]')
+                return [self.element("row", row_id)] if row_id in self.row_positions else []
+
+        self.unknown_calls.append(f"selector: {selector}")
+        return []
+
+    def command_click(self, params):
+        element = self.elements[params["id"]]
+        if element.kind == "row":
+            self.click_chat(element.key)
+        elif element.kind in ("header", "header_button"):
+            self.open_drawer()
+        elif element.kind == "drawer_close":
+            self.close_drawer()
+        elif element.kind == "dialog_close":
+            self.close_dialog()
+        elif element.kind == "search_box":
+            self.search_selected = False
+
+    def command_send_keys(self, params):
+        element = self.elements[params["id"]]
+        if element.kind != "search_box":
+            return
+        text = params["text"]
+        if Keys.CONTROL in text and "a" in text:
+            self.search_selected = True
+            return
+        if text == Keys.ESCAPE:
+            text = ""
+        elif text == Keys.BACKSPACE:
+            text = "" if self.search_selected else self.search_text[:-1]
+        else:
+            text = ("" if self.search_selected else self.search_text) + text
+        self.search_selected = False
+        if text != self.search_text:
+            self.search(text)
+
+    def command_text(self, params):
+        element = self.elements[params["id"]]
+        if element.kind == "row":
+            index = self.sidebar_chat(element.key)
+            return "" if index is None else self.chats[index]["name"]
+        if element.kind == "participant":
+            return element.key[1]
+        return ""
+
+    def command_actions(self, params):
+        for device in params.get("actions", []):
+            for action in device.get("actions", []):
+                if action.get("type") == "keyDown":
+                    self.press_key(action["value"])
+
+    # --- Scripts ----------------------------------------------------------------------------
+
+    def sidebar_snapshot(self, chat_class, row_attribute, pane_class):
+        rows = []
+        first, last = self.rendered_range
+        for position in range(first, last):
+            row_id = self.row_ids.get(position)
+            if row_id is None:
+                row_id = str(self.next_row_id)
+                self.next_row_id += 1
+                self.row_ids[position] = row_id
+                self.row_positions[row_id] = position
+            chat = self.chats[self.listing[position]]
+            rows.append({
+                "name": chat["name"],
+                "row_id": row_id,
+                "top": SIDEBAR_TOP + position * ROW_HEIGHT - self.scroll_top,
+                "is_group": chat["is_group"],
+                "unread": chat["unread"],
+                "last_activity": chat["last_activity"],
+                "preview": chat["preview"],
+            })
+        return {
+            "rows": rows,
+            "scroll_top": self.scroll_top,
+            "client_height": PANE_HEIGHT,
+            "at_end": self.scroll_top + PANE_HEIGHT >= len(self.listing) * ROW_HEIGHT - 1,
+            "mutations": self.mutations,
+        }
+
+    def scroll_sidebar(self, pane_class, target):
+        max_scroll = max(0, len(self.listing) * ROW_HEIGHT - PANE_HEIGHT)
+        self.scroll_top = int(min(max(target, 0), max_scroll))
+        self.schedule(self.scroll_render_delay, self.render_sidebar)
+        first, last = self.rendered_range
+        rendered = first * ROW_HEIGHT <= self.scroll_top and last * ROW_HEIGHT >= self.scroll_top + PANE_HEIGHT
+        return {"scroll_top": self.scroll_top, "mutations": self.mutations, "rendered": rendered}
+
+    def scroll_into_view(self, element):
+        """scrollIntoView({block: 'nearest'}) on a sidebar row: scrolls only if the row is off screen"""
+        if element.kind != "row" or element.key not in self.row_positions:
+            return None
+        top = self.row_positions[element.key] * ROW_HEIGHT
+        if top < self.scroll_top:
+            self.scroll_sidebar(None, top)
+        elif top + ROW_HEIGHT > self.scroll_top + PANE_HEIGHT:
+            self.scroll_sidebar(None, top + ROW_HEIGHT - PANE_HEIGHT)
+        return None
+
+    def header_title(self, selector=None):
+        return None if self.header_chat is None else self.chats[self.header_chat]["name"]
+
+    def chat_header(self, strategies, preferred):
+        if self.header_chat is None:
+            return None
+        chat = self.chats[self.header_chat]
+        subtitle = header_subtitle(chat)
+        # The page only matches the "div#main header" strategy
+        return {
+            "strategy": 2,
+            "header": self.element("header"),
+            "button": self.element("header_button"),
+            "title": chat["name"],
+            "subtitle": subtitle,
+            "subtitle_text": subtitle,
+        }
+
+    def member_count(self, root):
+        if self.drawer is None:
+            return None
+        return len(self.chats[self.drawer["chat"]]["members"])
+
+    def expand_participants(self, drawer):
+        if self.drawer is None or len(self.chats[self.drawer["chat"]]["members"]) <= DRAWER_MEMBER_LIMIT:
+            return False
+        self.schedule(self.render_delay, lambda: setattr(self, "dialog", {"scroll": 0, "rendered": 0}))
+        return True
+
+    def participant_rows(self, root, row_selector):
+        return [participant_row(member) for member in self.root_members(root)]
+
+    def scroll_participants(self, root, row_selector):
+        if root is None or root.kind != "dialog" or self.dialog is None:
+            # The drawer lists all of its members without scrolling
+            return {"moved": False, "at_end": True}
+        member_total = len(self.chats[self.drawer["chat"]]["members"])
+        before = self.dialog["scroll"]
+        self.dialog["scroll"] = min(before + DIALOG_PAGE_ROWS, max(0, member_total - DIALOG_PAGE_ROWS))
+        dialog, scroll = self.dialog, self.dialog["scroll"]
+        self.schedule(self.scroll_render_delay, lambda: dialog.update(rendered=scroll))
+        return {"moved": scroll != before, "at_end": scroll + DIALOG_PAGE_ROWS >= member_total}
+
+    def rows_signature(self, root, row_selector):
+        return scraper.rows_signature(self.participant_rows(root, row_selector))
+
+    # --- page_source ------------------------------------------------------------------------
+
+    def render_page(self):
+        """The current page as HTML, in WhatsApp Web's markup as far as snapshot_parser.py reads it"""
+        parts = [f'<html><body><div id="side"><div id="pane-side"><div class="{scraper.PANE_SIDE_DIV}">']
+        first, last = self.rendered_range
+        for position in range(first, last):
+            chat = self.chats[self.listing[position]]
+            icon = '<span data-icon="default-group"></span>' if chat["is_group"] else ""
+            unread = f'<span aria-label="{chat["unread"]} unread messages">{chat["unread"]}</span>' \
+                if chat["unread"] else ""
+            parts.append(
+                f'<div role="row" style="transform: translateY({position * ROW_HEIGHT}px);">{icon}'
+                f'<div class="{scraper.CHAT_DIV}"><span title="{escape(chat["name"])}">{escape(chat["name"])}</span></div>'
+                f'<div class="_ak8i">{escape(chat["last_activity"])}</div>'
+                f'<div class="_ak8k"><span title="{escape(chat["preview"])}">{escape(chat["preview"])}</span></div>'
+                f'{unread}</div>')
+        parts.append("</div></div></div>")
+
+        if self.header_chat is not None:
+            chat = self.chats[self.header_chat]
+            subtitle = escape(header_subtitle(chat))
+            parts.append(f'<div id="main"><header><div role="button"><span dir="auto">{emoji_html(chat["name"])}</span>'
+                         f'<span title="{subtitle}">{subtitle}</span></div></header></div>')
+
+        if self.drawer is not None:
+            member_total = len(self.chats[self.drawer["chat"]]["members"])
+            parts.append(f'<div role="complementary" aria-label="Group info">'
+                         f'<div aria-label="{member_total} members list">')
+            parts += [self.render_participant(member) for member in self.drawer_members()]
+            parts.append("</div></div>")
+        if self.dialog is not None:
+            parts.append('<div role="dialog">')
+            parts += [self.render_participant(member) for member in self.dialog_members()]
+            parts.append("</div>")
+        parts.append("</body></html>")
+        return "".join(parts)
+
+    @staticmethod
+    def render_participant(member):
+        spans = "".join(f'<span dir="auto">{escape(name)}</span>' for name in participant_row(member)["names"])
+        admin = "<div>Group admin</div>" if member["is_admin"] else ""
+        return f'<div role="listitem">{spans}{admin}</div>'
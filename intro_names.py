@@ -0,0 +1,265 @@
+"""
+Introduction group names, e.g. "Dana // Yossi" or "Avi, Rina / Moshe".
+
+classify_intro_name() tells whether a chat name is an introduction and splits it into its
+two sides and the parties on each side, in one pass. The scraper uses it to filter the
+sidebar and chat_parser.py to build intros, so both always agree.
+
+A name is scored rather than matched on any delimiter, since opening a chat that is not an
+intro ("Alex", "Xmas party", "24/7 support") is the scraper's most expensive mistake:
+the delimiter found, whether both sides look like names, and optionally whether the sides
+are known contacts all add to the score, and the name is an intro from INTRO_SCORE_THRESHOLD.
+
+Run this module to benchmark it, or to measure precision and recall on the labeled corpus:
+
+    python intro_names.py --names 10000
+    python intro_names.py --evaluate
+"""
+import argparse
+import csv
+import re
+import unicodedata
+from functools import lru_cache
+from os.path import abspath, dirname, join
+from timeit import timeit
+
+# Delimiters between the two sides of an intro, highest precedence first:
+# a name containing "//" is split on "//" even if it also contains "/"
+INTRO_DELIMITERS = ["//", "/", "<>", "x"]
+# Finds every delimiter in a name in one scan ("//" is tried before "/" at each position).
+# "x" only counts as a word of its own ("Dana x Yossi") or between camelCase names ("DanaxYossi").
+DELIMITER_PATTERN = re.compile(r"(?P<double_slash>//)|(?P<slash>/)|(?P<angle><>)"
+                               r"|(?P<x>(?<!\S)[xX](?!\S))|(?P<camel_x>(?<=[a-z])x(?=[A-Z]))")
+X_SPLIT_PATTERN = re.compile(r"(?<!\S)[xX](?!\S)|(?<=[a-z])x(?=[A-Z])")
+URL_PATTERN = re.compile(r"[a-z]+://|www\.", re.IGNORECASE)
+# Pattern group -> delimiter, in order of precedence
+DELIMITER_GROUPS = {"double_slash": "//", "slash": "/", "angle": "<>", "x": "x", "camel_x": "x"}
+
+# How much each delimiter says about a name being an intro
+DELIMITER_SCORES = {"double_slash": 0.6, "angle": 0.6, "slash": 0.5, "x": 0.5, "camel_x": 0.4}
+NAME_SIDE_SCORE = 0.15  # Per side whose parties all look like people's names
+KNOWN_CONTACT_SCORE = 0.25  # Per side with a party that is a known contact
+EXTRA_SIDE_PENALTY = 0.1  # Names with more than two sides ("a / b / c")
+INTRO_SCORE_THRESHOLD = 0.7
+MAX_NAME_WORDS = 3  # Longer parties read like a phrase rather than a name
+
+# Delimiters between the parties on one side, highest precedence first
+PARTY_DELIMITERS = [",", "+", "&", "וינר ו"]
+HEBREW_AND = " ו"  # "and" prefix in Hebrew ("דנה ויוסי")
+HEBREW_AND_EXCEPTION = "וינר"  # Surname starting with "ו" - not an "and"
+NON_NAME_CHARACTERS = set(":@#%=_")
+SELF_NAMES = {"you", "את", "אתה"}  # What WhatsApp calls the account owner in participant lists
+INTRO_CACHE_SIZE = 65536
+CORPUS_PATH = join(dirname(abspath(__file__)), "intro_name_corpus.csv")  # Next to this file
+
+
+def normalize_name(name):
+    """
+    Normalize a name for matching: Unicode NFC, case-folded, single spaces. The one normalizer
+    for names everywhere - chat keys (scrape_state.chat_key), intro sides and Notion index keys
+    """
+    return " ".join(unicodedata.normalize("NFC", name).casefold().split())
+
+
+def contact_name_keys(names):
+    """
+    Known-contact evidence for classify_intro_name, from participant names:
+    each full name and its first word, normalized. Returns a frozenset.
+    """
+    keys = set()
+    for name in names:
+        normalized = normalize_name(name)
+        if normalized and normalized not in SELF_NAMES:
+            keys.add(normalized)
+            keys.add(normalized.split()[0])
+    return frozenset(keys)
+
+
+def split_parties(side):
+    """
+    Split one side of an intro into its parties.
+    Returns the stripped side if it is a single party, or a tuple of parties.
+    """
+    for delimiter in PARTY_DELIMITERS:
+        if delimiter in side:
+            break
+    else:
+        if HEBREW_AND in side and HEBREW_AND_EXCEPTION not in side:
+            delimiter = HEBREW_AND
+        else:
+            return side.strip()
+    return tuple(party.strip() for party in side.split(delimiter))
+
+
+def side_parties(side):
+    """The parties of a side as a tuple, whether split_parties found one or several"""
+    return side if isinstance(side, tuple) else (side,)
+
+
+def looks_like_name(party):
+    """
+    Check if a party could be a person's name: letters, no digits, a few words at most,
+    and not a mix of capitalized and lowercase words ("Engineering sync")
+    """
+    words = party.split()
+    initials = {word[0].isupper() for word in words if word[0].isascii() and word[0].isalpha()}
+    return (any(char.isalpha() for char in party) and not any(char.isdigit() for char in party)
+            and not NON_NAME_CHARACTERS.intersection(party) and len(words) <= MAX_NAME_WORDS
+            and len(initials) < 2)
+
+
+def is_known_contact(party, known_contacts):
+    normalized = normalize_name(party)
+    return normalized in known_contacts or (normalized and normalized.split()[0] in known_contacts)
+
+
+def split_sides(chat_name, delimiter):
+    if delimiter == "x":
+        return X_SPLIT_PATTERN.split(chat_name)
+    return chat_name.split(delimiter)
+
+
+@lru_cache(maxsize=INTRO_CACHE_SIZE)
+def score_intro_name(chat_name, known_contacts=frozenset()):
+    """
+    Score a chat name as an intro (0 - not an intro at all).
+    Returns (score, side_a, side_b); the sides are None when there is no usable delimiter,
+    otherwise each is a single party (str) or a tuple of parties.
+    known_contacts is a frozenset from contact_name_keys().
+    """
+    if URL_PATTERN.search(chat_name):
+        return 0.0, None, None
+    found = {match.lastgroup for match in DELIMITER_PATTERN.finditer(chat_name)}
+    group = next((group for group in DELIMITER_GROUPS if group in found), None)
+    if group is None:
+        return 0.0, None, None
+
+    sides = split_sides(chat_name, DELIMITER_GROUPS[group])
+    side_a, side_b = split_parties(sides[0]), split_parties(sides[1])
+
+    # Both sides must name someone ("24/7", "1/2" and "Notes /" are not intros)
+    for side in (side_a, side_b):
+        parties = side_parties(side)
+        if not any(parties) or not any(any(char.isalpha() for char in party) for party in parties):
+            return 0.0, side_a, side_b
+
+    score = DELIMITER_SCORES[group]
+    for side in (side_a, side_b):
+        parties = [party for party in side_parties(side) if party]
+        if all(looks_like_name(party) for party in parties):
+            score += NAME_SIDE_SCORE
+        if known_contacts and any(is_known_contact(party, known_contacts) for party in parties):
+            score += KNOWN_CONTACT_SCORE
+    if len(sides) > 2:
+        score -= EXTRA_SIDE_PENALTY
+    return round(score, 2), side_a, side_b
+
+
+def classify_intro_name(chat_name, known_contacts=frozenset(), threshold=INTRO_SCORE_THRESHOLD):
+    """
+    Classify a chat name in one pass.
+    Returns (is_intro, side_a, side_b); the sides are None when it is not an intro,
+    otherwise each is a single party (str) or a tuple of parties.
+    """
+    score, side_a, side_b = score_intro_name(chat_name, known_contacts)
+    if score < threshold:
+        return False, None, None
+    return True, side_a, side_b
+
+
+def is_intro_name(chat_name, known_contacts=frozenset()):
+    """Check if a chat name has the introduction group format"""
+    return classify_intro_name(chat_name, known_contacts)[0]
+
+
+def classify_many(chat_names, known_contacts=frozenset(), threshold=INTRO_SCORE_THRESHOLD):
+    """Classify many chat names. Returns a list of (is_intro, side_a, side_b) in the same order."""
+    return [classify_intro_name(chat_name, known_contacts, threshold) for chat_name in chat_names]
+
+
+def loop_is_intro(chat_name):
+    """The substring loop the scraper used before this module, for comparison"""
+    for delimiter in INTRO_DELIMITERS:
+        if delimiter in chat_name:
+            return True
+    return False
+
+
+def read_corpus(corpus_path=CORPUS_PATH):
+    """Labeled chat names: a list of (chat_name, is_intro, known_contacts)"""
+    with open(corpus_path, newline="", encoding="utf-8") as corpus_file:
+        return [(row["chat_name"], row["is_intro"] == "1",
+                 contact_name_keys(name for name in row["known_contacts"].split(";") if name))
+                for row in csv.DictReader(corpus_file)]
+
+
+def precision_recall(predictions, labels):
+    true_positives = sum(1 for predicted, label in zip(predictions, labels) if predicted and label)
+    predicted_positives = sum(predictions)
+    positives = sum(labels)
+    precision = true_positives / predicted_positives if predicted_positives else 1.0
+    recall = true_positives / positives if positives else 1.0
+    return precision, recall
+
+
+def evaluate(corpus_path=CORPUS_PATH, threshold=INTRO_SCORE_THRESHOLD):
+    """Print precision and recall on the labeled corpus, with and without known contacts"""
+    corpus = read_corpus(corpus_path)
+    labels = [is_intro for _, is_intro, _ in corpus]
+    runs = [
+        ("substring loop", [loop_is_intro(name) for name, _, _ in corpus]),
+        ("classifier", [classify_intro_name(name, threshold=threshold)[0] for name, _, _ in corpus]),
+        ("classifier + contacts", [classify_intro_name(name, contacts, threshold)[0] for name, _, contacts in corpus]),
+    ]
+    print(f"{len(corpus)} names, {sum(labels)} intros, threshold {threshold}")
+    for label, predictions in runs:
+        precision, recall = precision_recall(predictions, labels)
+        print(f"{label:24} precision {precision:6.1%}  recall {recall:6.1%}  opened {sum(predictions)}")
+
+    for (name, is_intro, contacts), predicted in zip(corpus, runs[-1][1]):
+        if predicted != is_intro:
+            score = score_intro_name(name, contacts)[0]
+            print(f"  {'missed' if is_intro else 'false positive'}: {name!r} (score {score})")
+
+
+def sample_names(count):
+    """Chat names like a real sidebar: mostly plain chats, some intros of each format"""
+    templates = ["Family", "Dana Cohen", "Work team {i}", "Dana // Yossi {i}", "Avi, Rina / Moshe {i}",
+                 "רונית <> דנה ויוסי {i}", "Alice x Bob {i}", "Xmas party {i}", "24/7 support {i}"]
+    return [templates[i % len(templates)].format(i=i) for i in range(count)]
+
+
+def benchmark(count, repeat):
+    names = sample_names(count)
+
+    def cold():
+        score_intro_name.cache_clear()
+        classify_many(names)
+
+    results = [
+        ("substring loop (filter only)", timeit(lambda: [loop_is_intro(name) for name in names], number=repeat)),
+        ("classify, cold cache", timeit(cold, number=repeat)),
+        ("classify, warm cache", timeit(lambda: classify_many(names), number=repeat)),
+    ]
+    print(f"{count} names, {sum(is_intro for is_intro, _, _ in classify_many(names))} intros")
+    for label, seconds in results:
+        print(f"{label:30} {seconds / repeat / count * 1e6:8.3f} µs/name")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark intro name classification, or evaluate it")
+    parser.add_argument("--names", type=int, default=10000, help="number of chat names per benchmark run")
+    parser.add_argument("--repeat", type=int, default=5, help="benchmark runs per measurement")
+    parser.add_argument("--evaluate", action="store_true", help="report precision and recall on the corpus")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--threshold", type=float, default=INTRO_SCORE_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.evaluate:
+        evaluate(args.corpus, args.threshold)
+    else:
+        benchmark(args.names, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Compare two scraper runs and list only what changed between them.
+
+Every run writes a full new output file. diff_groups() compares the previous run's groups
+with the current run's and yields one change per group that is different:
+
+    {"change": "added", "chat_name", "participants", "complete"}    - a group new in this run
+    {"change": "members", "chat_name", "joined", "left", "complete"} - participants who joined or left
+    {"change": "removed", "chat_name", "participants"}               - a group no longer found
+    {"change": "not_comparable", "chat_name", "previous_source", "source", "participants"}
+                                                                     - participants read differently
+
+The previous run is held in memory (one entry per group), and the current run is streamed
+against it, so changes come out while the current file is still being read. Participants
+are compared by person_id when both runs have them (see people_index.py), and by normalized
+phone number or name otherwise. A group saved as incomplete reports who joined but not who
+left, since the participants it is missing may not have left. A group whose participants were
+read from the chat header in one run and from group info in the other (see
+PARTICIPANTS_FROM_HEADER) lists short names in one and full names in the other, so its members
+are not compared at all.
+
+    python membership_diff.py whatsapp_chats_20251101_090000.csv whatsapp_chats_20251102_143055.csv
+    python membership_diff.py --latest --output changes.jsonl
+    python membership_diff.py --latest --notion --archive-removed
+"""
+import argparse
+import json
+from collections import Counter
+from os.path import join
+
+from output_sinks import read_groups
+from people_index import participant_identity
+from scrape_state import ScrapeState, chat_key
+
+
+def member_keys(participants, by_person_id):
+    """Identity key -> participant, for comparing a group's participants between runs"""
+    keys = {}
+    for participant in participants:
+        if by_person_id:
+            key = f"person:{participant['person_id']}"
+        else:
+            phone, name_key = participant_identity(participant)
+            key = phone or name_key or participant["name"]
+        keys.setdefault(key, participant)
+    return keys
+
+
+def member_changes(previous_participants, current_participants):
+    """(joined, left) participants of a group between two runs"""
+    by_person_id = all(participant.get("person_id") is not None
+                       for participant in previous_participants + current_participants)
+    previous = member_keys(previous_participants, by_person_id)
+    current = member_keys(current_participants, by_person_id)
+    joined = [participant for key, participant in current.items() if key not in previous]
+    left = [participant for key, participant in previous.items() if key not in current]
+    return joined, left
+
+
+def diff_groups(previous_records, current_records):
+    """
+    Yield the changes between two runs' records (see read_groups), current run order first,
+    then the removed groups. A group saved twice in one run counts as its last save.
+    """
+    previous = {}
+    for record in previous_records:
+        previous[chat_key(record["chat_name"])] = record
+
+    seen = set()
+    for record in current_records:
+        key = chat_key(record["chat_name"])
+        if key in seen:
+            continue
+        seen.add(key)
+        old = previous.get(key)
+        if old is None:
+            yield {"change": "added", "chat_name": record["chat_name"], "participants": record["participants"],
+                   "complete": record["complete"]}
+            continue
+        if old.get("participants_source") and record.get("participants_source") and \
+                old["participants_source"] != record["participants_source"]:
+            yield {"change": "not_comparable", "chat_name": record["chat_name"],
+                   "previous_source": old["participants_source"], "source": record["participants_source"],
+                   "participants": record["participants"]}
+            continue
+        joined, left = member_changes(old["participants"], record["participants"])
+        if not record["complete"]:
+            left = []
+        if joined or left:
+            yield {"change": "members", "chat_name": record["chat_name"], "joined": joined, "left": left,
+                   "complete": record["complete"]}
+
+    for key, record in previous.items():
+        if key not in seen:
+            yield {"change": "removed", "chat_name": record["chat_name"], "participants": record["participants"]}
+
+
+def latest_outputs(state_path):
+    """(previous, current) output paths of the two most recent complete runs"""
+    state = ScrapeState(state_path)
+    try:
+        outputs = state.completed_run_outputs(2)
+    finally:
+        state.close()
+    if len(outputs) < 2:
+        raise ValueError(f"{state_path} has {len(outputs)} complete runs, 2 are needed")
+    return outputs[1], outputs[0]
+
+
+def print_change(change):
+    if change["change"] == "added":
+        print(f"+ {change['chat_name']} ({len(change['participants'])} participants)")
+    elif change["change"] == "removed":
+        print(f"- {change['chat_name']}")
+    elif change["change"] == "not_comparable":
+        print(f"? {change['chat_name']} (participants read from {change['source']}, "
+              f"previously from {change['previous_source']}: not compared)")
+    else:
+        print(f"~ {change['chat_name']}")
+        for participant in change["joined"]:
+            print(f"    joined: {participant['name']} ({participant['phone']})")
+        for participant in change["left"]:
+            print(f"    left:   {participant['name']} ({participant['phone']})")
+
+
+def apply_to_notion(changes, database_id, archive_removed=False):
+    """
+    Write the changes to a Notion intro database: added intro groups are upserted, and
+    removed ones archived if archive_removed. Intro pages have no participants, so member
+    changes leave them as they are.
+    """
+    # Imported here so diffing works without notion-client installed
+    from chat_parser import notion_client, page_properties, record_intro
+    from notion_sync import NotionSync
+
+    added, removed = [], []
+    for change in changes:
+        if change["change"] in ("members", "not_comparable"):
+            continue
+        intro = record_intro(change)
+        if intro is not None:
+            (added if change["change"] == "added" else removed).append(page_properties(*intro))
+
+    notion_sync = NotionSync(notion_client(), database_id)
+    created, updated, unchanged, failed = notion_sync.sync(added)
+    print(f"Created {created} pages, updated {updated}, {unchanged} already up to date, {failed} failed")
+    if archive_removed and removed:
+        archived, missing, failed = notion_sync.archive(removed, refresh=False)
+        print(f"Archived {archived} pages, {missing} were not in the database, {failed} failed")
+    elif removed:
+        print(f"{len(removed)} removed intros left in Notion (use --archive-removed to archive them)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the groups and members that changed between two scraper runs")
+    parser.add_argument("previous", nargs="?", help="output of the earlier run (CSV, .jsonl or .sqlite3)")
+    parser.add_argument("current", nargs="?", help="output of the later run")
+    parser.add_argument("--latest", action="store_true",
+                        help="compare the two most recent complete runs in the scraper's state database")
+    parser.add_argument("--state", help="scraper state database for --latest (default: the scraper's)")
+    parser.add_argument("--output", help="write the changes to this file, one JSON object per line")
+    parser.add_argument("--notion", action="store_true", help="apply the changes to the Notion intro database")
+    parser.add_argument("--database", help="Notion database id (default: chat_parser.py's)")
+    parser.add_argument("--archive-removed", action="store_true",
+                        help="with --notion, archive the pages of intro groups that are gone "
+                             "(off by default: a search or interrupted run does not find every group)")
+    args = parser.parse_args()
+
+    if args.latest:
+        state_path = args.state
+        if state_path is None:
+            import scrape_whatsapp_chats as scraper
+            state_path = join(scraper.OUTPUT_DIRECTORY, scraper.STATE_DB_NAME)
+        try:
+            args.previous, args.current = latest_outputs(state_path)
+        except ValueError as e:
+            parser.error(str(e))
+    elif not (args.previous and args.current):
+        parser.error("give the previous and current output files, or --latest")
+    print(f"Comparing {args.previous} -> {args.current}")
+
+    counts = Counter()
+    changes = []
+    output_file = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for change in diff_groups(read_groups(args.previous), read_groups(args.current)):
+            counts[change["change"]] += 1
+            if change["change"] == "members":
+                counts["joined"] += len(change["joined"])
+                counts["left"] += len(change["left"])
+            if output_file:
+                output_file.write(json.dumps(change, ensure_ascii=False) + "\n")
+            else:
+                print_change(change)
+            if args.notion:
+                changes.append(change)
+    finally:
+        if output_file:
+            output_file.close()
+
+    print(f"{counts['added']} groups added, {counts['removed']} removed, {counts['members']} with member changes "
+          f"({counts['joined']} joined, {counts['left']} left), {counts['not_comparable']} not comparable")
+    if args.output:
+        print(f"Changes written to {args.output}")
+    if args.notion:
+        from chat_parser import TEMP_DB_ID
+        apply_to_notion(changes, args.database or TEMP_DB_ID, args.archive_removed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Local stand-in for the Notion API endpoints the uploader uses (creating, updating and
+querying pages in a database), for trying out uploads without touching a real workspace.
+
+    python notion_stub_server.py --port 8765 --error-rate 0.2
+    NOTION_BASE_URL=http://127.0.0.1:8765 NOTION_SECRET=stub python chat_parser.py whatsapp_chats.csv
+
+A share of requests (--error-rate) fail with a 429 (with Retry-After) or a 5xx,
+so retries can be seen working. Pages are kept in memory.
+"""
+import argparse
+import json
+import random
+import threading
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def timestamp():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def with_plain_text(properties):
+    """Add the plain_text fields Notion returns to title and rich_text properties"""
+    for prop in properties.values():
+        for part in prop.get("title", []) + prop.get("rich_text", []):
+            part.setdefault("plain_text", part.get("text", {}).get("content", ""))
+    return properties
+
+
+class NotionStubHandler(BaseHTTPRequestHandler):
+    error_rate = 0.0
+    pages = {}
+    lock = threading.Lock()
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def maybe_fail(self):
+        """Fail the request with a 429 or 5xx at the configured rate. Returns True if it failed."""
+        if random.random() >= self.error_rate:
+            return False
+        if random.random() < 0.5:
+            self.send_json(429, {"object": "error", "status": 429, "code": "rate_limited",
+                                 "message": "Rate limited"}, {"Retry-After": "1"})
+        else:
+            status = random.choice([500, 502, 503])
+            self.send_json(status, {"object": "error", "status": status, "code": "internal_server_error",
+                                    "message": "Stub server error"})
+        return True
+
+    def send_not_found(self):
+        self.send_json(404, {"object": "error", "status": 404, "code": "object_not_found",
+                             "message": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        body = self.read_json()
+        if path == "/v1/pages":
+            if self.maybe_fail():
+                return
+            now = timestamp()
+            page = {"object": "page", "id": str(uuid.uuid4()), "created_time": now, "last_edited_time": now,
+                    "parent": body.get("parent"), "properties": with_plain_text(body.get("properties", {})),
+                    "archived": False}
+            with self.lock:
+                self.pages[page["id"]] = page
+            self.send_json(200, page)
+        elif path.startswith("/v1/databases/") and path.endswith("/query"):
+            if self.maybe_fail():
+                return
+            self.send_json(200, self.query(path.split("/")[3], body))
+        else:
+            self.send_not_found()
+
+    def do_PATCH(self):
+        path = self.path.rstrip("/")
+        body = self.read_json()
+        page_id = path[len("/v1/pages/"):] if path.startswith("/v1/pages/") else None
+        with self.lock:
+            page = self.pages.get(page_id)
+        if page is None:
+            self.send_not_found()
+            return
+        if self.maybe_fail():
+            return
+        with self.lock:
+            page["properties"].update(with_plain_text(body.get("properties", {})))
+            page["archived"] = body.get("archived", page["archived"])
+            page["last_edited_time"] = timestamp()
+        self.send_json(200, page)
+
+    def query(self, database_id, body):
+        """Database query with the last_edited_time filter and cursor pagination"""
+        since = body.get("filter", {}).get("last_edited_time", {}).get("on_or_after")
+        with self.lock:
+            pages = [page for page in self.pages.values()
+                     if page["parent"].get("database_id") == database_id and not page["archived"]
+                     and (since is None or parse_time(page["last_edited_time"]) >= parse_time(since))]
+        start = int(body.get("start_cursor") or 0)
+        end = start + body.get("page_size", 100)
+        return {"object": "list", "results": pages[start:end], "has_more": end < len(pages),
+                "next_cursor": str(end) if end < len(pages) else None}
+
+    def log_message(self, format, *args):
+        print(f"{self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub of the Notion pages API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of requests answered with a 429 or 5xx (0-1)")
+    args = parser.parse_args()
+
+    NotionStubHandler.error_rate = args.error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), NotionStubHandler)
+    print(f"Notion stub listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nStopped. {len(NotionStubHandler.pages)} pages created.")
+
+
+if __name__ == "__main__":
+    main()
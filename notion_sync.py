@@ -0,0 +1,208 @@
+import json
+from datetime import datetime, timedelta, timezone
+from os.path import exists
+
+from notion_client.errors import HTTPResponseError
+
+from intro_names import normalize_name
+from notion_uploader import NotionUploader
+
+NOTION_INDEX_CACHE = "notion_index_cache.json"
+QUERY_PAGE_SIZE = 100  # Notion's maximum
+# Notion rounds last_edited_time to the minute, so incremental refreshes look back a little further
+REFRESH_OVERLAP = timedelta(minutes=2)
+# Database queries never return archived or deleted pages, so incremental refreshes can't see them go.
+# The index is rebuilt from a full query this often, dropping the pages it no longer returns.
+FULL_REFRESH_INTERVAL = timedelta(days=1)
+
+
+def plain_text(prop):
+    """The plain text of a title or rich_text property, from a page or from page properties to send"""
+    if not prop:
+        return ""
+    parts = prop.get("title", prop.get("rich_text", []))
+    return "".join(part.get("plain_text", part.get("text", {}).get("content", "")) for part in parts)
+
+
+def intro_entry(properties):
+    """The texts of an intro's Connection, First Side and Second Side properties"""
+    return {
+        "connection": plain_text(properties.get("Connection")),
+        "first": plain_text(properties.get("First Side")),
+        "second": plain_text(properties.get("Second Side")),
+    }
+
+
+def intro_key(entry):
+    """Identity of an intro: its normalized sides, or its normalized Connection title if it has none"""
+    if entry["first"] or entry["second"]:
+        return f"{normalize_name(entry['first'])}|{normalize_name(entry['second'])}"
+    return normalize_name(entry["connection"])
+
+
+class NotionIndex:
+    """
+    Local index of the intro pages already in a Notion database: intro key -> page id and texts.
+    Cached on disk; refresh() only asks Notion for pages edited since the last refresh, except
+    for a full rebuild every FULL_REFRESH_INTERVAL.
+    """
+
+    def __init__(self, uploader, database_id, cache_path=NOTION_INDEX_CACHE):
+        self.uploader = uploader
+        self.database_id = database_id
+        self.cache_path = cache_path
+        self.synced_at = None
+        self.rebuilt_at = None
+        self.pages = {}
+        if exists(cache_path):
+            with open(cache_path, encoding="utf-8") as cache_file:
+                cache = json.load(cache_file)
+            if cache.get("database_id") == database_id:
+                self.synced_at = cache["synced_at"]
+                self.rebuilt_at = cache.get("rebuilt_at")  # Caches written before full rebuilds have none
+                self.pages = cache["pages"]
+
+    def needs_rebuild(self, now):
+        return not self.synced_at or not self.rebuilt_at or \
+            now - datetime.fromisoformat(self.rebuilt_at) >= FULL_REFRESH_INTERVAL
+
+    def refresh(self, full=None):
+        """
+        Page through the database: only pages edited since the last refresh, or all of them
+        when full (by default, when the index is new or FULL_REFRESH_INTERVAL old). A full
+        refresh replaces the index, so pages archived or deleted in Notion drop out of it.
+        """
+        started_at = datetime.now(timezone.utc)
+        if full is None:
+            full = self.needs_rebuild(started_at)
+        body = {"page_size": QUERY_PAGE_SIZE}
+        previous = self.pages
+        if full:
+            self.pages = {}
+        else:
+            since = datetime.fromisoformat(self.synced_at) - REFRESH_OVERLAP
+            body["filter"] = {"timestamp": "last_edited_time",
+                              "last_edited_time": {"on_or_after": since.isoformat()}}
+
+        fetched = 0
+        while True:
+            response = self.uploader.call(self.query_page, body=body)
+            for page in response["results"]:
+                self.add_page(page)
+                fetched += 1
+            if not response.get("has_more"):
+                break
+            body["start_cursor"] = response["next_cursor"]
+
+        self.synced_at = started_at.isoformat()
+        if full:
+            self.rebuilt_at = self.synced_at
+            print(f"Notion index: rebuilt from {fetched} pages, {len(self.pages)} intros known "
+                  f"({sum(1 for key in previous if key not in self.pages)} gone from Notion)")
+        else:
+            print(f"Notion index: {fetched} pages fetched, {len(self.pages)} intros known")
+
+    def query_page(self, body):
+        """One page of a database query (notion-client has no wrapper for it on every API version)"""
+        return self.uploader.notion.request(path=f"databases/{self.database_id}/query", method="POST", body=body)
+
+    def add_page(self, page):
+        """Add or replace a page from a Notion response (archived pages are removed)"""
+        entry = intro_entry(page.get("properties", {}))
+        key = intro_key(entry)
+        if page.get("archived") or page.get("in_trash"):
+            if self.pages.get(key, {}).get("page_id") == page["id"]:
+                del self.pages[key]
+            return
+        entry["page_id"] = page["id"]
+        self.pages[key] = entry
+
+    def save(self):
+        with open(self.cache_path, "w", encoding="utf-8") as cache_file:
+            json.dump({"database_id": self.database_id, "synced_at": self.synced_at, "rebuilt_at": self.rebuilt_at,
+                       "pages": self.pages}, cache_file, ensure_ascii=False)
+
+
+class NotionSync:
+    """
+    Idempotent upload of intros to a Notion database: new intros are created, intros whose
+    texts changed are updated, and intros already there are left alone.
+    """
+
+    def __init__(self, notion, database_id, cache_path=NOTION_INDEX_CACHE, uploader=None):
+        self.database_id = database_id
+        self.uploader = uploader or NotionUploader(notion)
+        self.index = NotionIndex(self.uploader, database_id, cache_path)
+
+    def sync(self, properties_list, refresh=True):
+        """
+        Upsert intro page properties. Returns (created, updated, unchanged, failed) counts.
+        refresh=False skips asking Notion for changes first, for callers that sync many small
+        batches in a row and refreshed once at the start.
+        """
+        if refresh:
+            self.index.refresh()
+
+        # The same intro twice in one batch is written once (the last one wins)
+        wanted = {}
+        for properties in properties_list:
+            wanted[intro_key(intro_entry(properties))] = properties
+
+        creates, updates, unchanged = [], [], 0
+        for key, properties in wanted.items():
+            existing = self.index.pages.get(key)
+            if existing is None:
+                creates.append((key, properties))
+            elif intro_entry(properties) != {name: existing[name] for name in ("connection", "first", "second")}:
+                updates.append((key, existing["page_id"], properties))
+            else:
+                unchanged += 1
+        print(f"Notion sync: {len(creates)} to create, {len(updates)} to update, {unchanged} unchanged")
+
+        calls = [(self.uploader.notion.pages.update, {"page_id": page_id, "properties": properties})
+                 for _, page_id, properties in updates]
+        calls += [(self.uploader.notion.pages.create, {"parent": {"database_id": self.database_id},
+                                                       "properties": properties})
+                  for _, properties in creates]
+        results = self.uploader.run(calls, "page writes")
+
+        failed = 0
+        for result in results:
+            if isinstance(result, Exception):
+                failed += 1
+            else:
+                self.index.add_page(result)
+
+        # Pages deleted in Notion since they were indexed can't be updated - forget them and
+        # create them again on the next sync
+        for (key, page_id, _), result in zip(updates, results):
+            if isinstance(result, HTTPResponseError) and result.status == 404:
+                self.index.pages.pop(key, None)
+
+        self.index.save()
+        return len(creates), len(updates), unchanged, failed
+
+    def archive(self, properties_list, refresh=True):
+        """
+        Archive the pages of intros that are gone (groups that were left or deleted).
+        Returns (archived, missing, failed) counts; intros that have no page are missing.
+        """
+        if refresh:
+            self.index.refresh()
+
+        keys = {intro_key(intro_entry(properties)) for properties in properties_list}
+        pages = [(key, self.index.pages[key]["page_id"]) for key in keys if key in self.index.pages]
+        missing = len(keys) - len(pages)
+        print(f"Notion sync: {len(pages)} to archive, {missing} not in the database")
+
+        results = self.uploader.run([(self.uploader.notion.pages.update, {"page_id": page_id, "archived": True})
+                                     for _, page_id in pages], "page archives")
+        failed = 0
+        for (key, _), result in zip(pages, results):
+            if isinstance(result, Exception):
+                failed += 1
+            else:
+                self.index.pages.pop(key, None)
+
+        self.index.save()
+        return len(pages) - failed, missing, failed
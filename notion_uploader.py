@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import httpx
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+NOTION_REQUESTS_PER_SECOND = 3  # Notion's average rate limit per integration
+MAX_IN_FLIGHT = 4  # Requests running at the same time
+MAX_RETRIES = 5  # Retries per request on 429, 5xx and network errors
+BACKOFF_BASE = 0.5  # Seconds before the first retry; doubles with every retry
+BACKOFF_MAX = 30
+PROGRESS_EVERY = 10  # Print progress after this many finished requests
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for a while (e.g. after Notion asked us to slow down)"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0)
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+def retry_delay(error, attempt):
+    """
+    Seconds to wait before retrying a failed request, or None if it should not be retried.
+    429s honor Retry-After; 5xx, timeouts and network errors back off exponentially with jitter.
+    """
+    if isinstance(error, HTTPResponseError):
+        if error.status == 429:
+            retry_after = error.headers.get("retry-after") if error.headers else None
+            try:
+                return float(retry_after) + random.uniform(0, BACKOFF_BASE)
+            except (TypeError, ValueError):
+                pass
+        elif error.status < 500:
+            return None
+    elif not isinstance(error, (RequestTimeoutError, httpx.TransportError)):
+        return None
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class NotionUploader:
+    """
+    Runs Notion API calls concurrently under a token-bucket rate limit,
+    retrying rate-limited (429) and server (5xx) errors.
+    """
+
+    def __init__(self, notion, rate=NOTION_REQUESTS_PER_SECOND, max_in_flight=MAX_IN_FLIGHT,
+                 max_retries=MAX_RETRIES):
+        self.notion = notion
+        self.bucket = TokenBucket(rate)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+
+    def call(self, method, **kwargs):
+        """Call a notion_client method (e.g. notion.pages.create) with rate limiting and retries"""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return method(**kwargs)
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                if isinstance(e, HTTPResponseError) and e.status == 429:
+                    self.bucket.pause(delay)
+                time.sleep(delay)
+
+    def run(self, calls, label="requests"):
+        """
+        Run (method, kwargs) pairs concurrently.
+        Returns a list with, for each call in order, the response or the exception it failed with.
+        """
+        results = [None] * len(calls)
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = {executor.submit(self.call, method, **kwargs): i for i, (method, kwargs) in enumerate(calls)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = e
+                    failed += 1
+                    print(f"Request {i + 1} failed: {e}")
+                if done % PROGRESS_EVERY == 0 or done == len(calls):
+                    print(f"Finished {done}/{len(calls)} {label} ({failed} failed)")
+        return results
+
+    def create_pages(self, database_id, properties_list):
+        """Create one page per properties dict in the given database"""
+        calls = [(self.notion.pages.create, {"parent": {"database_id": database_id}, "properties": properties})
+                 for properties in properties_list]
+        return self.run(calls, "page creations")
@@ -0,0 +1,320 @@
+"""
+Where the scraper saves the groups it scrapes.
+
+A sink keeps its file open for the whole run and is written one group at a time:
+
+    with open_sink("whatsapp_chats_20251102_143055.csv") as sink:
+        sink.write_group(chat_name, participants, complete)
+
+The format follows the file extension:
+  .csv     - one row per participant, in the format chat_parser.py reads (the default)
+  .jsonl   - one line per group: {"chat_name", "participant_count", "participants", "complete", "saved_at"}
+  .sqlite3 - a groups table and a participants table, to query the results with SQL:
+             SELECT g.chat_name, p.name, p.phone FROM participants p JOIN groups g USING (group_id)
+
+Every group is handed to the operating system as soon as it is written, so a crash of the
+scraper never loses a group it reported as saved (ScrapeState checkpoints it right after).
+What is batched is syncing to disk: every FLUSH_EVERY_GROUPS groups or FLUSH_EVERY_SECONDS
+seconds, whichever comes first, and when the sink is closed.
+"""
+import csv
+import json
+import os
+import sqlite3
+from itertools import groupby
+from os.path import splitext
+from time import monotonic
+
+from scrape_state import add_missing_columns, current_time
+
+FLUSH_EVERY_GROUPS = 10  # Sync to disk after this many groups...
+FLUSH_EVERY_SECONDS = 5.0  # ...or this long after the last sync, whichever comes first
+NO_PARTICIPANT = "N/A"  # Placeholder for a missing participant name or phone
+# Where a group's participants were read: the chat header lists small groups by short display
+# names ("Dana"), group info by the names saved in the contacts ("Dana Cohen")
+PARTICIPANTS_FROM_HEADER = "header"
+PARTICIPANTS_FROM_GROUP_INFO = "group info"
+CSV_FIELDNAMES = ['chat_name', 'chat_type', 'participant_name', 'participant_phone', 'participant_count',
+                  'participants_complete', 'person_id', 'participants_source']
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    group_id INTEGER PRIMARY KEY,
+    chat_name TEXT NOT NULL,
+    participant_count INTEGER NOT NULL,
+    complete INTEGER NOT NULL,
+    saved_at TEXT NOT NULL,
+    participants_source TEXT
+);
+CREATE TABLE IF NOT EXISTS participants (
+    group_id INTEGER NOT NULL REFERENCES groups(group_id),
+    name TEXT NOT NULL,
+    phone TEXT,
+    is_admin INTEGER NOT NULL DEFAULT 0,
+    person_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS participants_by_group ON participants(group_id);
+CREATE INDEX IF NOT EXISTS participants_by_phone ON participants(phone);
+"""
+SQLITE_ADDED_COLUMNS = {"groups": {"participants_source": "TEXT"}}  # For files written before the column existed
+
+
+class OutputSink:
+    """
+    Base class of the sinks: subclasses implement write(), sync() and close_file().
+    Appends to the file if it already exists (e.g. when a run is resumed).
+    """
+
+    def __init__(self, path, flush_groups=FLUSH_EVERY_GROUPS, flush_seconds=FLUSH_EVERY_SECONDS):
+        self.path = path
+        self.flush_groups = flush_groups
+        self.flush_seconds = flush_seconds
+        self.unsynced = 0
+        self.last_sync = monotonic()
+        self.groups = 0
+
+    def write_group(self, chat_name, participants, complete=True, source=None):
+        """
+        Save one group; participants are dicts with name, phone and optionally is_admin.
+        source is where they were read (PARTICIPANTS_FROM_HEADER or PARTICIPANTS_FROM_GROUP_INFO).
+        """
+        self.write(chat_name, participants or [], complete, source)
+        self.groups += 1
+        self.unsynced += 1
+        if self.unsynced >= self.flush_groups or monotonic() - self.last_sync >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Sync everything written so far to disk"""
+        if self.unsynced:
+            self.sync()
+        self.unsynced = 0
+        self.last_sync = monotonic()
+
+    def close(self):
+        self.flush()
+        self.close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FileSink(OutputSink):
+    """A sink writing to a text file it keeps open"""
+
+    def __init__(self, path, **options):
+        super().__init__(path, **options)
+        self.file = open(path, 'a', newline='', encoding='utf-8')
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close_file(self):
+        self.file.close()
+
+
+class CsvSink(FileSink):
+    """
+    One row per participant (a placeholder row for a group without participants).
+    Appending to a file written by an older version keeps that file's columns, so its
+    rows stay aligned with its header (columns it lacks are not written).
+    """
+
+    def __init__(self, path, **options):
+        super().__init__(path, **options)
+        # Write header only if the file is new
+        if self.file.tell() == 0:
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDNAMES)
+            self.csv_writer.writeheader()
+        else:
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=csv_header(path), extrasaction='ignore')
+
+    def write(self, chat_name, participants, complete, source):
+        participant_count = len(participants)
+        rows = [{
+            "chat_name": chat_name,
+            "chat_type": "group",
+            "participant_name": participant["name"],
+            "participant_phone": participant["phone"],
+            "participant_count": participant_count,
+            "participants_complete": complete,
+            "person_id": participant.get("person_id", ""),
+            "participants_source": source or ""
+        } for participant in participants]
+        if not rows:
+            rows.append({
+                "chat_name": chat_name,
+                "chat_type": "group",
+                "participant_name": NO_PARTICIPANT,
+                "participant_phone": NO_PARTICIPANT,
+                "participant_count": 0,
+                "participants_complete": complete,
+                "participants_source": source or ""
+            })
+        self.csv_writer.writerows(rows)
+        self.file.flush()
+
+
+def csv_header(path):
+    """The column names in the first line of an existing CSV"""
+    with open(path, newline='', encoding='utf-8-sig') as csvfile:
+        return next(csv.reader(csvfile), None) or CSV_FIELDNAMES
+
+
+class JsonLinesSink(FileSink):
+    """One JSON object per group"""
+
+    def write(self, chat_name, participants, complete, source):
+        self.file.write(json.dumps({
+            "chat_name": chat_name,
+            "participant_count": len(participants),
+            "participants": [{"name": participant["name"], "phone": participant["phone"],
+                              "is_admin": bool(participant.get("is_admin")),
+                              "person_id": participant.get("person_id")} for participant in participants],
+            "complete": complete,
+            "participants_source": source,
+            "saved_at": current_time(),
+        }, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+
+class SqliteSink(OutputSink):
+    """
+    Groups and participants in separate tables. Every group is committed on its own;
+    in WAL mode with synchronous=NORMAL a commit does not wait for the disk, the
+    checkpoints in sync() do.
+    """
+
+    def __init__(self, path, **options):
+        super().__init__(path, **options)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SQLITE_SCHEMA)
+        add_missing_columns(self.db, SQLITE_ADDED_COLUMNS)
+
+    def write(self, chat_name, participants, complete, source):
+        with self.db:
+            group_id = self.db.execute(
+                "INSERT INTO groups (chat_name, participant_count, complete, saved_at, participants_source) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (chat_name, len(participants), int(bool(complete)), current_time(), source)).lastrowid
+            self.db.executemany(
+                "INSERT INTO participants (group_id, name, phone, is_admin, person_id) VALUES (?, ?, ?, ?, ?)",
+                [(group_id, participant["name"],
+                  None if participant["phone"] == NO_PARTICIPANT else participant["phone"],
+                  int(bool(participant.get("is_admin"))), participant.get("person_id"))
+                 for participant in participants])
+
+    def sync(self):
+        self.db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close_file(self):
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.db.close()
+
+
+# Output format name -> (sink class, file extension)
+OUTPUT_FORMATS = {
+    "csv": (CsvSink, ".csv"),
+    "jsonl": (JsonLinesSink, ".jsonl"),
+    "sqlite": (SqliteSink, ".sqlite3"),
+}
+
+
+def output_extension(output_format):
+    return OUTPUT_FORMATS[output_format][1]
+
+
+def path_format(path):
+    """The output format of a file, from its extension (CSV if it is not known)"""
+    extension = splitext(path)[1].lower()
+    return next((name for name, (_, known) in OUTPUT_FORMATS.items() if known == extension), "csv")
+
+
+def open_sink(path, **options):
+    """An open sink for path, in the format its extension names"""
+    return OUTPUT_FORMATS[path_format(path)][0](path, **options)
+
+
+def read_groups(path):
+    """
+    Read the groups saved in any of the formats back, one at a time, as dicts with
+    chat_name, participant_count, participants ([{"name", "phone", "person_id"}], phone "N/A"
+    if unknown, person_id None if the file has none), complete and participants_source
+    (None if not recorded).
+    """
+    output_format = path_format(path)
+    if output_format == "jsonl":
+        return read_jsonl_groups(path)
+    if output_format == "sqlite":
+        return read_sqlite_groups(path)
+    return read_csv_groups(path)
+
+
+def read_csv_groups(path):
+    """Consecutive rows of the same chat form one group; only one group's rows are held in memory"""
+    with open(path, newline="", encoding="utf-8-sig") as csvfile:
+        for chat_name, rows in groupby(csv.DictReader(csvfile), key=lambda row: row["chat_name"]):
+            participants = []
+            participant_count = 0
+            complete = True
+            source = None
+            for row in rows:
+                try:
+                    participant_count = int(row.get("participant_count") or 0)
+                except ValueError:
+                    pass
+                # Files written before the column existed have no participants_complete
+                complete = row.get("participants_complete", "True") != "False"
+                source = row.get("participants_source") or None
+                if row.get("participant_name") and row["participant_name"] != NO_PARTICIPANT:
+                    person_id = row.get("person_id") or ""
+                    participants.append({"name": row["participant_name"],
+                                         "phone": row.get("participant_phone") or NO_PARTICIPANT,
+                                         "person_id": int(person_id) if person_id.isdigit() else None})
+            yield {
+                "chat_name": chat_name,
+                "participant_count": participant_count or len(participants),
+                "participants": participants,
+                "complete": complete,
+                "participants_source": source,
+            }
+
+
+def read_jsonl_groups(path):
+    with open(path, encoding="utf-8") as jsonl_file:
+        for line in jsonl_file:
+            if not line.strip():
+                continue
+            group = json.loads(line)
+            yield {
+                "chat_name": group["chat_name"],
+                "participant_count": group.get("participant_count") or len(group["participants"]),
+                "participants": [{"name": participant["name"], "phone": participant.get("phone") or NO_PARTICIPANT,
+                                  "person_id": participant.get("person_id")} for participant in group["participants"]],
+                "complete": group.get("complete", True),
+                "participants_source": group.get("participants_source"),
+            }
+
+
+def read_sqlite_groups(path):
+    db = sqlite3.connect(path)
+    try:
+        columns = {row[1] for row in db.execute("PRAGMA table_info(groups)")}
+        source_column = "participants_source" if "participants_source" in columns else "NULL"
+        groups = db.execute(f"SELECT group_id, chat_name, participant_count, complete, {source_column} "
+                            "FROM groups ORDER BY group_id")
+        for group_id, chat_name, participant_count, complete, source in groups.fetchall():
+            participants = [{"name": name, "phone": phone or NO_PARTICIPANT, "person_id": person_id}
+                            for name, phone, person_id in db.execute(
+                                "SELECT name, phone, person_id FROM participants WHERE group_id = ? ORDER BY rowid",
+                                (group_id,))]
+            yield {"chat_name": chat_name, "participant_count": participant_count or len(participants),
+                   "participants": participants, "complete": bool(complete), "participants_source": source}
+    finally:
+        db.close()
@@ -0,0 +1,319 @@
+"""
+Scrape several WhatsApp accounts in parallel, one Chrome instance per profile.
+
+    python parallel_scrape.py --session dana ~/profiles/dana --session yossi ~/profiles/yossi "Profile 1"
+
+Each --session is a name, a Chrome user data directory and optionally the profile inside
+it (default "Default"). Every profile must already be logged in to WhatsApp Web, since
+sessions run unattended. Each session writes its own output (in --format), log and state
+database; once all sessions are done their outputs are merged into one deduplicated CSV.
+A session that fails does not stop the others.
+"""
+import argparse
+import csv
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import Manager
+from os.path import exists, join, splitext
+
+import scrape_whatsapp_chats as scraper
+from intro_names import contact_name_keys
+from output_sinks import OUTPUT_FORMATS, output_extension, read_groups
+from people_index import PEOPLE_DB_NAME, PeopleIndex, normalize_phone
+from scrape_state import ScrapeState, chat_key
+
+MERGED_NAME = "whatsapp_chats_merged"  # Timestamp will be added automatically
+SESSION_NAME_PATTERN = re.compile(r"^[\w-]+$")  # Used in file names
+SELF_NAME = "You"  # How a session's own account appears among the participants
+MERGED_FIELDNAMES = ['chat_name', 'chat_type', 'participant_name', 'participant_phone', 'participant_count',
+                     'participants_complete', 'sessions']
+
+
+def session_state_path(name):
+    """Each session keeps its own state database, so sessions never write to the same SQLite file"""
+    base, extension = splitext(scraper.STATE_DB_NAME)
+    return join(scraper.OUTPUT_DIRECTORY, f"{base}_{name}{extension}")
+
+
+def session_people_path(name):
+    """Each session also keeps its own people index"""
+    base, extension = splitext(PEOPLE_DB_NAME)
+    return join(scraper.OUTPUT_DIRECTORY, f"{base}_{name}{extension}")
+
+
+def session_output_path(timestamp, name, output_format="csv"):
+    return join(scraper.OUTPUT_DIRECTORY, f"{scraper.OUTPUT_NAME}_{timestamp}_{name}{output_extension(output_format)}")
+
+
+def run_session(session, timestamp, discovery, incremental, output_format, verbose, progress):
+    """
+    Scrape one account in this process. Progress messages are put on the progress queue
+    as (session name, kind, text). Returns a summary dict; never raises.
+    """
+    name = session["name"]
+    result = {
+        "name": name,
+        "output_path": session_output_path(timestamp, name, output_format),
+        "log_path": join(scraper.OUTPUT_DIRECTORY, f"{scraper.LOG_NAME}_{timestamp}_{name}.log"),
+        "metrics_path": join(scraper.OUTPUT_DIRECTORY, f"{scraper.METRICS_NAME}_{timestamp}_{name}.json"),
+        "status": "failed",
+        "groups": 0,
+        "error": None,
+    }
+    # The console belongs to the orchestrator; each session logs to its own file
+    scraper.setup_logging(result["log_path"], console=False, verbose=verbose)
+    # A pool worker may have run another account's session before: start from scratch
+    scraper.header_strategy = None
+    scraper.wait_latencies.clear()
+    scraper.wait_timeouts.clear()
+    scraper.metrics.reset()
+
+    def on_group(chat_name, participants, complete):
+        result["groups"] += 1
+        progress.put((name, "group", f"{chat_name} ({len(participants)} participants"
+                                     f"{'' if complete else ', incomplete'})"))
+
+    state = None
+    driver = None
+    try:
+        state = ScrapeState(session_state_path(name), incremental=incremental)
+        state.start_run(timestamp, result["output_path"])
+        scraper.known_contacts = contact_name_keys(state.participant_names())
+        scraper.people_index = PeopleIndex(session_people_path(name))
+
+        progress.put((name, "status", "opening WhatsApp Web"))
+        driver = scraper.open_whatsapp(session["user_data_dir"], session["profile_directory"], interactive=False)
+        progress.put((name, "status", "scanning chats"))
+        scraper.process_introduction_groups(driver, result["output_path"], discovery, state, on_group)
+        result["status"] = "complete"
+    except KeyboardInterrupt:
+        result["status"] = "interrupted"
+    except Exception as e:
+        result["error"] = str(e)
+        scraper.log(f"✗ Error: {e}")
+    finally:
+        if state is not None:
+            state.finish_run(result["status"])
+            state.close()
+        if scraper.people_index is not None:
+            scraper.people_index.close()
+            scraper.people_index = None
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        try:
+            scraper.metrics.write(result["metrics_path"], scraper.wait_latencies, scraper.wait_timeouts,
+                                  session=name, status=result["status"], output_path=result["output_path"])
+        except Exception as e:
+            scraper.log(f"Warning: Could not save metrics: {e}")
+
+    # This worker process may exit without running atexit handlers, so flush the log now
+    scraper.stop_logging()
+    progress.put((name, "status", f"{result['status']}, {result['groups']} groups"
+                                  + (f" ({result['error']})" if result["error"] else "")))
+    return result
+
+
+def report_progress(progress):
+    """Log progress messages from the sessions until a None message arrives"""
+    groups = Counter()
+    while True:
+        message = progress.get()
+        if message is None:
+            return
+        name, kind, text = message
+        if kind == "group":
+            groups[name] += 1
+            scraper.log(f"[{name}] ✓ {text} - {groups[name]} groups, {sum(groups.values())} in total")
+        else:
+            scraper.log(f"[{name}] {text}")
+
+
+class MergedGroup:
+    """One group as seen by one or more sessions, with its participants deduplicated"""
+
+    def __init__(self, chat_name):
+        self.chat_name = chat_name
+        self.participants = []
+        self.by_phone = {}
+        self.by_name = {}
+        self.complete = False
+        self.sessions = []
+
+    def add(self, name, phone):
+        """Add a participant unless it is already there (same phone number, or same name)"""
+        # People missing from the contacts are shown by their number, which also identifies them
+        normalized = normalize_phone(phone) or normalize_phone(name)
+        name_key = None if scraper.looks_like_phone(name) else chat_key(name)
+        participant = self.by_phone.get(normalized) if normalized else None
+        if participant is None and name_key:
+            participant = self.by_name.get(name_key)
+
+        if participant is None:
+            participant = {"name": name, "phone": phone if normalize_phone(phone) else "N/A"}
+            self.participants.append(participant)
+        else:
+            # Keep the most informative version: a real name over a number, and any phone number
+            if scraper.looks_like_phone(participant["name"]) and name_key:
+                participant["name"] = name
+            if normalize_phone(phone) and not normalize_phone(participant["phone"]):
+                participant["phone"] = phone
+        if normalized:
+            self.by_phone[normalized] = participant
+        if name_key:
+            self.by_name[name_key] = participant
+
+
+def merge_session_outputs(results, merged_path):
+    """
+    Merge the sessions' outputs (in any format) into one CSV, one entry per group (matched by chat name).
+    Participants seen by several sessions are listed once; each session's own account
+    ("You") is kept apart as "You (<session>)". Returns the number of groups written.
+    """
+    groups = {}  # chat key -> MergedGroup, in the order groups were first seen
+    for result in results:
+        if not exists(result["output_path"]):
+            continue
+        for record in read_groups(result["output_path"]):
+            key = chat_key(record["chat_name"])
+            group = groups.setdefault(key, MergedGroup(record["chat_name"]))
+            if result["name"] not in group.sessions:
+                group.sessions.append(result["name"])
+            group.complete = group.complete or record["complete"]
+            for participant in record["participants"]:
+                name = participant["name"]
+                if name == SELF_NAME:
+                    name = f"{SELF_NAME} ({result['name']})"
+                group.add(name, participant["phone"])
+
+    with open(merged_path, "w", newline="", encoding="utf-8") as csvfile:
+        csv_writer = csv.DictWriter(csvfile, fieldnames=MERGED_FIELDNAMES)
+        csv_writer.writeheader()
+        for group in groups.values():
+            participants = group.participants or [{"name": "N/A", "phone": "N/A"}]
+            for participant in participants:
+                csv_writer.writerow({
+                    "chat_name": group.chat_name,
+                    "chat_type": "group",
+                    "participant_name": participant["name"],
+                    "participant_phone": participant["phone"],
+                    "participant_count": len(group.participants),
+                    "participants_complete": group.complete,
+                    "sessions": ";".join(group.sessions),
+                })
+    return len(groups)
+
+
+def parse_sessions(values):
+    """Turn --session arguments into session dicts, checking names and profiles are unique"""
+    sessions = []
+    for value in values:
+        if len(value) not in (2, 3):
+            raise ValueError(f"--session takes NAME USER_DATA_DIR [PROFILE_DIRECTORY], got {value}")
+        name, user_data_dir = value[0], value[1]
+        if not SESSION_NAME_PATTERN.match(name):
+            raise ValueError(f"Session name {name!r} may only contain letters, digits, '_' and '-'")
+        sessions.append({"name": name, "user_data_dir": user_data_dir,
+                         "profile_directory": value[2] if len(value) == 3 else "Default"})
+
+    names = Counter(session["name"] for session in sessions)
+    profiles = Counter((session["user_data_dir"], session["profile_directory"]) for session in sessions)
+    if any(count > 1 for count in names.values()):
+        raise ValueError("Session names must be unique")
+    # Chrome cannot open the same profile twice
+    if any(count > 1 for count in profiles.values()):
+        raise ValueError("Every session needs its own Chrome profile")
+    return sessions
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Scrape several WhatsApp accounts in parallel")
+    parser.add_argument("--session", action="append", nargs="+", required=True,
+                        metavar="NAME USER_DATA_DIR [PROFILE_DIRECTORY]",
+                        help="an account to scrape (repeat for every account)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="browser sessions running at the same time (default: one per session)")
+    parser.add_argument("--discovery", choices=["scroll", "search"], default="scroll",
+                        help="how each session finds intro chats (see scrape_whatsapp_chats.py)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only open groups that show activity since each session's last scrape")
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="csv",
+                        help="format of each session's output (the merged file is always CSV)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="also log per-chat and per-participant details to each session's log")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        sessions = parse_sessions(args.session)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    merged_path = join(scraper.OUTPUT_DIRECTORY, f"{MERGED_NAME}_{timestamp}.csv")
+    scraper.setup_logging(join(scraper.OUTPUT_DIRECTORY, f"{scraper.LOG_NAME}_{timestamp}_parallel.log"))
+
+    scraper.log("=" * 60)
+    scraper.log(f"Parallel scrape of {len(sessions)} sessions: {', '.join(s['name'] for s in sessions)}")
+    scraper.log(f"Merged CSV file: {merged_path}")
+    scraper.log("=" * 60)
+
+    manager = Manager()
+    progress = manager.Queue()
+    reporter = threading.Thread(target=report_progress, args=(progress,), daemon=True)
+    reporter.start()
+
+    results = []
+    executor = ProcessPoolExecutor(max_workers=args.workers or len(sessions))
+    futures = {executor.submit(run_session, session, timestamp, args.discovery, args.incremental, args.format,
+                               args.verbose, progress): session for session in sessions}
+    try:
+        for future in as_completed(futures):
+            session = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # The worker process itself died (e.g. killed) - its partial CSV is still merged
+                scraper.log(f"[{session['name']}] ✗ Session crashed: {e}")
+                results.append({"name": session["name"], "status": "crashed", "groups": 0, "error": str(e),
+                                "output_path": session_output_path(timestamp, session["name"], args.format)})
+    except KeyboardInterrupt:
+        scraper.log("\n⚠ Interrupted by user - merging what the sessions saved so far")
+        executor.shutdown(wait=False, cancel_futures=True)
+        saved = {result["name"] for result in results}
+        results += [{"name": session["name"], "status": "interrupted", "groups": 0, "error": None,
+                     "output_path": session_output_path(timestamp, session["name"], args.format)}
+                    for session in sessions if session["name"] not in saved]
+    else:
+        executor.shutdown()
+    finally:
+        progress.put(None)
+        reporter.join()
+        manager.shutdown()
+
+    # Keep the command line order of sessions, so merging is deterministic
+    order = [session["name"] for session in sessions]
+    results.sort(key=lambda result: order.index(result["name"]))
+    total_groups = merge_session_outputs(results, merged_path)
+
+    scraper.log("\n" + "=" * 60)
+    scraper.log("PARALLEL SCRAPE SUMMARY")
+    scraper.log("=" * 60)
+    for result in results:
+        error = f" - {result['error']}" if result["error"] else ""
+        scraper.log(f"  {result['name']}: {result['status']}, {result['groups']} groups{error}")
+    scraper.log(f"Merged {total_groups} distinct groups into: {merged_path}")
+    scraper.log("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
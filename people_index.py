@@ -0,0 +1,237 @@
+"""
+Index of everyone seen in scraped groups, across groups and runs.
+
+The same person shows up in many intro groups, sometimes by name, sometimes by phone number,
+and the number in different spellings ("+972 50-123-4567", "050-1234567"). The people index
+gives each person one id: phone numbers are normalized to E.164 ("+972501234567") and a
+participant is matched to a known person by phone number first, then by name. The scraper
+adds every saved group to the index and writes each participant's person_id to its output,
+so consumers can handle each person once.
+
+    python people_index.py                       # list everyone, most groups first
+    python people_index.py --import whatsapp_chats_20251102_143055.csv
+    python people_index.py --json
+"""
+import argparse
+import json
+import re
+import sqlite3
+
+from intro_names import normalize_name
+from output_sinks import NO_PARTICIPANT, read_groups
+from scrape_state import chat_key, current_time
+
+PEOPLE_DB_NAME = "whatsapp_people.sqlite3"
+DEFAULT_COUNTRY_CODE = "972"  # Numbers written with a national trunk 0 ("050-1234567") are taken to be Israeli
+MIN_PHONE_DIGITS = 8  # Country code included
+MAX_PHONE_DIGITS = 15  # The E.164 maximum
+MIN_NAME_WORDS = 2  # Names with fewer words only match people already in the same group
+# Separators people and WhatsApp put in phone numbers, including the invisible direction marks around them
+PHONE_SEPARATORS = re.compile(r"[\s\-().\u2010-\u2015\u200e\u200f\u202a-\u202e\u2066-\u2069]")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    person_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT UNIQUE,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS person_names (
+    name_key TEXT NOT NULL,
+    person_id INTEGER NOT NULL REFERENCES people(person_id),
+    PRIMARY KEY (name_key, person_id)
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    chat_key TEXT NOT NULL,
+    chat_name TEXT NOT NULL,
+    person_id INTEGER NOT NULL REFERENCES people(person_id),
+    display_name TEXT NOT NULL,
+    seen_at TEXT NOT NULL,
+    PRIMARY KEY (chat_key, person_id)
+);
+CREATE INDEX IF NOT EXISTS memberships_by_person ON memberships(person_id);
+"""
+
+
+def normalize_phone(text, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    A phone number in E.164 form ("+972501234567"), or None if text is not a phone number.
+    Accepts "+972 50-123-4567", "00972501234567" and national numbers with a trunk 0
+    ("050-1234567", using country_code).
+    """
+    if not text or text == NO_PARTICIPANT:
+        return None
+    compact = PHONE_SEPARATORS.sub("", text)
+    if compact.startswith("+"):
+        digits = compact[1:]
+    elif compact.startswith("00"):
+        digits = compact[2:]
+    elif compact.startswith("0") and country_code:
+        digits = country_code + compact[1:]
+    else:
+        digits = compact
+    if not digits.isdigit() or not MIN_PHONE_DIGITS <= len(digits) <= MAX_PHONE_DIGITS:
+        return None
+    return "+" + digits
+
+
+def participant_identity(participant):
+    """(E.164 phone or None, name key or None) of a participant as the scraper saves it"""
+    phone = normalize_phone(participant.get("phone"))
+    name = participant.get("name") or ""
+    name_phone = normalize_phone(name)
+    if name_phone:
+        # WhatsApp shows people who are not in the contacts by their number
+        return phone or name_phone, None
+    return phone, normalize_name(name) or None
+
+
+class PeopleIndex:
+    """
+    Local SQLite index of people: one person_id per person, the names they were seen
+    under, and the groups they are in (as of each group's latest scrape).
+    """
+
+    def __init__(self, db_path=PEOPLE_DB_NAME):
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+
+    def find_person(self, phone, name_key, group_key=None, taken=()):
+        """
+        The person_id matching a phone number or name, or None.
+        A phone number decides on its own: a participant with a number is never matched by name.
+        Without one, a name only matches a person who has no number either, and only if that
+        person is already in the same group or the name is a full name (several words): a
+        first name alone says too little to link people across groups. If several people
+        share the name, the one in the same group wins, then the one seen first. People in
+        taken (given to other participants of the same group) are never matched by name.
+        """
+        if phone:
+            row = self.db.execute("SELECT person_id FROM people WHERE phone = ?", (phone,)).fetchone()
+            return row[0] if row else None
+        if not name_key:
+            return None
+        rows = self.db.execute(
+            "SELECT n.person_id, m.chat_key IS NOT NULL FROM person_names n JOIN people p USING (person_id) "
+            "LEFT JOIN memberships m ON m.person_id = n.person_id AND m.chat_key = ? "
+            "WHERE n.name_key = ? AND p.phone IS NULL ORDER BY n.person_id",
+            (group_key, name_key)).fetchall()
+        rows = [row for row in rows if row[0] not in taken]
+        for person_id, in_group in rows:
+            if in_group:
+                return person_id
+        if rows and len(name_key.split()) >= MIN_NAME_WORDS:
+            return rows[0][0]
+        return None
+
+    def resolve(self, participant, group_key=None, taken=()):
+        """The person_id of a participant, adding the person (or what is new about them) to the index"""
+        phone, name_key = participant_identity(participant)
+        name = participant.get("name") or phone
+        now = current_time()
+        person_id = self.find_person(phone, name_key, group_key, taken)
+        if person_id is None:
+            person_id = self.db.execute(
+                "INSERT INTO people (name, phone, first_seen, last_seen) VALUES (?, ?, ?, ?)",
+                (name, phone, now, now)).lastrowid
+        else:
+            stored_name, = self.db.execute("SELECT name FROM people WHERE person_id = ?", (person_id,)).fetchone()
+            # A name is more useful than the number WhatsApp shows for people not in the contacts
+            if name_key and normalize_phone(stored_name):
+                stored_name = name
+            self.db.execute("UPDATE people SET name = ?, phone = COALESCE(phone, ?), last_seen = ? "
+                            "WHERE person_id = ?", (stored_name, phone, now, person_id))
+        if name_key:
+            self.db.execute("INSERT OR IGNORE INTO person_names (name_key, person_id) VALUES (?, ?)",
+                            (name_key, person_id))
+        return person_id
+
+    def add_group(self, chat_name, participants):
+        """
+        Record a group's current participants. Sets person_id on each participant dict
+        and returns the ids, in the same order.
+        """
+        key = chat_key(chat_name)
+        participants = participants or []
+        with self.db:
+            # Resolve everyone before the group's old memberships are replaced, since they help matching
+            person_ids = []
+            for participant in participants:
+                person_ids.append(self.resolve(participant, key, person_ids))
+            self.db.execute("DELETE FROM memberships WHERE chat_key = ?", (key,))
+            now = current_time()
+            for participant, person_id in zip(participants, person_ids):
+                participant["person_id"] = person_id
+                self.db.execute(
+                    "INSERT OR REPLACE INTO memberships (chat_key, chat_name, person_id, display_name, seen_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, chat_name, person_id, participant.get("name") or "", now))
+        return person_ids
+
+    def person(self, person_id):
+        """A person as a dict with person_id, name, phone, names and groups - or None"""
+        row = self.db.execute("SELECT person_id, name, phone, first_seen, last_seen FROM people WHERE person_id = ?",
+                              (person_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "person_id": row[0],
+            "name": row[1],
+            "phone": row[2],
+            "first_seen": row[3],
+            "last_seen": row[4],
+            "names": [name for (name,) in self.db.execute(
+                "SELECT DISTINCT display_name FROM memberships WHERE person_id = ? ORDER BY display_name",
+                (person_id,))],
+            "groups": [name for (name,) in self.db.execute(
+                "SELECT chat_name FROM memberships WHERE person_id = ? ORDER BY chat_name", (person_id,))],
+        }
+
+    def people(self):
+        """Everyone in the index, most groups first"""
+        rows = self.db.execute(
+            "SELECT p.person_id FROM people p LEFT JOIN memberships m USING (person_id) "
+            "GROUP BY p.person_id ORDER BY COUNT(m.chat_key) DESC, p.person_id").fetchall()
+        return [self.person(person_id) for (person_id,) in rows]
+
+    def group_people(self, chat_name):
+        """person_ids of a group's participants, as of its latest scrape"""
+        return [person_id for (person_id,) in self.db.execute(
+            "SELECT person_id FROM memberships WHERE chat_key = ? ORDER BY rowid", (chat_key(chat_name),))]
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the people in the people index")
+    parser.add_argument("--db", default=PEOPLE_DB_NAME, help=f"people index file (default: {PEOPLE_DB_NAME})")
+    parser.add_argument("--import", dest="imports", nargs="+", metavar="FILE", default=[],
+                        help="first add the groups in these scraper output files (e.g. from older runs)")
+    parser.add_argument("--json", action="store_true", help="print the people as JSON")
+    args = parser.parse_args()
+
+    index = PeopleIndex(args.db)
+    try:
+        for path in args.imports:
+            groups = 0
+            for record in read_groups(path):
+                index.add_group(record["chat_name"], record["participants"])
+                groups += 1
+            print(f"Imported {groups} groups from {path}")
+
+        people = index.people()
+        if args.json:
+            print(json.dumps(people, ensure_ascii=False, indent=2))
+            return
+        for person in people:
+            print(f"{person['person_id']:>6}  {person['name']} ({person['phone'] or 'no phone'}) - "
+                  f"{len(person['groups'])} groups")
+        print(f"{len(people)} people")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Scrape introduction groups and sync them to Notion in one command.
+
+    python pipeline.py
+    python pipeline.py --database <database id> --discovery search
+
+Takes the same options as scrape_whatsapp_chats.py. Every group the scraper saves is put
+on a bounded queue, and a background thread turns it into an intro and upserts it to
+Notion (see notion_sync.py) while the browser moves on to the next group. The CSV is
+written as usual, so chat_parser.py can upload it again later if anything fails.
+"""
+import queue
+import sys
+import threading
+
+import scrape_whatsapp_chats as scraper
+from chat_parser import NOTION_SECRET, TEMP_DB_ID, notion_client, page_properties, record_intro
+from notion_sync import NotionSync
+
+PIPELINE_QUEUE_SIZE = 50  # Groups waiting for upload before the scraper has to wait
+UPLOAD_BATCH_SIZE = 20  # Most groups uploaded together when the upload falls behind
+
+
+class NotionConsumer:
+    """
+    Background thread that upserts scraped groups to Notion.
+    put() hands it a group; close() waits for everything queued to be uploaded.
+    """
+
+    def __init__(self, database_id, queue_size=PIPELINE_QUEUE_SIZE, batch_size=UPLOAD_BATCH_SIZE):
+        self.groups = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.notion_sync = NotionSync(notion_client(), database_id)
+        self.counts = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0, "not_intro": 0}
+        self.thread = threading.Thread(target=self.run, name="notion-consumer", daemon=True)
+
+    def start(self):
+        """
+        Read the intros already in Notion, then start uploading in the background.
+        Raises if Notion can't be reached, before anything has been scraped.
+        """
+        self.notion_sync.index.refresh()
+        self.thread.start()
+
+    def put(self, chat_name, participants, complete):
+        """on_group callback for the scraper - blocks while the queue is full"""
+        self.groups.put({
+            "chat_name": chat_name,
+            "participant_count": len(participants),
+            "participants": participants,
+            "complete": complete,
+        })
+
+    def close(self):
+        self.groups.put(None)
+        self.thread.join()
+
+    def next_batch(self):
+        """Wait for a group, then take whatever else is already queued (None ends the batch)"""
+        batch = [self.groups.get()]
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            try:
+                batch.append(self.groups.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            done = batch[-1] is None
+            records = [record for record in batch if record is not None]
+            if records:
+                self.upload(records)
+            if done:
+                return
+
+    def upload(self, records):
+        properties_list = []
+        for record in records:
+            intro = record_intro(record)
+            if intro is None:
+                self.counts["not_intro"] += 1
+                continue
+            properties_list.append(page_properties(*intro))
+        if not properties_list:
+            return
+
+        try:
+            created, updated, unchanged, failed = self.notion_sync.sync(properties_list, refresh=False)
+        except Exception as e:
+            scraper.log(f"  ✗ Notion upload of {len(properties_list)} intros failed: {e}")
+            self.counts["failed"] += len(properties_list)
+            return
+        for name, count in zip(("created", "updated", "unchanged", "failed"), (created, updated, unchanged, failed)):
+            self.counts[name] += count
+        scraper.log(f"  → Notion: {created} created, {updated} updated, {unchanged} unchanged, {failed} failed "
+                    f"({self.groups.qsize()} groups waiting)")
+
+
+def main():
+    parser = scraper.build_arg_parser("Scrape WhatsApp introduction groups and sync them to Notion")
+    parser.add_argument("--database", default=TEMP_DB_ID, help="Notion database id to sync the intros to")
+    args = parser.parse_args()
+
+    # Check Notion before opening the browser, so a scrape never runs with nowhere to upload to
+    if not NOTION_SECRET:
+        sys.exit("✗ NOTION_SECRET is not set - set it to the Notion integration token")
+    consumer = NotionConsumer(args.database)
+    try:
+        consumer.start()
+    except Exception as e:
+        sys.exit(f"✗ Could not read the Notion database {args.database}: {e}")
+    try:
+        output_path = scraper.run_scraper(args, on_group=consumer.put)
+    finally:
+        scraper.log("Waiting for the remaining Notion uploads...")
+        consumer.close()
+
+    counts = consumer.counts
+    scraper.log("=" * 60)
+    scraper.log(f"Notion: {counts['created']} created, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['failed']} failed")
+    if output_path and counts["failed"]:
+        scraper.log(f"Upload again with: python chat_parser.py {output_path}")
+    scraper.log("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
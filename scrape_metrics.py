@@ -0,0 +1,160 @@
+"""
+Timing of a scraper run, phase by phase.
+
+The scraper wraps each phase of its work (reading the sidebar, scrolling, opening a chat,
+checking it is a group, opening group info, extracting participants, saving) in
+metrics.phase(name). RunMetrics records how long every phase took and how many WebDriver
+round-trips it made, and at the end of the run writes everything to a JSON file next to
+the CSV and log:
+
+    {"duration_seconds": 840.2, "scan_seconds": 812.4, "groups": 130, "groups_per_minute": 9.6,
+     "round_trips": 10422, "sleep_seconds": 301.2,
+     "phases": {"open chat": {"count": 131, "total": 52.1, "p50": 0.35, "p95": 0.61, "max": 2.3,
+                              "round_trips": 1180}, ...},
+     "waits": {"chat header": {"count": 131, ..., "timeouts": 0}, ...}}
+
+Round-trips are counted by wrapping the driver's execute(), which every Selenium call goes
+through. Phases can nest ("group" holds everything done for one group): the time and
+round-trips of a nested phase count towards the phases around it too.
+"""
+import cProfile
+import io
+import json
+import pstats
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from math import ceil
+from time import perf_counter
+
+PROFILE_TOP_FUNCTIONS = 25  # Functions listed in the log with --profile
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted, non-empty list"""
+    return sorted_values[max(0, min(len(sorted_values) - 1, ceil(fraction * len(sorted_values)) - 1))]
+
+
+def summarize(durations):
+    values = sorted(durations)
+    return {
+        "count": len(values),
+        "total": round(sum(values), 3),
+        "p50": round(percentile(values, 0.5), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+class RunMetrics:
+    """Phase timings, round-trips, sleeps and counts of one scraper run"""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.start = perf_counter()
+        self.scan_start = None  # When the driver was instrumented, i.e. after logging in
+        self.phases = defaultdict(list)  # Phase name -> duration of every time it ran
+        self.phase_round_trips = Counter()
+        self.round_trips = Counter()  # WebDriver command -> count
+        self.sleep_time = 0.0
+        self.counts = Counter()
+        self.active_phases = []
+
+    def reset(self):
+        self.__init__()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the code inside the with block as one run of the named phase"""
+        self.active_phases.append(name)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name].append(perf_counter() - start)
+            self.active_phases.pop()
+
+    def count(self, name, amount=1):
+        self.counts[name] += amount
+
+    def add_sleep(self, seconds):
+        """Record time spent sleeping (explicit sleeps and the pauses between wait polls)"""
+        self.sleep_time += seconds
+
+    def instrument(self, driver):
+        """Count every WebDriver command the driver sends (once per driver; returns the driver)"""
+        if getattr(driver, "metrics", None) is self:
+            return driver
+        if self.scan_start is None:
+            self.scan_start = perf_counter()
+        execute = driver.execute
+
+        def counted_execute(driver_command, params=None):
+            self.round_trips[driver_command] += 1
+            for name in set(self.active_phases):
+                self.phase_round_trips[name] += 1
+            return execute(driver_command, params)
+
+        driver.execute = counted_execute
+        driver.metrics = self
+        return driver
+
+    def report(self, wait_latencies=None, wait_timeouts=None, **details):
+        """Everything measured, as a JSON-ready dict; details (e.g. run_id) are included as given"""
+        now = perf_counter()
+        # Groups per minute of scanning, leaving out the time it took to log in
+        scan_duration = now - (self.start if self.scan_start is None else self.scan_start)
+        groups = self.counts["groups"]
+        report = dict(details)
+        report.update({
+            "started": self.started_at.isoformat(timespec="seconds"),
+            "duration_seconds": round(now - self.start, 3),
+            "scan_seconds": round(scan_duration, 3),
+            "groups": groups,
+            "groups_per_minute": round(groups / scan_duration * 60, 2) if scan_duration else 0.0,
+            "round_trips": sum(self.round_trips.values()),
+            "round_trips_by_command": dict(self.round_trips.most_common()),
+            "sleep_seconds": round(self.sleep_time, 3),
+            "counts": dict(self.counts),
+            "phases": {},
+            "waits": {},
+        })
+        for name, durations in self.phases.items():
+            report["phases"][name] = dict(summarize(durations), round_trips=self.phase_round_trips[name])
+        for label, latencies in sorted((wait_latencies or {}).items()):
+            if latencies:
+                report["waits"][label] = dict(summarize(latencies), timeouts=(wait_timeouts or {}).get(label, 0))
+        return report
+
+    def summary_lines(self):
+        """One line per phase, slowest in total first, for the log"""
+        lines = []
+        for name, durations in sorted(self.phases.items(), key=lambda item: -sum(item[1])):
+            stats = summarize(durations)
+            lines.append(f"  {name}: n={stats['count']}, total={stats['total']:.1f}s, p50={stats['p50']:.2f}s, "
+                         f"p95={stats['p95']:.2f}s, max={stats['max']:.2f}s, "
+                         f"round-trips={self.phase_round_trips[name]}")
+        return lines
+
+    def write(self, path, wait_latencies=None, wait_timeouts=None, **details):
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            json.dump(self.report(wait_latencies, wait_timeouts, **details), metrics_file, indent=2,
+                      ensure_ascii=False)
+
+
+def start_profile(enabled):
+    """A running cProfile profiler, or None if profiling is off"""
+    if not enabled:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def finish_profile(profiler, path, top=PROFILE_TOP_FUNCTIONS):
+    """Stop the profiler and save its stats to path. Returns the top functions by cumulative time, as text."""
+    profiler.disable()
+    profiler.dump_stats(path)
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+    return text.getvalue()
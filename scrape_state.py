@@ -0,0 +1,253 @@
+import hashlib
+import json
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+from intro_names import normalize_name
+
+# Chat statuses recorded per run
+STATUS_DONE = "done"
+STATUS_INCOMPLETE = "incomplete"  # Saved, but the participant list was cut short
+STATUS_NOT_GROUP = "not_group"
+STATUS_FAILED = "failed"  # Could not be opened - retried when the run is resumed
+STATUS_CARRIED_FORWARD = "carried_forward"  # Unchanged since the last scrape, copied without opening
+
+# Sidebar time labels: "14:32", "2:32 PM", "Yesterday", weekday names, or a date
+TIME_LABEL_PATTERN = re.compile(r"^(\d{1,2}):(\d{2})\s*([AaPp][Mm])?$")
+YESTERDAY_LABELS = {"yesterday", "אתמול"}
+WEEKDAY_LABELS = {"monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6}
+DATE_LABEL_FORMATS = ["%d/%m/%Y", "%m/%d/%Y", "%d.%m.%Y", "%Y-%m-%d", "%d/%m/%y", "%m/%d/%y"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    output_path TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chats (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    chat_key TEXT NOT NULL,
+    chat_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    scraped_at TEXT NOT NULL,
+    participant_hash TEXT,
+    participant_count INTEGER,
+    PRIMARY KEY (run_id, chat_key)
+);
+CREATE TABLE IF NOT EXISTS groups (
+    chat_key TEXT PRIMARY KEY,
+    chat_name TEXT NOT NULL,
+    scraped_at TEXT NOT NULL,
+    last_activity TEXT,
+    preview TEXT,
+    participants TEXT NOT NULL,
+    complete INTEGER NOT NULL,
+    participants_source TEXT
+);
+"""
+# Columns added after the first version, added to databases created before them
+ADDED_COLUMNS = {"groups": {"participants_source": "TEXT"}}
+
+
+def chat_key(chat_name):
+    """Identity of a chat across runs: its name, Unicode-normalized and case-folded"""
+    return normalize_name(chat_name)
+
+
+def participant_hash(participants):
+    """Order-independent hash of a participant list, to tell whether membership changed"""
+    entries = sorted(f"{p['name']}|{p['phone']}" for p in participants)
+    return hashlib.sha1("\n".join(entries).encode("utf-8")).hexdigest()
+
+
+def add_missing_columns(db, added_columns):
+    """Add the columns of added_columns ({table: {column: type}}) that an existing database lacks"""
+    for table, columns in added_columns.items():
+        existing = {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+        for column, column_type in columns.items():
+            if column not in existing:
+                db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    db.commit()
+
+
+def current_time():
+    """Current local time as an ISO string"""
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def parse_sidebar_timestamp(label, now=None):
+    """
+    Resolve a sidebar time label to an absolute ISO timestamp.
+    Times of day resolve to today ("2025-11-02T14:32"); "Yesterday", weekday names and
+    dates resolve to a date only ("2025-11-01"). Returns None for labels it does not know.
+    When a date could be read either day-first or month-first, the later one (up to today)
+    is used, so that an ambiguous label errs towards "there was new activity".
+    """
+    now = now or datetime.now()
+    label = label.strip()
+    if not label:
+        return None
+
+    match = TIME_LABEL_PATTERN.match(label)
+    if match:
+        hour, minute, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+        if meridiem:
+            hour = hour % 12 + (12 if meridiem.lower() == "pm" else 0)
+        if hour > 23 or minute > 59:
+            return None
+        return now.replace(hour=hour, minute=minute, second=0, microsecond=0).isoformat(timespec="minutes")
+
+    lowered = label.lower()
+    if lowered in YESTERDAY_LABELS:
+        return (now - timedelta(days=1)).date().isoformat()
+
+    if lowered in WEEKDAY_LABELS:
+        days_ago = (now.weekday() - WEEKDAY_LABELS[lowered]) % 7 or 7
+        return (now - timedelta(days=days_ago)).date().isoformat()
+
+    candidates = []
+    for date_format in DATE_LABEL_FORMATS:
+        try:
+            candidates.append(datetime.strptime(label, date_format).date())
+        except ValueError:
+            continue
+    candidates = [date for date in candidates if date <= now.date()]
+    return max(candidates).isoformat() if candidates else None
+
+
+def has_new_activity(row, previous, now=None):
+    """
+    Check if a sidebar row (from the scraper's sidebar snapshot) shows activity since
+    the previous scrape of the group (from ScrapeState.previous_group).
+    Anything that cannot be compared counts as new activity.
+    """
+    if not previous["complete"] or row.get("preview", "") != previous["preview"]:
+        return True
+
+    current = parse_sidebar_timestamp(row.get("last_activity", ""), now)
+    stored = previous["last_activity"]
+    if current is None or stored is None:
+        return True
+
+    # Compare at the precision both labels have (a date-only label hides the time of day)
+    if "T" not in current or "T" not in stored:
+        return current[:10] > stored[:10]
+    return current > stored
+
+
+class ScrapeState:
+    """
+    Local SQLite checkpoint store for scraper runs.
+    Records every chat handled in a run, so an interrupted run can be resumed
+    without opening the chats it already saved.
+    """
+
+    def __init__(self, db_path, incremental=False):
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+        add_missing_columns(self.db, ADDED_COLUMNS)
+        self.run_id = None
+        self.incremental = incremental
+
+    def start_run(self, run_id, output_path):
+        """Register a new run writing to output_path"""
+        self.db.execute("INSERT INTO runs (run_id, started_at, output_path, status) VALUES (?, ?, ?, ?)",
+                        (run_id, current_time(), output_path, "running"))
+        self.db.commit()
+        self.run_id = run_id
+
+    def resume_run(self, run_id):
+        """Continue an earlier run. Returns the output path it was writing to."""
+        row = self.db.execute("SELECT output_path FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Unknown run: {run_id}")
+        self.db.execute("UPDATE runs SET status = 'running', finished_at = NULL WHERE run_id = ?", (run_id,))
+        self.db.commit()
+        self.run_id = run_id
+        return row[0]
+
+    def latest_run_id(self):
+        """The most recently started run, or None if there are none"""
+        row = self.db.execute("SELECT run_id FROM runs ORDER BY started_at DESC, run_id DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def completed_run_outputs(self, count=2):
+        """Output paths of the most recent runs that finished scanning, newest first"""
+        rows = self.db.execute("SELECT output_path FROM runs WHERE status = 'complete' "
+                               "ORDER BY started_at DESC, run_id DESC LIMIT ?", (count,)).fetchall()
+        return [row[0] for row in rows]
+
+    def done_count(self):
+        """Number of chats of the current run that will be skipped"""
+        return self.db.execute("SELECT COUNT(*) FROM chats WHERE run_id = ? AND status != ?",
+                               (self.run_id, STATUS_FAILED)).fetchone()[0]
+
+    def is_done(self, chat_name):
+        """Check if the current run already handled this chat (failed chats are retried)"""
+        row = self.db.execute("SELECT status FROM chats WHERE run_id = ? AND chat_key = ?",
+                              (self.run_id, chat_key(chat_name))).fetchone()
+        return row is not None and row[0] != STATUS_FAILED
+
+    def record(self, chat_name, status, participants=None):
+        """Record the outcome for a chat in the current run (committed immediately)"""
+        self.db.execute(
+            "INSERT OR REPLACE INTO chats "
+            "(run_id, chat_key, chat_name, status, scraped_at, participant_hash, participant_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.run_id, chat_key(chat_name), chat_name, status, current_time(),
+             participant_hash(participants) if participants is not None else None,
+             len(participants) if participants is not None else None))
+        self.db.commit()
+
+    def remember_group(self, chat_name, row, participants, complete, source=None):
+        """
+        Keep the latest scrape of a group, together with the sidebar activity seen when it
+        was opened (and where its participants were read), for incremental runs.
+        """
+        self.db.execute(
+            "INSERT OR REPLACE INTO groups "
+            "(chat_key, chat_name, scraped_at, last_activity, preview, participants, complete, participants_source) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (chat_key(chat_name), chat_name, current_time(),
+             parse_sidebar_timestamp(row.get("last_activity", "")), row.get("preview", ""),
+             json.dumps(participants, ensure_ascii=False), int(complete), source))
+        self.db.commit()
+
+    def previous_group(self, chat_name):
+        """
+        The latest scrape of a group from any run, as a dict with scraped_at, last_activity,
+        preview, participants, complete and participants_source - or None if it was never scraped.
+        """
+        row = self.db.execute(
+            "SELECT scraped_at, last_activity, preview, participants, complete, participants_source "
+            "FROM groups WHERE chat_key = ?",
+            (chat_key(chat_name),)).fetchone()
+        if row is None:
+            return None
+        return {
+            "scraped_at": row[0],
+            "last_activity": row[1],
+            "preview": row[2] or "",
+            "participants": json.loads(row[3]),
+            "complete": bool(row[4]),
+            "participants_source": row[5],
+        }
+
+    def participant_names(self):
+        """Names of everyone seen in any scraped group (known contacts for the intro classifier)"""
+        names = set()
+        for (participants,) in self.db.execute("SELECT participants FROM groups"):
+            names.update(participant["name"] for participant in json.loads(participants))
+        return names
+
+    def finish_run(self, status):
+        """Mark the current run as finished with the given status"""
+        self.db.execute("UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                        (status, current_time(), self.run_id))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -1,196 +1,771 @@
-from time import sleep
-import csv
+from time import sleep, perf_counter
+from collections import defaultdict, Counter
+import argparse
+import atexit
 import logging
-from os.path import join, exists
+from logging.handlers import QueueHandler, QueueListener
+from os import makedirs
+from os.path import join
 from datetime import datetime
+from queue import SimpleQueue
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver import Keys
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import StaleElementReferenceException, NoSuchElementException, TimeoutException
+from selenium.common.exceptions import (StaleElementReferenceException, NoSuchElementException, TimeoutException,
+                                        WebDriverException)
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from intro_names import INTRO_DELIMITERS, INTRO_SCORE_THRESHOLD, contact_name_keys, is_intro_name
+from output_sinks import (OUTPUT_FORMATS, PARTICIPANTS_FROM_GROUP_INFO, PARTICIPANTS_FROM_HEADER, open_sink,
+                          output_extension)
+from people_index import PEOPLE_DB_NAME, PeopleIndex
+from scrape_metrics import RunMetrics, start_profile, finish_profile
+from scrape_state import (ScrapeState, has_new_activity, STATUS_DONE, STATUS_INCOMPLETE, STATUS_NOT_GROUP,
+                          STATUS_FAILED, STATUS_CARRIED_FORWARD)
 
 WHATSAPP_URL = 'https://web.whatsapp.com/'
-MAX_ITERATIONS = 500  # Maximum iterations as safety limit
+MAX_ITERATIONS = 5000  # Maximum iterations as safety limit (a page of ~10 chats each)
+MAX_SIDEBAR_FAILURES = 3  # Give up on the chat list after this many sidebar reads or scrolls fail in a row
+SIDEBAR_RECOVERY_TIMEOUT = 2  # How long to wait for the sidebar to work again after a failure
 CHAT_DIV = "_ak8q"
 PANE_SIDE_DIV = "_ak9y"
 #OUTPUT_DIRECTORY = r"C:\Users\gilad\OneDrive\Desktop\Netz\Whatsapp exporter"
 OUTPUT_DIRECTORY = "."
 OUTPUT_NAME = "whatsapp_chats"  # Timestamp will be added automatically
 LOG_NAME = "whatsapp_scraper"  # Timestamp will be added automatically
+METRICS_NAME = "whatsapp_metrics"  # Per-phase timings of each run (JSON), timestamp will be added automatically
+PROFILE_NAME = "whatsapp_profile"  # cProfile stats with --profile, timestamp will be added automatically
+STATE_DB_NAME = "whatsapp_scraper_state.sqlite3"  # Checkpoints of every run, used by --resume
+LOGIN_TIMEOUT = 120  # How long an unattended session waits for WhatsApp Web to show the chat list
 WAIT_TIMEOUT = 10
-
-# Introduction group delimiters from chat_parser.py
-INTRO_DELIMITERS = ["//", "/", "<>", "x"]
-
-
-def setup_logging(log_path):
+WAIT_POLL_INTERVAL = 0.05  # How often wait conditions are re-checked (seconds)
+LIST_SETTLE_TIME = 0.3  # A list counts as loaded once its size is unchanged for this long
+PARTICIPANT_SCROLL_TIMEOUT = 2  # How long to wait for new participant rows after each scroll step
+PARTICIPANT_LOAD_TIMEOUT = 60  # Give up loading a single group's participants after this long
+USE_HEADER_FAST_PATH = True  # Read small groups' participants from the chat header instead of group info
+HEADER_FAST_PATH_MAX_PARTICIPANTS = 8  # Larger groups always go through group info
+LOG_FORMAT = '%(asctime)s.%(msecs)03d %(levelname).1s %(message)s'  # e.g. "2025-11-02 14:30:55.123 I message"
+CONSOLE_LOG_FORMAT = '%(asctime)s %(message)s'
+LOGGER_NAME = "whatsapp_scraper"  # --verbose only lowers this logger's level, not Selenium's
+WAIT_HISTOGRAM_BUCKETS = [0.1, 0.25, 0.5, 1, 2, 5, 10]  # Upper bounds (seconds) for the wait latency report
+
+HEADER_TITLE_SELECTOR = '#main header span[dir="auto"]'
+GROUP_INFO_DRAWER_SELECTOR = 'div[role="complementary"][aria-label="Group info"], div[data-testid="drawer-right"]'
+PARTICIPANT_ROW_SELECTOR = 'div[role="listitem"]'
+PARTICIPANT_DIALOG_SELECTOR = 'div[role="dialog"]'
+SIDEBAR_ROW_ATTRIBUTE = "data-wni-row"  # Set on each sidebar chat so it can be found again for clicking
+
+# JavaScript function for reading chat names: an element's text as WhatsApp shows it. That is its
+# title attribute if it has one, otherwise its text with emoji written as their image's alt text
+# (WhatsApp renders emoji as <img alt="💸">, which textContent drops). Sidebar names and the
+# conversation header title are both read with it, so they compare equal.
+DISPLAY_TEXT_FUNCTION = """
+function displayText(element) {
+    if (!element) {
+        return '';
+    }
+    if (element.getAttribute('title')) {
+        return element.getAttribute('title');
+    }
+    var text = '';
+    var walker = document.createTreeWalker(element, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+        var node = walker.currentNode;
+        if (node.nodeType === Node.TEXT_NODE) {
+            text += node.nodeValue;
+        } else if (node.tagName === 'IMG') {
+            text += node.getAttribute('alt') || '';
+        }
+    }
+    return text;
+}
+"""
+
+# Reads every rendered sidebar chat, plus the sidebar's scroll position, in a single round-trip.
+# Each chat element is tagged with a stable id (kept until WhatsApp unmounts it),
+# and the rows are returned in on-screen order.
+# Also makes sure a MutationObserver counts changes to the sidebar (see sidebar_changed).
+SIDEBAR_SNAPSHOT_SCRIPT = DISPLAY_TEXT_FUNCTION + """
+var chatClass = arguments[0], rowAttribute = arguments[1], paneClass = arguments[2];
+var pane = document.querySelector('.' + paneClass);
+if (pane && window.__wniObservedPane !== pane) {
+    if (window.__wniSidebarObserver) {
+        window.__wniSidebarObserver.disconnect();
+    }
+    window.__wniSidebarMutations = window.__wniSidebarMutations || 0;
+    window.__wniSidebarObserver = new MutationObserver(function () {
+        window.__wniSidebarMutations++;
+    });
+    window.__wniSidebarObserver.observe(pane, {childList: true, subtree: true, characterData: true});
+    window.__wniObservedPane = pane;
+}
+var nextId = window.__wniNextRowId || 1;
+var rows = [];
+document.querySelectorAll('.' + chatClass).forEach(function (chat) {
+    if (!chat.hasAttribute(rowAttribute)) {
+        chat.setAttribute(rowAttribute, String(nextId++));
+    }
+    var row = chat.closest('[role="row"]') || chat.closest('button') || chat;
+    var name = displayText(chat.querySelector('span[title]') || chat);
+    var unread = row.querySelector('[aria-label*="unread"]');
+    var preview = row.querySelector('._ak8k');
+    var previewText = preview ? preview.textContent : '';
+    var previewTitle = preview ? preview.querySelector('[title]') : null;
+    var lastActivity = row.querySelector('._ak8i');
+    rows.push({
+        name: (name || '').trim(),
+        row_id: chat.getAttribute(rowAttribute),
+        top: Math.round(row.getBoundingClientRect().top),
+        is_group: !!row.querySelector('[data-icon*="group"]') || /^[^:]{1,60}:\u00a0/.test(previewText),
+        unread: unread ? (parseInt(unread.textContent, 10) || 1) : 0,
+        last_activity: lastActivity ? lastActivity.textContent.trim() : '',
+        preview: (previewTitle ? previewTitle.getAttribute('title') : previewText).trim()
+    });
+});
+window.__wniNextRowId = nextId;
+rows.sort(function (a, b) { return a.top - b.top; });
+return {
+    rows: rows,
+    scroll_top: pane ? pane.scrollTop : 0,
+    client_height: pane ? pane.clientHeight : 0,
+    at_end: !pane || pane.scrollTop + pane.clientHeight >= pane.scrollHeight - 1,
+    mutations: window.__wniSidebarMutations || 0
+};
+"""
+
+# Scrolls the sidebar to an absolute position. Returns the new scrollTop, the sidebar change
+# counter from before the scroll re-renders anything (observers run later), and whether
+# rendered rows already cover the new page (then nothing new will render).
+SCROLL_SIDEBAR_SCRIPT = """
+var pane = document.querySelector('.' + arguments[0]);
+if (!pane) {
+    return null;
+}
+pane.scrollTop = arguments[1];
+var paneRect = pane.getBoundingClientRect();
+var rows = Array.prototype.map.call(pane.querySelectorAll('[role="row"]'), function (row) {
+    return row.getBoundingClientRect();
+});
+return {
+    scroll_top: pane.scrollTop,
+    mutations: window.__wniSidebarMutations || 0,
+    rendered: rows.some(function (rect) { return rect.top <= paneRect.top; })
+        && rows.some(function (rect) { return rect.bottom >= paneRect.bottom; })
+};
+"""
+
+SIDEBAR_MUTATIONS_SCRIPT = "return window.__wniSidebarMutations || 0;"
+
+SEARCH_BOX_SELECTOR = 'div[contenteditable="true"][role="textbox"][aria-label="Search input textbox"], #side div[contenteditable="true"]'
+
+# Reads every rendered participant row of the group info drawer in a single round-trip.
+# Returns the texts of each row's name spans (in order), whether it is marked as admin
+# and the row's full text (see PARTICIPANT_ROWS_SIGNATURE_SCRIPT).
+PARTICIPANTS_SCRIPT = """
+var root = arguments[0] || document, rowSelector = arguments[1];
+var rows = [];
+root.querySelectorAll(rowSelector).forEach(function (item) {
+    var names = [];
+    item.querySelectorAll('span[dir="auto"]').forEach(function (span) {
+        var text = (span.getAttribute('title') || span.textContent || '').trim();
+        if (text) {
+            names.push(text);
+        }
+    });
+    var isAdmin = Array.prototype.some.call(item.querySelectorAll('div, span'), function (el) {
+        return el.children.length === 0 && /^(group )?admin$/i.test(el.textContent.trim());
+    });
+    rows.push({names: names, is_admin: isAdmin, text: item.textContent});
+});
+return rows;
+"""
+
+# Reads the participant count WhatsApp shows in group info ("N members" / "N participants")
+MEMBER_COUNT_SCRIPT = """
+var root = arguments[0] || document;
+var list = root.querySelector('[aria-label*="members list" i], [aria-label*="participants list" i]');
+var texts = [list ? list.getAttribute('aria-label') : '', root.textContent || ''];
+for (var i = 0; i < texts.length; i++) {
+    var match = /(\\d[\\d,.]*)\\s+(members|participants)\\b/i.exec(texts[i]);
+    if (match) {
+        return parseInt(match[1].replace(/[,.]/g, ''), 10);
+    }
+}
+return null;
+"""
+
+# Large groups only list a few members in the drawer, behind a "View all" button
+EXPAND_PARTICIPANTS_SCRIPT = """
+var root = arguments[0] || document;
+var buttons = root.querySelectorAll('button, div[role="button"]');
+for (var i = 0; i < buttons.length; i++) {
+    if (/^view all/i.test((buttons[i].textContent || '').trim())) {
+        buttons[i].click();
+        return true;
+    }
+}
+return false;
+"""
+
+# Scrolls the participant list's scroll container down by one page
+SCROLL_PARTICIPANTS_SCRIPT = """
+var root = arguments[0] || document, rowSelector = arguments[1];
+var row = root.querySelector(rowSelector);
+var scroller = row ? row.parentElement : null;
+while (scroller && scroller !== document.body && scroller.scrollHeight <= scroller.clientHeight + 1) {
+    scroller = scroller.parentElement;
+}
+if (!scroller || scroller === document.body) {
+    return {moved: false, at_end: true};
+}
+var before = scroller.scrollTop;
+scroller.scrollTop = before + scroller.clientHeight;
+return {
+    moved: scroller.scrollTop !== before,
+    at_end: scroller.scrollTop + scroller.clientHeight >= scroller.scrollHeight - 1
+};
+"""
+
+# Cheap fingerprint of the rendered participant rows, used to notice when scrolling rendered new ones
+PARTICIPANT_ROWS_SIGNATURE_SCRIPT = """
+var rows = (arguments[0] || document).querySelectorAll(arguments[1]);
+if (!rows.length) {
+    return '0';
+}
+return rows.length + '|' + rows[0].textContent + '|' + rows[rows.length - 1].textContent;
+"""
+
+# Reads the open conversation's chat name from its header, or null if no chat is open
+HEADER_TITLE_SCRIPT = DISPLAY_TEXT_FUNCTION + """
+var title = document.querySelector(arguments[0]);
+return title ? displayText(title) : null;
+"""
+
+# Ways to find the open conversation's header, tried in order: a CSS selector and which match to use
+# (when there is only one match it is used regardless). The sidebar has headers too.
+CHAT_HEADER_STRATEGIES = [
+    {"selector": 'div[data-testid="conversation-panel-wrapper"] header', "index": 0},
+    {"selector": 'div[data-testid="conversation-header"] header', "index": 0},
+    {"selector": 'div#main header', "index": 0},
+    {"selector": 'div.main header', "index": 0},
+    {"selector": 'header', "index": 1},
+]
+
+# Finds the conversation header (trying the strategy that worked last time first) and reads
+# its title and subtitle. The subtitle's title attribute holds the full text, even when the
+# rendered text is cut off.
+CHAT_HEADER_SCRIPT = DISPLAY_TEXT_FUNCTION + """
+var strategies = arguments[0], preferred = arguments[1];
+var order = [];
+if (preferred !== null && preferred !== undefined) {
+    order.push(preferred);
+}
+for (var i = 0; i < strategies.length; i++) {
+    if (i !== preferred) {
+        order.push(i);
+    }
+}
+for (var n = 0; n < order.length; n++) {
+    var strategy = strategies[order[n]];
+    var matches = document.querySelectorAll(strategy.selector);
+    var header = matches.length > strategy.index ? matches[strategy.index] : (matches.length === 1 ? matches[0] : null);
+    if (!header) {
+        continue;
+    }
+    var lines = (header.innerText || '').split('\\n').map(function (line) { return line.trim(); })
+        .filter(function (line) { return line; });
+    var title = header.querySelector('span[dir="auto"]');
+    var subtitle = header.querySelector('span[title]');
+    return {
+        strategy: order[n],
+        header: header,
+        button: header.querySelector('div[role="button"]'),
+        title: title ? displayText(title).trim() : (lines[0] || ''),
+        subtitle: subtitle ? subtitle.getAttribute('title') : (lines[1] || ''),
+        subtitle_text: subtitle ? subtitle.textContent : (lines[1] || '')
+    };
+}
+return null;
+"""
+
+# Subtitles that are a status rather than the member list
+NON_MEMBER_SUBTITLE_KEYWORDS = ['click here', 'tap here', 'select for', 'typing', 'online', 'last seen',
+                                'members', 'participants', 'recording']
+
+# Text in the group info drawer that is not a participant name
+NON_PARTICIPANT_NAMES = {'Admin', 'Group Admin', 'Group admin', 'Participants', 'Members', 'Group info'}
+NON_PARTICIPANT_KEYWORDS = ['add participant', 'invite link', 'group settings', 'search', 'uk number', 'number +']
+PHONE_PUNCTUATION = str.maketrans('', '', ' -()')
+
+# What to type into the chat search box in search discovery mode (one search per entry).
+# "x" is searched with spaces around it, since a bare "x" matches almost every chat.
+SEARCH_QUERIES = ["//", "/", "<>", " x "]
+
+
+# Background thread writing queued log records to the console and log file (see setup_logging)
+log_listener = None
+scraper_logger = logging.getLogger(LOGGER_NAME)
+
+
+def setup_logging(log_path, console=True, verbose=False):
     """
     Set up logging to both console and file.
-    All messages are logged to file and also printed to console.
+    All messages are logged to file and also printed to console (unless console is False).
+    The scraper only puts log records on a queue; a background thread writes them out, so
+    slow console or disk I/O never holds up the scraping loop.
+    With verbose, per-element details (see debug()) are logged too.
     """
-    # Create logger
+    global log_listener
+    stop_logging()
+
+    # Create logger. Only the scraper's own logger goes down to DEBUG with verbose: Selenium and
+    # urllib3 log every WebDriver call at DEBUG, which would bury the details --verbose is for
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
-
-    # Remove any existing handlers
-    logger.handlers = []
-
-    # Create formatter
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s',
-                                  datefmt='%Y-%m-%d %H:%M:%S')
+    scraper_logger.setLevel(logging.DEBUG if verbose else logging.NOTSET)
 
     # File handler - logs everything to file
     file_handler = logging.FileHandler(log_path, mode='w', encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt='%Y-%m-%d %H:%M:%S'))
+    handlers = [file_handler]
 
     # Console handler - logs to terminal
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_LOG_FORMAT, datefmt='%H:%M:%S'))
+        handlers.append(console_handler)
+
+    # Replace any existing handlers with the queue
+    log_queue = SimpleQueue()
+    logger.handlers = [QueueHandler(log_queue)]
+    log_listener = QueueListener(log_queue, *handlers)
+    log_listener.start()
     return logger
 
 
-def log(message):
+def stop_logging():
+    """Write out the log records still queued and close the log file"""
+    global log_listener
+    if log_listener is None:
+        return
+    log_listener.stop()
+    for handler in log_listener.handlers:
+        handler.close()
+    log_listener = None
+
+
+# Records still in the queue are written out before Python exits
+atexit.register(stop_logging)
+
+
+def log(message, *args):
     """Helper function to log messages (simpler than logging.info)"""
-    logging.info(message)
+    scraper_logger.info(message, *args)
 
 
-def is_introduction_group(chat_name):
-    """Check if chat name matches introduction group format from chat_parser.py"""
-    # Check if the chat name contains any of the introduction delimiters
-    for delimiter in INTRO_DELIMITERS:
-        if delimiter in chat_name:
-            log(f"  ✓ Matches introduction format with delimiter: '{delimiter}'")
-            return True
-    return False
+def debug(message, *args):
+    """
+    Log a per-element detail, only written with --verbose. Pass values as %-style args
+    (debug("Found: %s", name)), so the message is not even formatted when debug logging is off.
+    """
+    scraper_logger.debug(message, *args)
 
 
-def is_archive_chat(chat_name):
-    """Check if this is the Archive chat"""
-    return chat_name.lower().strip() in ['archive', 'archived']
+# Index into CHAT_HEADER_STRATEGIES that found the conversation header last time
+header_strategy = None
+# Names of people in earlier scrapes - evidence that a chat name is an intro (see intro_names.py)
+known_contacts = frozenset()
+# Where to save the page of every scraped group for snapshot_parser.py (--save-snapshots), or None
+snapshot_directory = None
+# PeopleIndex every saved group's participants are added to (see people_index.py), or None
+people_index = None
+
+# Seconds spent in each wait_for() call, keyed by condition label
+wait_latencies = defaultdict(list)
+wait_timeouts = Counter()
+# Phase timings and round-trips of the current run (see scrape_metrics.py)
+metrics = RunMetrics()
+
+
+def pause(seconds):
+    """sleep(), counted in the run's sleep time"""
+    metrics.add_sleep(seconds)
+    sleep(seconds)
+
+
+def wait_for(driver, condition, label, timeout=None):
+    """
+    Wait until condition(driver) returns something truthy and return it.
+    Returns None if the condition does not hold within the timeout.
+    The time spent is recorded under label for the latency report.
+    """
+    if timeout is None:
+        timeout = WAIT_TIMEOUT
+
+    polls = 0
 
+    def counted_condition(driver):
+        nonlocal polls
+        polls += 1
+        return condition(driver)
 
-def is_group_chat(driver):
-    """Check if the currently opened chat is a group by looking at the subtitle under chat name"""
+    start = perf_counter()
     try:
-        # Find the CORRECT header - the one in the main chat area, not sidebar
-        # WhatsApp has multiple headers, we need the one in the conversation panel
+        wait = WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_INTERVAL,
+                             ignored_exceptions=[StaleElementReferenceException, NoSuchElementException])
+        return wait.until(counted_condition)
+    except TimeoutException:
+        wait_timeouts[label] += 1
+        log(f"  Warning: Timed out after {timeout}s waiting for {label}")
+        return None
+    finally:
+        wait_latencies[label].append(perf_counter() - start)
+        # WebDriverWait sleeps one poll interval between checks
+        metrics.add_sleep(max(0, polls - 1) * WAIT_POLL_INTERVAL)
 
-        # Try to find the conversation/chat panel first
-        header = None
 
-        # Strategy 1: Look for header within the main conversation area
-        try:
-            # Common selectors for the main chat panel
-            chat_panel_selectors = [
-                'div[data-testid="conversation-panel-wrapper"]',
-                'div[data-testid="conversation-header"]',
-                'div#main',
-                'div.main',
-            ]
-
-            for selector in chat_panel_selectors:
-                try:
-                    chat_panel = driver.find_element(By.CSS_SELECTOR, selector)
-                    header = chat_panel.find_element(By.TAG_NAME, 'header')
-                    log(f"  Found header using panel selector: {selector}")
+def header_title_is(chat_name):
+    """Wait condition: the conversation header shows the given chat name"""
+    def condition(driver):
+        title = driver.execute_script(HEADER_TITLE_SCRIPT, HEADER_TITLE_SELECTOR)
+        return title is not None and title.strip() == chat_name
+    return condition
+
+
+def group_info_drawer_open(driver):
+    """Wait condition: the group info drawer is in the DOM (returns the drawer element)"""
+    drawers = driver.find_elements(By.CSS_SELECTOR, GROUP_INFO_DRAWER_SELECTOR)
+    return drawers[0] if drawers else False
+
+
+def group_info_drawer_closed(driver):
+    """Wait condition: the group info drawer is gone"""
+    return not driver.find_elements(By.CSS_SELECTOR, GROUP_INFO_DRAWER_SELECTOR)
+
+
+class ListitemCountStable:
+    """
+    Wait condition: the number of participant rows has stopped changing.
+    Holds once the count is non-zero and unchanged for LIST_SETTLE_TIME seconds,
+    and returns that count.
+    """
+
+    def __init__(self, settle_time=LIST_SETTLE_TIME):
+        self.settle_time = settle_time
+        self.last_count = None
+        self.stable_since = None
+
+    def __call__(self, driver):
+        count = len(driver.find_elements(By.CSS_SELECTOR, PARTICIPANT_ROW_SELECTOR))
+        now = perf_counter()
+        if count != self.last_count:
+            self.last_count = count
+            self.stable_since = now
+            return False
+        if count and now - self.stable_since >= self.settle_time:
+            return count
+        return False
+
+
+def log_wait_histogram():
+    """Log a latency histogram for every wait condition used during the run"""
+    if not wait_latencies:
+        return
+
+    log("\nWait latency histogram (seconds):")
+    bucket_labels = [f"<={bound}" for bound in WAIT_HISTOGRAM_BUCKETS] + [f">{WAIT_HISTOGRAM_BUCKETS[-1]}"]
+    for label, latencies in sorted(wait_latencies.items()):
+        counts = [0] * len(bucket_labels)
+        for latency in latencies:
+            for i, bound in enumerate(WAIT_HISTOGRAM_BUCKETS):
+                if latency <= bound:
+                    counts[i] += 1
                     break
-                except:
-                    continue
-        except:
-            pass
+            else:
+                counts[-1] += 1
+        histogram = ", ".join(f"{bucket}: {count}" for bucket, count in zip(bucket_labels, counts) if count)
+        log(f"  {label}: n={len(latencies)}, total={sum(latencies):.1f}s, "
+            f"max={max(latencies):.2f}s, timeouts={wait_timeouts[label]} [{histogram}]")
 
-        # Strategy 2: If we didn't find it in a panel, get all headers and use the last one
-        # (sidebar headers come first, chat header comes last)
-        if not header:
-            try:
-                headers = driver.find_elements(By.TAG_NAME, 'header')
-                log(f"  Found {len(headers)} header elements total")
-                if len(headers) >= 2:
-                    # Use the second header (first is usually sidebar)
-                    header = headers[1]
-                    log(f"  Using header index 1 (second header)")
-                elif len(headers) == 1:
-                    header = headers[0]
-                    log(f"  Only one header found, using it")
-            except:
-                pass
 
-        if not header:
-            log("  ERROR: Could not find any header element")
+def get_sidebar_snapshot(driver):
+    """
+    Read all rendered sidebar chats with one execute_script call.
+    Returns a dict with:
+      rows - list of dicts with name, row_id, top, is_group (a hint), unread,
+             last_activity (the time label, e.g. "14:32" or "Yesterday") and preview (last message)
+      scroll_top, client_height - the sidebar's scroll position and page height in pixels
+      at_end - True if the sidebar is scrolled to the bottom
+      mutations - sidebar change counter, for sidebar_changed()
+    """
+    return driver.execute_script(SIDEBAR_SNAPSHOT_SCRIPT, CHAT_DIV, SIDEBAR_ROW_ATTRIBUTE, PANE_SIDE_DIV)
+
+
+def sidebar_readable(driver):
+    """Wait condition: the sidebar snapshot script runs again (returns the snapshot)"""
+    try:
+        return get_sidebar_snapshot(driver)
+    except WebDriverException:
+        return False
+
+
+def sidebar_changed(previous_mutations):
+    """Wait condition: the sidebar DOM changed since the snapshot that reported previous_mutations"""
+    def condition(driver):
+        return driver.execute_script(SIDEBAR_MUTATIONS_SCRIPT) > previous_mutations
+    return condition
+
+
+class SidebarSettled:
+    """
+    Wait condition: the sidebar changed since previous_mutations and has then
+    stayed unchanged for LIST_SETTLE_TIME seconds (e.g. search results finished rendering).
+    """
+
+    def __init__(self, previous_mutations, settle_time=LIST_SETTLE_TIME):
+        self.previous_mutations = previous_mutations
+        self.settle_time = settle_time
+        self.last_mutations = previous_mutations
+        self.stable_since = None
+
+    def __call__(self, driver):
+        mutations = driver.execute_script(SIDEBAR_MUTATIONS_SCRIPT)
+        now = perf_counter()
+        if mutations != self.last_mutations:
+            self.last_mutations = mutations
+            self.stable_since = now
             return False
+        return self.stable_since is not None and now - self.stable_since >= self.settle_time
+
+
+def scroll_sidebar_page(driver, snapshot):
+    """
+    Scroll the sidebar one page below the position recorded in snapshot and wait
+    for WhatsApp to render the new rows.
+    Returns False if the sidebar could not scroll any further.
+    """
+    target = snapshot["scroll_top"] + snapshot["client_height"]
+    scroll = driver.execute_script(SCROLL_SIDEBAR_SCRIPT, PANE_SIDE_DIV, target)
+    if scroll is None or scroll["scroll_top"] <= snapshot["scroll_top"]:
+        return False
+    # Opening chats since the snapshot (scrollIntoView) may have rendered this page already,
+    # and has changed the sidebar - so the wait starts from the count at scroll time
+    if not scroll["rendered"]:
+        wait_for(driver, sidebar_changed(scroll["mutations"]), "sidebar rows rendered")
+    return True
+
 
-        # Debug: Print all text in header
-        header_full_text = header.text
-        log(f"  Header full text:\n{header_full_text}")
+def find_sidebar_row(driver, row):
+    """Find the chat element for a row from get_sidebar_snapshot()"""
+    return driver.find_element(By.CSS_SELECTOR, f'.{CHAT_DIV}[{SIDEBAR_ROW_ATTRIBUTE}="{row["row_id"]}"]')
 
-        # Split by newlines to get separate lines
-        lines = [line.strip() for line in header_full_text.split('\n') if line.strip()]
-        log(f"  Header lines: {lines}")
 
-        # Usually the structure is:
-        # Line 0: Chat name
-        # Line 1: Subtitle (participant names for groups, "click here..." for contacts)
+def looks_like_phone(text):
+    """Check if a participant label is a phone number rather than a name"""
+    return text.startswith('+') or (len(text) > 8 and text.translate(PHONE_PUNCTUATION).isdigit())
 
-        subtitle_text = ""
 
-        if len(lines) >= 2:
-            # The second line is typically the subtitle
-            subtitle_text = lines[1].lower()
-            log(f"  Subtitle text (from lines): '{subtitle_text}'")
+def is_participant_name(name):
+    """Check if a text from the group info drawer is a participant (keeps "You")"""
+    if not name or len(name) <= 1 or name in NON_PARTICIPANT_NAMES:
+        return False
+    lowered = name.lower()
+    return not any(keyword in lowered for keyword in NON_PARTICIPANT_KEYWORDS)
+
+
+def merge_participants(participants, seen_names, rows):
+    """
+    Add participant rows from PARTICIPANTS_SCRIPT to participants, skipping names
+    already in seen_names. Returns the number of participants added.
+    """
+    added = 0
+    for row in rows:
+        # Only take the first valid name from each row
+        name = next((text for text in row["names"] if is_participant_name(text)), None)
+        if name is None or name in seen_names:
+            continue
+
+        if looks_like_phone(name):
+            phone = name
         else:
-            log(f"  Only found {len(lines)} line(s) in header, trying other methods...")
+            phone = next((text for text in row["names"] if text != name and looks_like_phone(text)), "N/A")
 
-            # Try to find specific elements
-            try:
-                # Look for all span elements and get their text
-                spans = header.find_elements(By.TAG_NAME, 'span')
-                log(f"  Found {len(spans)} span elements in header")
-
-                # Try to find the subtitle by looking for spans that aren't the title
-                span_texts = []
-                for i, span in enumerate(spans):
-                    text = span.text.strip()
-                    if text:
-                        span_texts.append(text)
-                        log(f"    Span {i}: '{text}'")
-
-                # Look for a span that looks like a subtitle (not the chat name)
-                # The subtitle is usually shorter and contains specific patterns
-                chat_name = lines[0] if lines else ""
-                for text in span_texts:
-                    if text != chat_name and len(text) > 0:
-                        subtitle_text = text.lower()
-                        log(f"  Found potential subtitle: '{subtitle_text}'")
-                        break
+        seen_names.add(name)
+        participants.append({"name": name, "phone": phone, "is_admin": bool(row.get("is_admin"))})
+        added += 1
+        debug("    - Found: %s", name)
+    return added
 
-            except Exception as e:
-                log(f"  Error getting spans: {e}")
 
-        if not subtitle_text:
-            log(f"  Could not find subtitle text")
-            # Try one more method - get all divs in header
-            try:
-                divs = header.find_elements(By.TAG_NAME, 'div')
-                log(f"  Trying {len(divs)} div elements...")
-                for i, div in enumerate(divs):
-                    text = div.text.strip()
-                    if text and '\n' not in text and len(text) > 5 and len(text) < 100:
-                        # This might be a subtitle
-                        if i > 0:  # Not the first div (which is likely the title)
-                            subtitle_text = text.lower()
-                            log(f"    Found subtitle from div {i}: '{subtitle_text}'")
-                            break
-            except Exception as e:
-                log(f"  Error getting divs: {e}")
+def participant_rows_changed(root, previous_signature):
+    """Wait condition: the rendered participant rows differ from previous_signature"""
+    def condition(driver):
+        signature = driver.execute_script(PARTICIPANT_ROWS_SIGNATURE_SCRIPT, root, PARTICIPANT_ROW_SELECTOR)
+        return signature != previous_signature
+    return condition
+
+
+def participant_dialog_open(driver):
+    """Wait condition: the full participant list dialog is showing rows (returns the dialog)"""
+    for dialog in driver.find_elements(By.CSS_SELECTOR, PARTICIPANT_DIALOG_SELECTOR):
+        if dialog.find_elements(By.CSS_SELECTOR, PARTICIPANT_ROW_SELECTOR):
+            return dialog
+    return False
+
+
+def rows_signature(rows):
+    """Same fingerprint as PARTICIPANT_ROWS_SIGNATURE_SCRIPT, computed from already-read rows"""
+    if not rows:
+        return '0'
+    return f"{len(rows)}|{rows[0]['text']}|{rows[-1]['text']}"
+
+
+def load_all_participants(driver, root):
+    """
+    Scroll through the participant list under root, collecting rows as WhatsApp renders them.
+    Stops when the member count shown by WhatsApp is reached, the list stops growing,
+    or PARTICIPANT_LOAD_TIMEOUT passes.
+    Returns (participants, complete) - complete is False if the list may have been cut short.
+    """
+    participants = []
+    seen_names = set()
+    expected_count = driver.execute_script(MEMBER_COUNT_SCRIPT, root)
+    debug("  Group info reports %s participants", expected_count or "an unknown number of")
+
+    deadline = perf_counter() + PARTICIPANT_LOAD_TIMEOUT
+    reached_end = False
+    unchanged_scrolls = 0
+    while True:
+        rows = driver.execute_script(PARTICIPANTS_SCRIPT, root, PARTICIPANT_ROW_SELECTOR) or []
+        merge_participants(participants, seen_names, rows)
+
+        if expected_count and len(participants) >= expected_count:
+            return participants, True
+        if reached_end:
+            break
+        if perf_counter() > deadline:
+            log(f"  Warning: Stopped loading participants after {PARTICIPANT_LOAD_TIMEOUT}s")
+            return participants, False
+
+        scroll = driver.execute_script(SCROLL_PARTICIPANTS_SCRIPT, root, PARTICIPANT_ROW_SELECTOR)
+        reached_end = scroll["at_end"]
+        if not scroll["moved"]:
+            break
+
+        # Wait for the newly scrolled-in rows to render
+        changed = wait_for(driver, participant_rows_changed(root, rows_signature(rows)),
+                           "participant list scrolled", timeout=PARTICIPANT_SCROLL_TIMEOUT)
+        if changed:
+            unchanged_scrolls = 0
+        else:
+            unchanged_scrolls += 1
+            if unchanged_scrolls >= 2:
+                break
+
+    if expected_count:
+        complete = len(participants) >= expected_count
+    else:
+        complete = reached_end
+    if not complete:
+        log(f"  Warning: Participant list may be incomplete ({len(participants)}/{expected_count or '?'})")
+    return participants, complete
+
+
+def close_participant_dialog(driver, dialog):
+    """Close the full participant list dialog opened by EXPAND_PARTICIPANTS_SCRIPT"""
+    close_buttons = dialog.find_elements(By.CSS_SELECTOR, '[aria-label="Close"], [data-testid="x"]')
+    if close_buttons:
+        close_buttons[0].click()
+    else:
+        from selenium.webdriver.common.action_chains import ActionChains
+        ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+    wait_for(driver, lambda d: not participant_dialog_open(d), "participant dialog closed")
+
+
+def parse_subtitle_participants(header):
+    """
+    Parse the member list from a group header subtitle (header is from read_chat_header()).
+    Returns None unless the list is provably complete: the full title and the rendered text
+    list the same members, nothing is elided, "You" is included (WhatsApp always lists you,
+    last, when it shows the whole list) and the group is no larger than
+    HEADER_FAST_PATH_MAX_PARTICIPANTS.
+    Names are the short display names WhatsApp uses in the header.
+    """
+    if not header or not header.get("subtitle"):
+        return None
 
-        log(f"  Final subtitle text: '{subtitle_text}'")
+    title = header["subtitle"].strip()
+    if '…' in title or '...' in title:
+        return None
+    if any(keyword in title.lower() for keyword in NON_MEMBER_SUBTITLE_KEYWORDS):
+        return None
+
+    names = [name.strip() for name in title.split(',')]
+    rendered_names = [name.strip() for name in (header.get("subtitle_text") or "").split(',')]
+    if (not all(names) or names != rendered_names or 'You' not in names
+            or len(names) > HEADER_FAST_PATH_MAX_PARTICIPANTS):
+        return None
+
+    return [{"name": name, "phone": name if looks_like_phone(name) else "N/A", "is_admin": False}
+            for name in names]
+
+
+def save_snapshot(driver, chat_name):
+    """Save the current page to snapshot_directory (if set), for re-processing with snapshot_parser.py"""
+    if not snapshot_directory:
+        return
+    try:
+        safe_name = "".join(char if char.isalnum() else "_" for char in chat_name)[:60]
+        path = join(snapshot_directory, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{safe_name}.html")
+        with metrics.phase("save snapshot"), open(path, "w", encoding="utf-8") as snapshot_file:
+            snapshot_file.write(driver.page_source)
+        log(f"  Saved page snapshot: {path}")
+    except Exception as e:
+        log(f"  Warning: Could not save page snapshot: {e}")
+
+
+def is_introduction_group(chat_name):
+    """Check if chat name matches introduction group format (shared with chat_parser.py)"""
+    return is_intro_name(chat_name, known_contacts)
+
+
+def is_archive_chat(chat_name):
+    """Check if this is the Archive chat"""
+    return chat_name.lower().strip() in ['archive', 'archived']
+
+
+def read_chat_header(driver):
+    """
+    Find the open conversation's header and read its title and subtitle in one script call.
+    The strategy that found the header is remembered and tried first on later calls.
+    Returns a dict with header, button (the clickable area that opens group info), title,
+    subtitle (full text) and subtitle_text (as rendered) - or None if there is no header.
+    """
+    global header_strategy
+
+    header = driver.execute_script(CHAT_HEADER_SCRIPT, CHAT_HEADER_STRATEGIES, header_strategy)
+    if header and header["strategy"] != header_strategy:
+        header_strategy = header["strategy"]
+        log(f"  Found header using strategy: {CHAT_HEADER_STRATEGIES[header_strategy]}")
+    return header
+
+
+def is_group_chat(driver, header=None):
+    """
+    Check if the currently opened chat is a group by looking at the subtitle under chat name.
+    header is the result of read_chat_header(), read from the page if not given.
+    """
+    try:
+        if header is None:
+            with metrics.phase("read header"):
+                header = read_chat_header(driver)
+        if not header:
+            log("  ERROR: Could not find any header element")
+            return False
+
+        subtitle_text = (header["subtitle"] or "").lower()
+        debug("  Header subtitle: '%s'", subtitle_text)
 
         # Individual contacts typically say "click here for contact info" or "tap here for contact info"
         contact_keywords = ['click here for contact info', 'tap here for contact info',
@@ -201,33 +776,33 @@ def is_group_chat(driver):
                            'select for group info', ',']
 
         if any(keyword in subtitle_text for keyword in contact_keywords):
-            log(f"  → Detected as INDIVIDUAL (contact info message)")
+            debug("  → Detected as INDIVIDUAL (contact info message)")
             return False
 
         # Groups show participant names (comma-separated) or participant count
         # If subtitle contains commas, it's likely a list of participants
         if any(keyword in subtitle_text for keyword in group_keywords):
-            log(f"  → Detected as GROUP (participant list with commas)")
+            debug("  → Detected as GROUP (participant list with commas)")
             return True
 
         # Groups may also show "you, person1, person2" or similar
         if 'you' in subtitle_text and len(subtitle_text) > 10:
-            log(f"  → Detected as GROUP (contains 'you' with other names)")
+            debug("  → Detected as GROUP (contains 'you' with other names)")
             return True
 
         # Check for participant count indicators
         if any(keyword in subtitle_text for keyword in ['participants', 'members', 'participant', 'member']):
-            log(f"  → Detected as GROUP (participant/member count)")
+            debug("  → Detected as GROUP (participant/member count)")
             return True
 
         # If we have a subtitle that's not a contact info message and has some length,
         # it's likely a group showing participant names
         if subtitle_text and len(subtitle_text) > 5 and not any(keyword in subtitle_text for keyword in contact_keywords):
-            log(f"  → Detected as GROUP (has subtitle, not contact info)")
+            debug("  → Detected as GROUP (has subtitle, not contact info)")
             return True
 
         # Default to not a group if we can't determine
-        log(f"  → Could not determine, defaulting to NOT a group")
+        debug("  → Could not determine, defaulting to NOT a group")
         return False
 
     except Exception as e:
@@ -237,274 +812,303 @@ def is_group_chat(driver):
         return False
 
 
-def get_group_participants(driver):
-    """Extract FULL participant names by clicking into group info"""
+def get_group_participants(driver, header=None):
+    """
+    Extract FULL participant names by clicking into group info.
+    header is the result of read_chat_header(), read from the page if not given.
+    Returns (participants, complete) - complete is False if not every participant could be loaded.
+    """
     participants = []
+    complete = False
 
     try:
-        log("  Opening group info to extract full names...")
+        debug("  Opening group info to extract full names...")
 
         # Find the CORRECT header - the one in the main chat area
-        header = None
-
-        # Strategy 1: Look for header within the main conversation area
-        try:
-            chat_panel_selectors = [
-                'div[data-testid="conversation-panel-wrapper"]',
-                'div[data-testid="conversation-header"]',
-                'div#main',
-                'div.main',
-            ]
-
-            for selector in chat_panel_selectors:
-                try:
-                    chat_panel = driver.find_element(By.CSS_SELECTOR, selector)
-                    header = chat_panel.find_element(By.TAG_NAME, 'header')
-                    break
-                except:
-                    continue
-        except:
-            pass
-
-        # Strategy 2: Get all headers and use the second one (chat header, not sidebar)
-        if not header:
-            headers = driver.find_elements(By.TAG_NAME, 'header')
-            if len(headers) >= 2:
-                header = headers[1]
-            elif len(headers) == 1:
-                header = headers[0]
+        if header is None:
+            with metrics.phase("read header"):
+                header = read_chat_header(driver)
 
         if not header:
             log("  ERROR: Could not find header element")
-            return participants
+            return participants, complete
 
-        # Click on the header to open group info
-        try:
-            # Find a clickable element in the header
-            clickable_area = header.find_element(By.CSS_SELECTOR, 'div[role="button"]')
-            clickable_area.click()
-            log("  Clicked header to open group info")
-            sleep(3)  # Wait for panel to open
-        except Exception as e:
-            log(f"  Error clicking header: {e}, trying alternative...")
+        with metrics.phase("open group info"):
+            # Click on the header to open group info
             try:
-                header.click()
-                sleep(3)
-            except Exception as e2:
-                log(f"  Could not open group info: {e2}")
-                return participants
-
-        # Now look for the participant list in the group info panel
-        # Scroll down in the group info to load all participants
-        try:
-            # Find the scrollable container in group info
-            scrollable_containers = driver.find_elements(By.CSS_SELECTOR, 'div[data-testid="drawer-right"]')
-            if not scrollable_containers:
-                scrollable_containers = driver.find_elements(By.CSS_SELECTOR, 'div.pane-side')
-
-            if scrollable_containers:
-                container = scrollable_containers[0]
-                # Scroll down a few times to load all participants
-                for _ in range(5):
-                    driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", container)
-                    sleep(0.3)
-                log("  Scrolled group info panel")
-        except Exception as e:
-            log(f"  Warning: Could not scroll group info: {e}")
-
-        # Extract participants - look for contact cells/listitems
-        log("  Extracting participant names from group info...")
+                # Click the clickable element in the header
+                header["button"].click()
+                debug("  Clicked header to open group info")
+            except Exception as e:
+                log(f"  Error clicking header: {e}, trying alternative...")
+                try:
+                    header["header"].click()
+                except Exception as e2:
+                    log(f"  Could not open group info: {e2}")
+                    return participants, complete
+
+            # Wait for the panel to open and its participant list to render
+            drawer = wait_for(driver, group_info_drawer_open, "group info drawer")
+            if not drawer:
+                log("  Could not open group info: drawer did not appear")
+                return participants, complete
+            wait_for(driver, ListitemCountStable(), "participant list loaded")
+
+            # Large groups only show some members until "View all" is clicked
+            participant_root = drawer
+            dialog = None
+            if driver.execute_script(EXPAND_PARTICIPANTS_SCRIPT, drawer):
+                dialog = wait_for(driver, participant_dialog_open, "participant dialog")
+                if dialog:
+                    debug("  Opened full participant list")
+                    participant_root = dialog
+
+        # Extract participants, scrolling until the whole list has been seen
+        debug("  Extracting participant names from group info...")
+        with metrics.phase("extract participants"):
+            try:
+                participants, complete = load_all_participants(driver, participant_root)
+            except Exception as e:
+                log(f"  Error extracting participants: {e}")
+        save_snapshot(driver, header["title"])
 
-        # Strategy 1: Look for list items with contact information
-        contact_cells = driver.find_elements(By.CSS_SELECTOR, 'div[role="listitem"]')
+        with metrics.phase("close group info"):
+            if dialog:
+                try:
+                    close_participant_dialog(driver, dialog)
+                except Exception as e:
+                    log(f"  Warning: Error closing participant list: {e}")
 
-        for cell in contact_cells:
+            # Close the group info panel
             try:
-                # Get all spans with dir="auto" (usually contains names)
-                name_spans = cell.find_elements(By.CSS_SELECTOR, 'span[dir="auto"]')
-
-                for span in name_spans:
-                    name = span.text.strip()
-
-                    # Filter out non-participant text (but keep "You" as it's a valid participant)
-                    if (name and len(name) > 1 and
-                        name not in ['Admin', 'Group Admin', 'Group admin', 'Participants', 'Members', 'Group info'] and
-                        not any(keyword in name.lower() for keyword in ['add participant', 'invite link', 'group settings', 'search', 'uk number', 'number +'])):
-
-                        # Check if we already have this participant
-                        if not any(p['name'] == name for p in participants):
-                            # Determine if it's a phone number or name
-                            if name.startswith('+') or (name.replace('-', '').replace(' ', '').replace('(', '').replace(')', '').isdigit() and len(name) > 8):
-                                participants.append({"name": name, "phone": name})
-                            else:
-                                participants.append({"name": name, "phone": "N/A"})
-                            log(f"    - Found: {name}")
-                        break  # Only take first valid name from this cell
+                # Try to find and click back/close button
+                close_buttons = driver.find_elements(By.CSS_SELECTOR, '[data-testid="back"], button[aria-label*="Back"], button[aria-label*="Close"], div[role="button"][aria-label="Close"]')
 
+                if close_buttons:
+                    close_buttons[0].click()
+                    debug("  Closed group info panel")
+                else:
+                    # Press ESC key as fallback
+                    from selenium.webdriver.common.action_chains import ActionChains
+                    ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+                    debug("  Closed group info panel (ESC)")
+                wait_for(driver, group_info_drawer_closed, "group info drawer closed")
             except Exception as e:
-                continue
-
-        # Close the group info panel
-        sleep(1)
-        try:
-            # Try to find and click back/close button
-            close_buttons = driver.find_elements(By.CSS_SELECTOR, '[data-testid="back"], button[aria-label*="Back"], button[aria-label*="Close"]')
+                log(f"  Warning: Error closing group info: {e}")
 
-            if close_buttons:
-                close_buttons[0].click()
-                log("  Closed group info panel")
-                sleep(1)
-            else:
-                # Press ESC key as fallback
-                from selenium.webdriver.common.action_chains import ActionChains
-                ActionChains(driver).send_keys(Keys.ESCAPE).perform()
-                log("  Closed group info panel (ESC)")
-                sleep(1)
-        except Exception as e:
-            log(f"  Warning: Error closing group info: {e}")
-
-        log(f"  Total participants found: {len(participants)}")
+        log(f"  Total participants found: {len(participants)}{'' if complete else ' (incomplete)'}")
 
     except Exception as e:
         log(f"  Error in get_group_participants: {e}")
         import traceback
         traceback.print_exc()
 
-    return participants
+    return participants, complete
 
 
-def append_to_csv(chat_name, participants, output_path):
-    """Append chat details to CSV file immediately (for crash recovery)"""
-    file_exists = exists(output_path)
+def save_group(sink, chat_name, participants, complete=True, source=PARTICIPANTS_FROM_GROUP_INFO):
+    """
+    Save a group to the run's output sink immediately (for crash recovery).
+    complete records whether the participant list was fully loaded, source where it was read
+    (None if not known, for groups carried forward from a scrape that did not record it).
+    With a people index, each participant gets the person_id of the person it is - except
+    for participants read from the chat header, whose short names can't tell people apart.
+    """
+    if people_index is not None and source != PARTICIPANTS_FROM_HEADER:
+        try:
+            people_index.add_group(chat_name, participants)
+        except Exception as e:
+            log(f"  Warning: Could not add participants to the people index: {e}")
+    sink.write_group(chat_name, participants, complete, source)
+    if participants:
+        log(f"  ✓ Saved {len(participants)} participants")
+    else:
+        log(f"  ! Warning: No participants found, saved placeholder")
 
-    with open(output_path, 'a', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['chat_name', 'chat_type', 'participant_name', 'participant_phone', 'participant_count']
-        csv_writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
-        # Write header only if file doesn't exist
-        if not file_exists:
-            csv_writer.writeheader()
+def notify_group(on_group, chat_name, participants, complete):
+    """Pass a saved group to the on_group callback, if there is one (its errors don't stop the scrape)"""
+    if on_group is None:
+        return
+    try:
+        on_group(chat_name, participants, complete)
+    except Exception as e:
+        log(f"  Warning: on_group callback failed: {e}")
 
-        # Calculate total participant count
-        participant_count = len(participants) if participants else 0
 
-        # Write all participants
-        if participants:
-            for participant in participants:
-                csv_writer.writerow({
-                    "chat_name": chat_name,
-                    "chat_type": "group",
-                    "participant_name": participant["name"],
-                    "participant_phone": participant["phone"],
-                    "participant_count": participant_count
-                })
-            log(f"  ✓ Saved {len(participants)} participants to CSV (total: {participant_count})")
-        else:
-            # Group but no participants found
-            csv_writer.writerow({
-                "chat_name": chat_name,
-                "chat_type": "group",
-                "participant_name": "N/A",
-                "participant_phone": "N/A",
-                "participant_count": 0
-            })
-            log(f"  ! Warning: No participants found, saved placeholder")
-
-
-def process_introduction_groups(driver, output_path):
-    """Process introduction groups using DFS - check and process immediately"""
-    processed_chats = set()
-    total_processed = 0
-    no_new_chats_count = 0  # Track iterations with no new chats
-    max_no_new_iterations = 3  # Stop after this many iterations with no new chats
+def process_chat_row(driver, row, processed_chats, sink, state=None, on_group=None):
+    """
+    Handle one chat from a sidebar snapshot: skip it, or open it and save its participants.
+    If a ScrapeState is given, chats it already has for this run are skipped and
+    every outcome is checkpointed. In incremental mode, groups with no sidebar activity
+    since they were last scraped are copied from the previous scrape without being opened.
+    Returns True if it was processed as an introduction group.
+    """
+    chat_name = row["name"]
 
-    log("\nScanning chats for introduction groups (DFS approach)...")
-    log("=" * 60)
+    if not chat_name or chat_name in processed_chats:
+        return False
+    metrics.count("chats seen")
 
-    pane_side = driver.find_element(by=By.CLASS_NAME, value=PANE_SIDE_DIV)
+    # Skip Archive
+    if is_archive_chat(chat_name):
+        log(f"⊗ Skipping Archive: {chat_name}")
+        processed_chats.add(chat_name)
+        return False
 
-    iteration = 0
-    while iteration < MAX_ITERATIONS:
-        iteration += 1
-        log(f"\nIteration {iteration}")
+    # Check if it's an introduction group
+    if not is_introduction_group(chat_name):
+        processed_chats.add(chat_name)
+        return False
 
-        chat_elements = driver.find_elements(by=By.CLASS_NAME, value=CHAT_DIV)
+    # Already saved by an earlier attempt of this run
+    if state and state.is_done(chat_name):
+        log(f"↷ Already scraped in this run: {chat_name}")
+        processed_chats.add(chat_name)
+        return False
 
-        # Get current visible chat names to detect if scrolling reveals new chats
-        current_visible_chats = set()
-        for elem in chat_elements:
-            try:
-                name = elem.text.strip()
-                if name:
-                    current_visible_chats.add(name)
-            except:
-                continue
+    # Nothing happened in the group since it was last scraped - reuse that scrape
+    if state and state.incremental:
+        previous = state.previous_group(chat_name)
+        if previous and not has_new_activity(row, previous):
+            log(f"↷ No new activity, carrying forward: {chat_name}")
+            processed_chats.add(chat_name)
+            save_group(sink, chat_name, previous["participants"], previous["complete"],
+                       previous["participants_source"])
+            state.record(chat_name, STATUS_CARRIED_FORWARD, previous["participants"])
+            notify_group(on_group, chat_name, previous["participants"], previous["complete"])
+            metrics.count("groups")
+            metrics.count("carried forward")
+            return True
 
-        # Track if we found any new chats in this iteration
-        found_new_chats = False
+    # Found an introduction group - process it immediately!
+    log(f"\n{'=' * 60}")
+    log(f"★ Found introduction group: {chat_name}")
+    processed_chats.add(chat_name)
 
-        for chat_element in chat_elements:
-            try:
-                chat_name = chat_element.text.strip()
+    with metrics.phase("group"):
+        open_and_save_group(driver, row, sink, state, on_group)
+    return True
 
-                if not chat_name or chat_name in processed_chats:
-                    continue
 
-                # Mark that we found a new chat
-                found_new_chats = True
+def open_and_save_group(driver, row, sink, state=None, on_group=None):
+    """Open an introduction group's chat and save its participants (the browser part of process_chat_row)"""
+    chat_name = row["name"]
+    metrics.count("chats opened")
 
-                # Skip Archive
-                if is_archive_chat(chat_name):
-                    log(f"⊗ Skipping Archive: {chat_name}")
-                    processed_chats.add(chat_name)
-                    continue
+    # Only go back to the browser for the rows we actually open
+    with metrics.phase("open chat"):
+        try:
+            chat_element = find_sidebar_row(driver, row)
+        except NoSuchElementException:
+            log(f"  ! Chat is no longer rendered in the sidebar, skipping")
+            metrics.count("failed")
+            if state:
+                state.record(chat_name, STATUS_FAILED)
+            return
+
+        # Scroll the chat element into view before clicking. "nearest" only scrolls rows that are
+        # off screen, and only as far as needed - centering could scroll up and unmount the
+        # snapshot's rows further down before they are opened
+        try:
+            driver.execute_script("arguments[0].scrollIntoView({block: 'nearest'});", chat_element)
+            debug("  Scrolled chat into view")
+        except Exception as e:
+            log(f"  Warning: Could not scroll into view: {e}")
 
-                # Check if it's an introduction group
-                if not is_introduction_group(chat_name):
-                    processed_chats.add(chat_name)
-                    continue
+        # Click on the chat
+        try:
+            chat_element.click()
+        except Exception as e:
+            log(f"  Error clicking chat: {e}")
+            # Try JavaScript click as fallback
+            try:
+                driver.execute_script("arguments[0].click();", chat_element)
+                debug("  Clicked using JavaScript")
+            except Exception as e2:
+                log(f"  JavaScript click also failed: {e2}")
+                metrics.count("failed")
+                if state:
+                    state.record(chat_name, STATUS_FAILED)
+                return
+
+        # Wait for the conversation to open before reading its header
+        if not wait_for(driver, header_title_is(chat_name), "chat header"):
+            log(f"  ! Chat did not open, skipping")
+            metrics.count("failed")
+            if state:
+                state.record(chat_name, STATUS_FAILED)
+            return
+
+    # Verify it's a group (should be, but double check)
+    with metrics.phase("group detection"):
+        header = read_chat_header(driver)
+        is_group = is_group_chat(driver, header)
+    if is_group:
+        debug("  ✓ Confirmed as GROUP chat")
+
+        # Small groups list every member in the header - no need to open group info
+        participants = parse_subtitle_participants(header) if USE_HEADER_FAST_PATH else None
+        source = PARTICIPANTS_FROM_HEADER
+        if participants is not None:
+            complete = True
+            metrics.count("header fast path")
+            log(f"  Read {len(participants)} participants from the chat header")
+            save_snapshot(driver, chat_name)
+        else:
+            participants, complete = get_group_participants(driver, header)
+            source = PARTICIPANTS_FROM_GROUP_INFO
+
+        # Save immediately
+        with metrics.phase("save"):
+            save_group(sink, chat_name, participants, complete, source)
+            if state:
+                state.record(chat_name, STATUS_DONE if complete else STATUS_INCOMPLETE, participants)
+                state.remember_group(chat_name, row, participants, complete, source)
+            notify_group(on_group, chat_name, participants, complete)
+        metrics.count("groups")
+        if not complete:
+            metrics.count("incomplete groups")
+    else:
+        log(f"  ! Not a group chat, skipping")
+        metrics.count("not group")
+        if state:
+            state.record(chat_name, STATUS_NOT_GROUP)
 
-                # Found an introduction group - process it immediately!
-                log(f"\n{'=' * 60}")
-                log(f"★ Found introduction group: {chat_name}")
-                processed_chats.add(chat_name)
-                total_processed += 1
+    log(f"{'=' * 60}")
 
-                # Scroll the chat element into view before clicking
-                try:
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", chat_element)
-                    sleep(0.5)  # Brief pause after scrolling
-                    log(f"  Scrolled chat into view")
-                except Exception as e:
-                    log(f"  Warning: Could not scroll into view: {e}")
 
-                # Click on the chat
-                try:
-                    chat_element.click()
-                    sleep(2)
-                except Exception as e:
-                    log(f"  Error clicking chat: {e}")
-                    # Try JavaScript click as fallback
-                    try:
-                        driver.execute_script("arguments[0].click();", chat_element)
-                        sleep(2)
-                        log(f"  Clicked using JavaScript")
-                    except Exception as e2:
-                        log(f"  JavaScript click also failed: {e2}")
-                        continue
-
-                # Verify it's a group (should be, but double check)
-                if is_group_chat(driver):
-                    log(f"  ✓ Confirmed as GROUP chat")
-                    participants = get_group_participants(driver)
-
-                    # Save immediately to CSV
-                    append_to_csv(chat_name, participants, output_path)
-                else:
-                    log(f"  ! Not a group chat, skipping")
+def scan_chat_list(driver, processed_chats, sink, state=None, on_group=None):
+    """
+    Walk the chat list currently shown in the sidebar (all chats, or search results)
+    from its current position to the bottom, processing introduction groups as they appear.
+    Returns the number of introduction groups processed.
+    """
+    total_processed = 0
+    failures = 0  # Sidebar reads and scrolls that failed in a row
 
-                log(f"{'=' * 60}")
+    iteration = 0
+    while iteration < MAX_ITERATIONS:
+        iteration += 1
+        debug("\nIteration %d", iteration)
+
+        # One round-trip for every rendered chat; filtering happens in memory
+        try:
+            with metrics.phase("sidebar snapshot"):
+                snapshot = get_sidebar_snapshot(driver)
+        except Exception as e:
+            failures += 1
+            log(f"  Error reading sidebar ({failures}/{MAX_SIDEBAR_FAILURES}): {e}")
+            if failures >= MAX_SIDEBAR_FAILURES:
+                log(f"✗ Sidebar cannot be read, giving up on this chat list")
+                break
+            wait_for(driver, sidebar_readable, "sidebar to recover", SIDEBAR_RECOVERY_TIMEOUT)
+            continue
 
+        for row in snapshot["rows"]:
+            try:
+                if process_chat_row(driver, row, processed_chats, sink, state, on_group):
+                    total_processed += 1
             except StaleElementReferenceException:
                 log("  StaleElementReferenceException - continuing")
                 continue
@@ -512,34 +1116,125 @@ def process_introduction_groups(driver, output_path):
                 log(f"  Error processing chat: {e}")
                 continue
 
-        # Check if we found new chats in this iteration
-        if not found_new_chats:
-            no_new_chats_count += 1
-            log(f"  No new chats found in this iteration ({no_new_chats_count}/{max_no_new_iterations})")
+        # The snapshot was taken at the bottom of the list, so every chat has been seen
+        if snapshot["at_end"]:
+            log(f"\n✓ Reached end of chat list")
+            break
 
-            if no_new_chats_count >= max_no_new_iterations:
-                log(f"\n✓ Reached end of chat list (no new chats after {max_no_new_iterations} iterations)")
+        # Scroll down one page (from where the snapshot was taken) to reveal more chats
+        try:
+            with metrics.phase("scroll"):
+                scrolled = scroll_sidebar_page(driver, snapshot)
+            if not scrolled:
+                log(f"\n✓ Reached end of chat list (sidebar cannot scroll further)")
                 break
-        else:
-            # Reset counter if we found new chats
-            no_new_chats_count = 0
+            failures = 0
+        except Exception as e:
+            failures += 1
+            log(f"  Error scrolling sidebar ({failures}/{MAX_SIDEBAR_FAILURES}): {e}")
+            if failures >= MAX_SIDEBAR_FAILURES:
+                log(f"✗ Sidebar cannot be scrolled, giving up on this chat list")
+                break
+            wait_for(driver, sidebar_readable, "sidebar to recover", SIDEBAR_RECOVERY_TIMEOUT)
+
+    return total_processed
 
-        # Scroll down to reveal more chats
-        # Use a smaller number of DOWN keys and detect when we've reached the end
-        scroll_amount = 5
-        for _ in range(scroll_amount):
-            pane_side.send_keys(Keys.DOWN)
 
-        sleep(0.5)  # Small delay between iterations
+def search_chats(driver, query):
+    """
+    Type query into WhatsApp Web's chat search box (replacing any previous query)
+    and wait for the sidebar to show the results.
+    Returns False if the search box could not be found.
+    """
+    search_boxes = driver.find_elements(By.CSS_SELECTOR, SEARCH_BOX_SELECTOR)
+    if not search_boxes:
+        log("  ERROR: Could not find the search box")
+        return False
+
+    search_box = search_boxes[0]
+    mutations = driver.execute_script(SIDEBAR_MUTATIONS_SCRIPT)
+    search_box.click()
+    search_box.send_keys(Keys.CONTROL, "a")
+    search_box.send_keys(Keys.BACKSPACE)
+    search_box.send_keys(query)
+    wait_for(driver, SidebarSettled(mutations), "search results")
+    return True
+
+
+def clear_search(driver):
+    """Clear the chat search box so the sidebar shows the full chat list again"""
+    search_boxes = driver.find_elements(By.CSS_SELECTOR, SEARCH_BOX_SELECTOR)
+    if search_boxes:
+        search_boxes[0].send_keys(Keys.CONTROL, "a")
+        search_boxes[0].send_keys(Keys.BACKSPACE)
+        search_boxes[0].send_keys(Keys.ESCAPE)
+
+
+def process_introduction_groups(driver, output_path, discovery="scroll", state=None, on_group=None):
+    """
+    Process introduction groups using DFS - check and process immediately.
+    Groups are saved to output_path, in the format its extension names (see output_sinks.py).
+    discovery selects how chats are found:
+      "scroll" - walk the whole chat list
+      "search" - search for each of SEARCH_QUERIES and walk only the results
+    state is an optional ScrapeState used to skip chats already saved by this run.
+    on_group is an optional callback, called as on_group(chat_name, participants, complete)
+    after each group is saved.
+    """
+    processed_chats = set()
+    total_processed = 0
+    metrics.instrument(driver)
+
+    log(f"\nScanning chats for introduction groups (DFS approach, {discovery} discovery)...")
+    log("=" * 60)
+
+    # One open output file for the whole scan
+    with open_sink(output_path) as sink:
+        if discovery == "search":
+            # Chats matching several queries are only processed once (processed_chats is shared)
+            for query in SEARCH_QUERIES:
+                log(f"\nSearching chats for '{query}'")
+                with metrics.phase("search"):
+                    found = search_chats(driver, query)
+                if not found:
+                    break
+                total_processed += scan_chat_list(driver, processed_chats, sink, state, on_group)
+            clear_search(driver)
+        else:
+            total_processed = scan_chat_list(driver, processed_chats, sink, state, on_group)
 
     log(f"\n{'=' * 60}")
     log(f"Scan complete! Processed {total_processed} introduction groups")
+    log_wait_histogram()
+    log("\nTime per phase:")
+    for line in metrics.summary_lines():
+        log(line)
     log(f"{'=' * 60}")
 
     return total_processed
 
-def open_whatsapp():
-    """Open WhatsApp Web using default Chrome profile (auto-login)"""
+def wait_for_login(driver, interactive):
+    """
+    Wait until WhatsApp Web is ready. Interactive sessions ask the user to confirm;
+    unattended ones wait up to LOGIN_TIMEOUT for the chat list and raise if it never shows.
+    """
+    if interactive:
+        input("Press Enter when WhatsApp Web is ready and you can see your chats...")
+        return
+    try:
+        WebDriverWait(driver, LOGIN_TIMEOUT).until(EC.presence_of_element_located((By.ID, "pane-side")))
+    except TimeoutException:
+        raise RuntimeError(f"WhatsApp Web did not show the chat list within {LOGIN_TIMEOUT}s - "
+                           f"is this profile logged in?")
+
+
+def open_whatsapp(user_data_dir=None, profile_directory="Default", interactive=True):
+    """
+    Open WhatsApp Web using a Chrome profile (auto-login).
+    user_data_dir defaults to the default Chrome profile of this machine.
+    interactive=False is for unattended sessions: nothing is asked on the console, and a
+    profile that is not logged in fails instead of falling back to a QR code login.
+    """
     # Set up Chrome options to use default profile
     chrome_options = Options()
 
@@ -551,7 +1246,9 @@ def open_whatsapp():
     import platform
     system = platform.system()
 
-    if system == "Linux":
+    if user_data_dir:
+        pass  # Profile chosen by the caller
+    elif system == "Linux":
         user_data_dir = "/home/user/.config/google-chrome"
     elif system == "Darwin":  # macOS
         from os.path import expanduser
@@ -561,70 +1258,145 @@ def open_whatsapp():
         user_data_dir = os.path.join(os.environ['USERPROFILE'], 'AppData', 'Local', 'Google', 'Chrome', 'User Data')
     else:
         log(f"Warning: Unknown system {system}, using Chrome without default profile")
+        if not interactive:
+            raise RuntimeError("No Chrome profile to log in with")
         driver = webdriver.Chrome()
         driver.get(WHATSAPP_URL)
-        sleep(2)
+        pause(2)
         input("Connect to WhatsappWeb by linking device. Press Enter when done.")
         return driver
 
     chrome_options.add_argument(f"user-data-dir={user_data_dir}")
-    chrome_options.add_argument("profile-directory=Default")
+    chrome_options.add_argument(f"profile-directory={profile_directory}")
 
     log(f"Opening Chrome with profile from: {user_data_dir}")
     log("WhatsApp Web should auto-login if you're already logged in...")
 
+    driver = None
     try:
         driver = webdriver.Chrome(options=chrome_options)
         driver.get(WHATSAPP_URL)
-        sleep(5)  # Wait for WhatsApp to load
+        if interactive:
+            pause(5)  # Wait for WhatsApp to load
 
-        # Check if we need to scan QR code
-        log("\nIf you see a QR code, scan it with your phone.")
-        log("If you're already logged in, you should see your chats.")
-        input("Press Enter when WhatsApp Web is ready and you can see your chats...")
+            # Check if we need to scan QR code
+            log("\nIf you see a QR code, scan it with your phone.")
+            log("If you're already logged in, you should see your chats.")
+        wait_for_login(driver, interactive)
 
         return driver
     except Exception as e:
         log(f"Error opening Chrome with profile: {e}")
+        if not interactive:
+            if driver is not None:
+                driver.quit()
+            raise
         log("Falling back to Chrome without profile...")
         driver = webdriver.Chrome()
         driver.get(WHATSAPP_URL)
-        sleep(2)
+        pause(2)
         input("Connect to WhatsappWeb by linking device. Press Enter when done.")
         return driver
 
-def main():
+def build_arg_parser(description="Scrape WhatsApp Web introduction groups to CSV"):
+    """Command line options of a scraper run (extended by pipeline.py)"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--discovery", choices=["scroll", "search"], default="scroll",
+                        help="scroll: walk the whole chat list (default); "
+                             "search: only look at chats found by searching for the intro delimiters")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only open groups that are new or show activity since they were last scraped; "
+                             "copy the others from the last scrape")
+    parser.add_argument("--resume", metavar="RUN",
+                        help="continue an interrupted run (its timestamp, e.g. 20251102_143055, or 'latest'), "
+                             "appending to its output file and skipping the groups it already saved")
+    parser.add_argument("--save-snapshots", metavar="DIR",
+                        help="save the page of every scraped group to DIR, to re-process offline "
+                             "with snapshot_parser.py")
+    parser.add_argument("--profile", action="store_true",
+                        help="also profile the run with cProfile, saving the stats next to the CSV "
+                             "(open them with python -m pstats)")
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="csv",
+                        help="output file format: csv (default), jsonl (one line per group) or sqlite "
+                             "(groups and participants tables)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="also log per-chat and per-participant details (header text, group detection, "
+                             "every participant found)")
+    return parser
+
+
+def run_scraper(args, on_group=None):
+    """
+    Run the scraper with the given command line options (see build_arg_parser).
+    on_group is passed on to process_introduction_groups.
+    Returns the path of the output file, or None if the run could not start.
+    """
     # Generate timestamped filenames for this run
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     # Create unique filenames with timestamp
-    csv_filename = f"{OUTPUT_NAME}_{timestamp}.csv"
+    output_filename = f"{OUTPUT_NAME}_{timestamp}{output_extension(args.format)}"
     log_filename = f"{LOG_NAME}_{timestamp}.log"
 
-    output_path = join(OUTPUT_DIRECTORY, csv_filename)
+    output_path = join(OUTPUT_DIRECTORY, output_filename)
     log_path = join(OUTPUT_DIRECTORY, log_filename)
+    metrics_path = join(OUTPUT_DIRECTORY, f"{METRICS_NAME}_{timestamp}.json")
+    profile_path = join(OUTPUT_DIRECTORY, f"{PROFILE_NAME}_{timestamp}.prof")
 
     # Set up logging to both console and file
-    setup_logging(log_path)
+    setup_logging(log_path, verbose=args.verbose)
+
+    # Every run is checkpointed, so it can be resumed with --resume
+    state = ScrapeState(join(OUTPUT_DIRECTORY, STATE_DB_NAME), incremental=args.incremental)
+    if args.resume:
+        run_id = state.latest_run_id() if args.resume == "latest" else args.resume
+        try:
+            output_path = state.resume_run(run_id)
+        except ValueError as e:
+            log(f"✗ Cannot resume: {e}")
+            state.close()
+            return None
+    else:
+        run_id = timestamp
+        state.start_run(run_id, output_path)
+
     log("=" * 60)
     log("WhatsApp Introduction Group Scraper - Starting")
     log(f"Timestamp: {timestamp}")
+    if args.resume:
+        log(f"Resuming run: {run_id} ({state.done_count()} chats already done)")
     log(f"Log file: {log_path}")
-    log(f"CSV file: {output_path}")
-    log("=" * 60)
-
-    driver = open_whatsapp()
-
-    log("\n" + "=" * 60)
-    log("INTRODUCTION GROUP SCRAPER")
-    log("=" * 60)
     log(f"Output file: {output_path}")
-    log(f"Looking for groups with delimiters: {', '.join(INTRO_DELIMITERS)}")
+    log(f"Metrics file: {metrics_path}")
     log("=" * 60)
 
+    global known_contacts, snapshot_directory, people_index
+    metrics.reset()
+    known_contacts = contact_name_keys(state.participant_names())
+    if args.save_snapshots:
+        makedirs(args.save_snapshots, exist_ok=True)
+        snapshot_directory = args.save_snapshots
+    people_index = PeopleIndex(join(OUTPUT_DIRECTORY, PEOPLE_DB_NAME))
+
+    run_status = "failed"
+    driver = None
+    profiler = None
     try:
+        # Inside the try, so a failed login still closes the state and people index and records the run
+        driver = open_whatsapp()
+
+        log("\n" + "=" * 60)
+        log("INTRODUCTION GROUP SCRAPER")
+        log("=" * 60)
+        log(f"Output file: {output_path}")
+        log(f"Looking for groups with delimiters: {', '.join(INTRO_DELIMITERS)} "
+            f"(score threshold {INTRO_SCORE_THRESHOLD}, {len(known_contacts)} known contact names)")
+        log("=" * 60)
+
+        profiler = start_profile(args.profile)
         # Process introduction groups with DFS approach
-        total_processed = process_introduction_groups(driver, output_path)
+        total_processed = process_introduction_groups(driver, output_path, args.discovery, state, on_group)
+        run_status = "complete"
 
         log("\n" + "=" * 60)
         log("✓ SCRAPING COMPLETE!")
@@ -633,14 +1405,38 @@ def main():
         log(f"Data saved to: {output_path}")
         log("=" * 60)
     except KeyboardInterrupt:
+        run_status = "interrupted"
         log("\n\n⚠ Interrupted by user")
         log(f"Partial data saved to: {output_path}")
+        log(f"Continue with: python scrape_whatsapp_chats.py --resume {run_id}")
     except Exception as e:
         log(f"\n\n✗ Error: {e}")
         log(f"Partial data may be saved to: {output_path}")
+        log(f"Continue with: python scrape_whatsapp_chats.py --resume {run_id}")
     finally:
-        driver.quit()
-        log("\nBrowser closed.")
+        if profiler:
+            log(finish_profile(profiler, profile_path))
+            log(f"Profile saved to: {profile_path}")
+        state.finish_run(run_status)
+        state.close()
+        people_index.close()
+        people_index = None
+        if driver is not None:
+            driver.quit()
+            log("\nBrowser closed.")
+        try:
+            metrics.write(metrics_path, wait_latencies, wait_timeouts, run_id=run_id, status=run_status,
+                          output_path=output_path)
+            log(f"Metrics saved to: {metrics_path}")
+        except Exception as e:
+            log(f"Warning: Could not save metrics: {e}")
+
+    return output_path
+
+
+def main():
+    run_scraper(build_arg_parser().parse_args())
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
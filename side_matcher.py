@@ -0,0 +1,228 @@
+"""
+Match the parties named in intro groups to the groups' participants.
+
+An intro group is named after the people it introduces ("Dana // Yossi Levi",
+"רונית <> דנה ויוסי"), while the scraper saves the participants' full names
+("Dana Cohen", "יוסי לוי") or numbers. match_intros() links every party on each side
+to the participants it names:
+
+    {"chat_name": "Dana // Yossi Levi",
+     "sides": [[{"party": "Dana", "score": 1.0, "participants": [{"name": "Dana Cohen", ...}]}],
+               [{"party": "Yossi Levi", "score": 1.0, "participants": [{"name": "Yossi Levi", ...}]}]]}
+
+Names are compared word by word after normalization (case, accents, Hebrew points and
+final letters), and a party's word also matches a longer word it starts ("Dan" - "Daniel").
+The party's first word has to match, and the participants matching most of its words win.
+Each group's participants are put in a word and prefix index, so a party is looked up
+rather than compared with every participant. With a people index (see people_index.py),
+a participant saved as a number is also found under the names the same person has in
+other groups of the dataset.
+
+    python side_matcher.py whatsapp_chats_20251102_143055.csv
+    python side_matcher.py whatsapp_chats_20251102_143055.csv --json
+    python side_matcher.py --benchmark 10000
+"""
+import argparse
+import json
+import random
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+from time import perf_counter
+
+from intro_names import SELF_NAMES, classify_intro_name, contact_name_keys, side_parties
+from output_sinks import read_groups
+
+MIN_PREFIX_LENGTH = 2  # Shorter words only match whole words
+EXACT_WORD_SCORE = 1.0
+PREFIX_WORD_SCORE = 0.6  # A party word that only starts a participant's word ("Dan" - "Daniel")
+MATCH_THRESHOLD = 0.5  # Average word score a participant needs to be matched to a party
+NAME_CACHE_SIZE = 65536
+HEBREW_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+WORD_SEPARATORS = re.compile(r"[^\w]+")
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def name_words(name):
+    """
+    The normalized words of a name, as a tuple: accents and Hebrew points removed,
+    case-folded, Hebrew final letters written as regular ones, punctuation and numbers dropped
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    words = WORD_SEPARATORS.split(stripped.casefold().translate(HEBREW_FINAL_LETTERS))
+    return tuple(word for word in words if word and not word.isdigit() and word != "_")
+
+
+class ParticipantIndex:
+    """
+    Word and prefix index of one group's participants, for looking up the participants
+    a party names. aliases maps a person_id to more names of that person to index.
+    """
+
+    def __init__(self, participants, aliases=None):
+        self.participants = participants
+        self.words = defaultdict(set)  # Whole word -> indexes into participants
+        self.prefixes = defaultdict(set)  # Proper prefix of a word -> indexes into participants
+        for index, participant in enumerate(participants):
+            if " ".join(name_words(participant["name"])) in SELF_NAMES:
+                continue
+            names = {participant["name"]}
+            if aliases and participant.get("person_id") is not None:
+                names.update(aliases.get(participant["person_id"], ()))
+            for name in names:
+                for word in name_words(name):
+                    self.words[word].add(index)
+                    for length in range(MIN_PREFIX_LENGTH, len(word)):
+                        self.prefixes[word[:length]].add(index)
+
+    def match(self, party):
+        """(best participants for a party, their score) - ([], score) if none reaches MATCH_THRESHOLD"""
+        words = name_words(party)
+        if not words:
+            return [], 0.0
+        scores = Counter()
+        first_word_matches = set()
+        for word in set(words):
+            found = dict.fromkeys(self.prefixes.get(word, ()), PREFIX_WORD_SCORE)
+            found.update(dict.fromkeys(self.words.get(word, ()), EXACT_WORD_SCORE))
+            for index, score in found.items():
+                scores[index] += score * words.count(word)
+            if word == words[0]:
+                first_word_matches = set(found)
+        # The party's first word (usually the first name) has to match: "Dana Smith" is not "Moshe Smith"
+        scores = Counter({index: score for index, score in scores.items() if index in first_word_matches})
+        if not scores:
+            return [], 0.0
+        best = max(scores.values())
+        score = round(best / len(words), 2)
+        if score < MATCH_THRESHOLD:
+            return [], score
+        return [self.participants[index] for index, value in sorted(scores.items()) if value == best], score
+
+
+def person_aliases(records):
+    """person_id -> every name the person was saved under, over all records"""
+    aliases = defaultdict(set)
+    for record in records:
+        for participant in record["participants"]:
+            if participant.get("person_id") is not None:
+                aliases[participant["person_id"]].add(participant["name"])
+    return aliases
+
+
+def match_record(record, aliases=None):
+    """The sides of an intro record (see read_groups) with their matched participants, or None if not an intro"""
+    chat_name = record["chat_name"]
+    known_contacts = contact_name_keys(participant["name"] for participant in record["participants"])
+    is_intro, side_a, side_b = classify_intro_name(chat_name, known_contacts)
+    if not is_intro:
+        return None
+    index = ParticipantIndex(record["participants"], aliases)
+    sides = []
+    for side in (side_a, side_b):
+        parties = []
+        for party in side_parties(side):
+            if not party:
+                continue
+            participants, score = index.match(party)
+            parties.append({"party": party, "score": score, "participants": participants})
+        sides.append(parties)
+    return {"chat_name": chat_name, "sides": sides}
+
+
+def match_intros(records):
+    """Match the sides of every intro among records (see read_groups) to their participants, as a list"""
+    records = list(records)
+    aliases = person_aliases(records)
+    return [match for match in (match_record(record, aliases) for record in records) if match is not None]
+
+
+def match_summary(matches):
+    parties = [party for match in matches for side in match["sides"] for party in side]
+    return {
+        "intros": len(matches),
+        "parties": len(parties),
+        "matched": sum(1 for party in parties if party["participants"]),
+        "ambiguous": sum(1 for party in parties if len(party["participants"]) > 1),
+    }
+
+
+def print_match(match):
+    print(match["chat_name"])
+    for side in match["sides"]:
+        for party in side:
+            found = ", ".join(f"{participant['name']} ({participant.get('phone', 'N/A')})"
+                              for participant in party["participants"]) or "no match"
+            print(f"  {party['party']} -> {found}")
+
+
+def sample_records(count, seed=0):
+    """
+    Intro groups like real ones: sides by first name or full name, in English or Hebrew,
+    spelled a little differently from the participants' names
+    """
+    rng = random.Random(seed)
+    first_names = ["Dana", "Yossi", "Avi", "Rina", "Moshe", "Noa", "Daniel", "Maya", "Alice", "Bob",
+                   "דנה", "יוסי", "רונית", "מור", "עדי", "מתן"]
+    last_names = ["Cohen", "Levi", "Mizrahi", "Smith", "Katz", "כהן", "לוי", "שמעון"]
+    records = []
+    for number in range(count):
+        people = [f"{rng.choice(first_names)} {rng.choice(last_names)}" for _ in range(rng.randint(3, 12))]
+        first, second = people[0], people[1]
+        # Parties are often just a first name, in a different case, with points on Hebrew names
+        side_a = first.split()[0] if rng.random() < 0.5 else first.upper()
+        side_b = second.split()[0] + "\u05b0" if rng.random() < 0.3 else second
+        participants = [{"name": name, "phone": "N/A", "person_id": None} for name in people]
+        participants.append({"name": "You", "phone": "N/A", "person_id": None})
+        records.append({"chat_name": f"{side_a} // {side_b} {number}", "participant_count": len(participants),
+                        "participants": participants, "complete": True})
+    return records
+
+
+def benchmark(count):
+    records = sample_records(count)
+    name_words.cache_clear()
+    start = perf_counter()
+    matches = match_intros(records)
+    seconds = perf_counter() - start
+    expected = {record["chat_name"]: (record["participants"][0]["name"], record["participants"][1]["name"])
+                for record in records}
+    correct = sum(1 for match in matches
+                  if all(any(participant["name"] == name for participant in side[0]["participants"])
+                         for side, name in zip(match["sides"], expected[match["chat_name"]])))
+    summary = match_summary(matches)
+    print(f"{count} groups, {summary['parties']} parties: {seconds:.2f}s ({seconds / count * 1e6:.1f} µs/group)")
+    print(f"{summary['matched']} parties matched, {summary['ambiguous']} ambiguous, "
+          f"{correct} of {len(matches)} intros with both sides' person among the matches")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match intro group sides to the groups' participants")
+    parser.add_argument("path", nargs="?", help="scraper output (CSV, .jsonl or .sqlite3)")
+    parser.add_argument("--json", action="store_true", help="print the matches as JSON")
+    parser.add_argument("--benchmark", type=int, metavar="GROUPS", help="time matching on generated groups instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    if not args.path:
+        parser.error("a scraper output file is required")
+
+    start = perf_counter()
+    matches = match_intros(read_groups(args.path))
+    seconds = perf_counter() - start
+    if args.json:
+        print(json.dumps(matches, ensure_ascii=False, indent=2))
+        return
+    for match in matches:
+        print_match(match)
+    summary = match_summary(matches)
+    print(f"\n{summary['intros']} intros, {summary['matched']} of {summary['parties']} parties matched "
+          f"({summary['ambiguous']} to several participants) in {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Offline extraction from saved WhatsApp Web pages (e.g. "Whatsapp example page.html", or the
+snapshots the scraper saves with --save-snapshots).
+
+Reads the sidebar chats, the open chat's header and the group info participants with the
+same selectors and rules as the live scraper, without a browser:
+
+    python snapshot_parser.py "WhatsApp example clicked on Group Info.html"
+    python snapshot_parser.py snapshots/*.html --csv imported.csv
+
+With --csv, every snapshot showing a group's participants is appended to a CSV in the
+scraper's format.
+"""
+import argparse
+import json
+import re
+from html.parser import HTMLParser
+
+import scrape_whatsapp_chats as scraper
+from output_sinks import PARTICIPANTS_FROM_GROUP_INFO, PARTICIPANTS_FROM_HEADER, open_sink
+
+# Elements that never have children or an end tag
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+                 "source", "track", "wbr"}
+# Parsed but not searched (their text is not page text)
+RAW_TEXT_ELEMENTS = {"script", "style"}
+# One part of a compound selector: tag, #id, .class or [attribute(op"value" i)]
+SIMPLE_SELECTOR_PATTERN = re.compile(r'([\w-]+)|#([\w-]+)|\.([\w-]+)'
+                                     r'|\[([\w-]+)(?:([*^$]?=)"([^"]*)"(\s+i)?)?\]')
+# Compound selectors of a selector (spaces inside [...] don't separate them)
+COMPOUND_SELECTOR_PATTERN = re.compile(r"(?:[^\s\[]|\[[^\]]*\])+")
+TRANSLATE_Y_PATTERN = re.compile(r"translateY\((-?[\d.]+)px\)")
+UNREAD_PATTERN = re.compile(r"\d+")
+SENDER_PREFIX_PATTERN = re.compile("^[^:]{1,60}:\u00a0")  # "Dana:\u00a0message" previews are group messages
+
+
+class Element:
+    """A parsed element: tag, attributes, children (elements and text strings) and parent"""
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+        self.classes = set(attrs.get("class", "").split())
+
+    def get(self, name):
+        return self.attrs.get(name)
+
+    def elements(self):
+        """All descendant elements, in document order"""
+        stack = [child for child in reversed(self.children) if isinstance(child, Element)]
+        while stack:
+            element = stack.pop()
+            yield element
+            stack.extend(child for child in reversed(element.children) if isinstance(child, Element))
+
+    def text(self):
+        """The element's text content, like textContent in the browser"""
+        parts = []
+        stack = list(reversed(self.children))
+        while stack:
+            child = stack.pop()
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.tag not in RAW_TEXT_ELEMENTS:
+                stack.extend(reversed(child.children))
+        return "".join(parts)
+
+    def display_text(self):
+        """
+        The element's text as WhatsApp shows it (displayText in the scraper's scripts): its title
+        attribute, or its text with emoji images written as their alt text
+        """
+        if self.get("title"):
+            return self.get("title")
+        parts = []
+        stack = list(reversed(self.children))
+        while stack:
+            child = stack.pop()
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.tag == "img":
+                parts.append(child.get("alt") or "")
+            elif child.tag not in RAW_TEXT_ELEMENTS:
+                stack.extend(reversed(child.children))
+        return "".join(parts)
+
+    def lines(self):
+        """Non-empty lines of text, roughly like innerText (one line per text node)"""
+        lines = []
+        for child in self.children:
+            if isinstance(child, str):
+                if child.strip():
+                    lines.append(child.strip())
+            elif child.tag not in RAW_TEXT_ELEMENTS:
+                lines.extend(child.lines())
+        return lines
+
+    def select(self, selector):
+        """Descendants matching a CSS selector, in document order (see Selector)"""
+        selectors = [Selector(part) for part in selector.split(",")]
+        return [element for element in self.elements() if any(s.matches(element) for s in selectors)]
+
+    def select_one(self, selector):
+        matches = self.select(selector)
+        return matches[0] if matches else None
+
+    def closest(self, selector):
+        selectors = [Selector(part) for part in selector.split(",")]
+        element = self
+        while element is not None and element.tag != "#document":
+            if any(s.matches(element) for s in selectors):
+                return element
+            element = element.parent
+        return None
+
+
+class Selector:
+    """
+    The subset of CSS selectors the scraper uses: compound selectors of tag, #id, .class,
+    [attr], [attr="v"], [attr*="v"], [attr^="v"], [attr$="v"] (optionally with i),
+    joined by descendant combinators.
+    """
+
+    def __init__(self, selector):
+        self.parts = [self.parse_compound(part) for part in COMPOUND_SELECTOR_PATTERN.findall(selector)]
+
+    @staticmethod
+    def parse_compound(text):
+        tag, conditions = None, []
+        position = 0
+        while position < len(text):
+            match = SIMPLE_SELECTOR_PATTERN.match(text, position)
+            if not match:
+                raise ValueError(f"Unsupported selector: {text}")
+            name, element_id, class_name, attribute, operator, value, ignore_case = match.groups()
+            if name:
+                tag = name.lower()
+            elif element_id:
+                conditions.append(("id", "=", element_id, False))
+            elif class_name:
+                conditions.append(("class", "~=", class_name, False))
+            else:
+                conditions.append((attribute, operator, value, bool(ignore_case)))
+            position = match.end()
+        return tag, conditions
+
+    @staticmethod
+    def matches_compound(element, compound):
+        tag, conditions = compound
+        if tag and element.tag != tag:
+            return False
+        for attribute, operator, value, ignore_case in conditions:
+            if operator == "~=":
+                if value not in element.classes:
+                    return False
+                continue
+            actual = element.attrs.get(attribute)
+            if actual is None:
+                return False
+            if operator is None:
+                continue
+            if ignore_case:
+                actual, value = actual.lower(), value.lower()
+            if ((operator == "=" and actual != value) or (operator == "*=" and value not in actual)
+                    or (operator == "^=" and not actual.startswith(value))
+                    or (operator == "$=" and not actual.endswith(value))):
+                return False
+        return True
+
+    def matches(self, element):
+        if not self.matches_compound(element, self.parts[-1]):
+            return False
+        # Match the remaining parts against ancestors, right to left
+        ancestor = element.parent
+        for compound in reversed(self.parts[:-1]):
+            while ancestor is not None and not (ancestor.tag != "#document"
+                                                and self.matches_compound(ancestor, compound)):
+                ancestor = ancestor.parent
+            if ancestor is None:
+                return False
+            ancestor = ancestor.parent
+        return True
+
+
+class SnapshotParser(HTMLParser):
+    """Builds an Element tree from HTML (forgiving about unclosed tags, like browsers)"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.document = Element("#document", {})
+        self.current = self.document
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, {name: value if value is not None else "" for name, value in attrs}, self.current)
+        self.current.children.append(element)
+        if tag not in VOID_ELEMENTS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(
+            Element(tag, {name: value if value is not None else "" for name, value in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        element = self.current
+        while element is not None and element.tag != tag:
+            element = element.parent
+        if element is not None and element.parent is not None:
+            self.current = element.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html):
+    """Parse an HTML string into a document Element"""
+    parser = SnapshotParser()
+    parser.feed(html)
+    parser.close()
+    return parser.document
+
+
+def read_snapshot(path):
+    with open(path, encoding="utf-8") as snapshot_file:
+        return parse_html(snapshot_file.read())
+
+
+def row_top(row):
+    """Sidebar rows are positioned with translateY; their offset gives the on-screen order"""
+    match = TRANSLATE_Y_PATTERN.search(row.get("style") or "")
+    return float(match.group(1)) if match else 0.0
+
+
+def sidebar_chats(document):
+    """The rendered sidebar chats, like the rows of SIDEBAR_SNAPSHOT_SCRIPT (in on-screen order)"""
+    rows = []
+    for chat in document.select("." + scraper.CHAT_DIV):
+        row = chat.closest('[role="row"]') or chat.closest("button") or chat
+        name = (chat.select_one("span[title]") or chat).display_text()
+        unread = row.select_one('[aria-label*="unread"]')
+        unread_count = UNREAD_PATTERN.search(unread.text()) if unread else None
+        preview = row.select_one("._ak8k")
+        preview_text = preview.text() if preview else ""
+        preview_title = preview.select_one("[title]") if preview else None
+        last_activity = row.select_one("._ak8i")
+        rows.append({
+            "name": (name or "").strip(),
+            "top": row_top(row),
+            "is_group": bool(row.select_one('[data-icon*="group"]')) or bool(SENDER_PREFIX_PATTERN.match(preview_text)),
+            "unread": (int(unread_count.group()) if unread_count else 1) if unread else 0,
+            "last_activity": last_activity.text().strip() if last_activity else "",
+            "preview": (preview_title.get("title") if preview_title else preview_text).strip(),
+        })
+    rows.sort(key=lambda row: row["top"])
+    return rows
+
+
+def chat_header(document):
+    """The open chat's header, like CHAT_HEADER_SCRIPT (without the elements), or None"""
+    for index, strategy in enumerate(scraper.CHAT_HEADER_STRATEGIES):
+        matches = document.select(strategy["selector"])
+        if len(matches) > strategy["index"]:
+            header = matches[strategy["index"]]
+        elif len(matches) == 1:
+            header = matches[0]
+        else:
+            continue
+        lines = header.lines()
+        title = header.select_one('span[dir="auto"]')
+        subtitle = header.select_one("span[title]")
+        return {
+            "strategy": index,
+            "title": title.display_text().strip() if title else (lines[0] if lines else ""),
+            "subtitle": subtitle.get("title") if subtitle else (lines[1] if len(lines) > 1 else ""),
+            "subtitle_text": subtitle.text() if subtitle else (lines[1] if len(lines) > 1 else ""),
+        }
+    return None
+
+
+def participant_root(document):
+    """Where the live scraper reads participants: the full list dialog if open, else the group info drawer"""
+    for dialog in document.select(scraper.PARTICIPANT_DIALOG_SELECTOR):
+        if dialog.select_one(scraper.PARTICIPANT_ROW_SELECTOR):
+            return dialog
+    return document.select_one(scraper.GROUP_INFO_DRAWER_SELECTOR)
+
+
+def participant_rows(root):
+    """The participant rows under root, like PARTICIPANTS_SCRIPT"""
+    rows = []
+    for item in root.select(scraper.PARTICIPANT_ROW_SELECTOR):
+        names = []
+        for span in item.select('span[dir="auto"]'):
+            text = (span.get("title") or span.text() or "").strip()
+            if text:
+                names.append(text)
+        is_admin = any(not any(isinstance(child, Element) for child in element.children)
+                       and re.match(r"^(group )?admin$", element.text().strip(), re.IGNORECASE)
+                       for element in item.select("div, span"))
+        rows.append({"names": names, "is_admin": is_admin, "text": item.text()})
+    return rows
+
+
+def member_count(root):
+    """The participant count shown in group info, like MEMBER_COUNT_SCRIPT, or None"""
+    member_list = root.select_one('[aria-label*="members list" i], [aria-label*="participants list" i]')
+    for text in (member_list.get("aria-label") if member_list else "", root.text()):
+        match = re.search(r"(\d[\d,.]*)\s+(members|participants)\b", text, re.IGNORECASE)
+        if match:
+            return int(re.sub(r"[,.]", "", match.group(1)))
+    return None
+
+
+def extract_snapshot(document):
+    """
+    Everything the scraper would read from this page: sidebar chats, the open chat's header,
+    whether it is a group, and its participants (from group info if it is open, otherwise
+    from the header when the header lists every member).
+    """
+    header = chat_header(document)
+    result = {
+        "sidebar": sidebar_chats(document),
+        "header": header,
+        "is_group": bool(header) and scraper.is_group_chat(None, header),
+        "participants": None,
+        "participants_source": None,
+        "member_count": None,
+        "complete": False,
+    }
+
+    root = participant_root(document)
+    if root is not None:
+        participants = []
+        scraper.merge_participants(participants, set(), participant_rows(root))
+        count = member_count(root)
+        result.update(participants=participants, participants_source=PARTICIPANTS_FROM_GROUP_INFO, member_count=count,
+                      complete=count is not None and len(participants) >= count)
+    elif result["is_group"]:
+        participants = scraper.parse_subtitle_participants(header)
+        if participants is not None:
+            result.update(participants=participants, participants_source=PARTICIPANTS_FROM_HEADER,
+                          member_count=len(participants), complete=True)
+    return result
+
+
+def print_snapshot(path, as_json, sink=None):
+    """Extract one saved page, print what was found and save its group to sink (if given)"""
+    result = extract_snapshot(read_snapshot(path))
+    header = result["header"]
+    if as_json:
+        print(json.dumps({"snapshot": path, **result}, ensure_ascii=False, indent=2))
+    else:
+        print(f"{path}:")
+        print(f"  Sidebar: {len(result['sidebar'])} chats")
+        for row in result["sidebar"]:
+            print(f"    {row['name']} ({row['last_activity']}{', group' if row['is_group'] else ''})")
+        if header:
+            print(f"  Open chat: {header['title']} - {header['subtitle']}"
+                  f"{' (group)' if result['is_group'] else ''}")
+        if result["participants"] is not None:
+            print(f"  Participants from {result['participants_source']}: {len(result['participants'])}"
+                  f" of {result['member_count']}")
+            for participant in result["participants"]:
+                print(f"    {participant['name']} ({participant['phone']})"
+                      f"{' - admin' if participant['is_admin'] else ''}")
+
+    if sink is not None and header and result["participants"] is not None:
+        scraper.save_group(sink, header["title"], result["participants"], result["complete"],
+                           result["participants_source"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract chats and participants from saved WhatsApp Web pages")
+    parser.add_argument("snapshots", nargs="+", help="saved WhatsApp Web HTML pages")
+    parser.add_argument("--csv", help="append the groups found to this CSV (scraper format; "
+                                      "a .jsonl or .sqlite3 file is written in that format instead)")
+    parser.add_argument("--json", action="store_true", help="print everything extracted as JSON")
+    args = parser.parse_args()
+
+    sink = open_sink(args.csv) if args.csv else None
+    try:
+        for path in args.snapshots:
+            print_snapshot(path, args.json, sink)
+    finally:
+        if sink is not None:
+            sink.close()
+
+
+if __name__ == "__main__":
+    main()